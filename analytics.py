@@ -1,33 +1,95 @@
+import cache
 import database as db
-from collections import Counter
 from datetime import datetime, timedelta
 
-def get_category_distribution():
-    """Get distribution of items by category"""
-    lost_items = db.get_all_lost_items()
-    
-    categories = [item['category'] for item in lost_items if item.get('category')]
-    category_counts = Counter(categories)
+ROW_BATCH_SIZE = 500   # rows fetched per round trip when streaming
+WEEKDAYS = ['Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat']   # strftime('%w') order
+
+def _date_filter(column, start_date=None, end_date=None):
+    """SQL conditions and parameters keeping column within [start_date, end_date] (YYYY-MM-DD)"""
+    conditions = []
+    params = []
+    if start_date:
+        conditions.append(f'{column} >= ?')
+        params.append(start_date)
+    if end_date:
+        conditions.append(f"{column} < DATE(?, '+1 day')")
+        params.append(end_date)
+    return conditions, params
+
+def _where(conditions):
+    return 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+
+def _iter_rows(query, params=()):
+    """Yield query results as dicts, fetching ROW_BATCH_SIZE rows at a time"""
+    conn = db.get_db_connection()
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(ROW_BATCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def iter_category_counts(start_date=None, end_date=None):
+    """Active lost items per category, most common first"""
+    if not start_date and not end_date:
+        # Whole history: read the trigger-maintained counters
+        return _iter_rows('''
+            SELECT category, count FROM lost_category_counts
+            WHERE status = 'active' AND category != '' AND count > 0
+            ORDER BY count DESC, category
+        ''')
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT category, COUNT(*) as count FROM lost_items
+        {_where(["status = 'active'", "category != ''"] + conditions)}
+        GROUP BY category
+        ORDER BY count DESC, category
+    ''', params)
+
+def iter_location_counts(start_date=None, end_date=None):
+    """Active lost items per location, most common first"""
+    if not start_date and not end_date:
+        return _iter_rows('''
+            SELECT location, count FROM lost_location_counts
+            WHERE status = 'active' AND location != '' AND count > 0
+            ORDER BY count DESC, location
+        ''')
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT location, COUNT(*) as count FROM lost_items
+        {_where(["status = 'active'", "location != ''"] + conditions)}
+        GROUP BY location
+        ORDER BY count DESC, location
+    ''', params)
+
+@cache.cached()
+def get_category_distribution(start_date=None, end_date=None):
+    """Get distribution of active lost items by category"""
+    results = list(iter_category_counts(start_date, end_date))
     
     # Format for Chart.js
     return {
-        'labels': list(category_counts.keys()),
-        'data': list(category_counts.values())
+        'labels': [row['category'] for row in results],
+        'data': [row['count'] for row in results]
     }
 
-def get_location_hotspots(top_n=10):
+@cache.cached()
+def get_location_hotspots(top_n=10, start_date=None, end_date=None):
     """Get top locations where items are lost"""
-    lost_items = db.get_all_lost_items()
-    
-    locations = [item['location'] for item in lost_items if item.get('location')]
-    location_counts = Counter(locations)
-    
-    # Get top N locations
-    top_locations = location_counts.most_common(top_n)
+    results = []
+    for row in iter_location_counts(start_date, end_date):
+        if len(results) == top_n:
+            break
+        results.append(row)
     
     return {
-        'labels': [loc[0] for loc in top_locations],
-        'data': [loc[1] for loc in top_locations]
+        'labels': [row['location'] for row in results],
+        'data': [row['count'] for row in results]
     }
 
 def get_recovery_rate():
@@ -48,19 +110,53 @@ def get_recovery_rate():
         'total': total_lost
     }
 
+def _bucket_quantile(buckets, total, fraction):
+    """
+    Quantile, in seconds, of a histogram of (count, min_seconds, max_seconds)
+    buckets, interpolated between the shortest and longest time in the bucket
+    """
+    target = fraction * total
+    seen = 0
+    for count, min_seconds, max_seconds in buckets:
+        if seen + count >= target:
+            return min_seconds + (max_seconds - min_seconds) * (target - seen) / count
+        seen += count
+    return buckets[-1][2]
+
+@cache.cached()
 def get_average_recovery_time():
     """
-    Calculate average time to recovery
-    For hackathon: Simplified calculation
+    Time from a lost item report to its recovery: mean, median and 90th
+    percentile, read from the hourly histogram kept by a match_events trigger
     """
-    # This is a placeholder calculation
-    # In production, you'd track actual timestamps
+    conn = db.get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT hour, count, total_seconds, min_seconds, max_seconds FROM recovery_time_buckets
+        WHERE count > 0
+        ORDER BY hour
+    ''')
+    
+    results = cursor.fetchall()
+    conn.close()
+    
+    total = sum(row['count'] for row in results)
+    if total == 0:
+        return {'hours': 0, 'days': 0, 'median_hours': 0, 'p90_hours': 0, 'count': 0}
+    
+    buckets = [(row['count'], row['min_seconds'], row['max_seconds']) for row in results]
+    mean_hours = sum(row['total_seconds'] for row in results) / total / 3600
     
     return {
-        'hours': 24,  # Placeholder
-        'days': 1
+        'hours': round(mean_hours, 1),
+        'days': round(mean_hours / 24, 1),
+        'median_hours': round(_bucket_quantile(buckets, total, 0.5) / 3600, 1),
+        'p90_hours': round(_bucket_quantile(buckets, total, 0.9) / 3600, 1),
+        'count': total
     }
 
+@cache.cached()
 def get_trending_categories(days=7):
     """Get trending lost item categories in last N days"""
     conn = db.get_db_connection()
@@ -69,10 +165,11 @@ def get_trending_categories(days=7):
     date_threshold = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
     cursor.execute('''
-        SELECT category, COUNT(*) as count
-        FROM lost_items
-        WHERE created_at >= ?
+        SELECT category, SUM(count) as count
+        FROM lost_daily_counts
+        WHERE day >= ?
         GROUP BY category
+        HAVING SUM(count) > 0
         ORDER BY count DESC
         LIMIT 5
     ''', (date_threshold,))
@@ -85,6 +182,7 @@ def get_trending_categories(days=7):
         'data': [row['count'] for row in results]
     }
 
+@cache.cached()
 def get_daily_reports(days=7):
     """Get number of reports per day for last N days"""
     conn = db.get_db_connection()
@@ -93,10 +191,11 @@ def get_daily_reports(days=7):
     date_threshold = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
     
     cursor.execute('''
-        SELECT DATE(created_at) as report_date, COUNT(*) as count
-        FROM lost_items
-        WHERE created_at >= ?
-        GROUP BY DATE(created_at)
+        SELECT day as report_date, SUM(count) as count
+        FROM lost_daily_counts
+        WHERE day >= ?
+        GROUP BY day
+        HAVING SUM(count) > 0
         ORDER BY report_date
     ''', (date_threshold,))
     
@@ -108,17 +207,122 @@ def get_daily_reports(days=7):
         'data': [row['count'] for row in results]
     }
 
-def get_match_accuracy_stats():
+def iter_daily_counts(start_date=None, end_date=None):
+    """Lost items reported per day"""
+    conditions, params = _date_filter('day', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT day, SUM(count) as count FROM lost_daily_counts
+        {_where(["day != ''"] + conditions)}
+        GROUP BY day
+        HAVING SUM(count) > 0
+        ORDER BY day
+    ''', params)
+
+def iter_hourly_counts(start_date=None, end_date=None):
+    """Lost items reported per weekday (0 = Sunday) and hour of day"""
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT CAST(strftime('%w', created_at) AS INTEGER) as weekday,
+               CAST(strftime('%H', created_at) AS INTEGER) as hour,
+               COUNT(*) as count
+        FROM lost_items
+        {_where(['created_at IS NOT NULL'] + conditions)}
+        GROUP BY weekday, hour
+        ORDER BY weekday, hour
+    ''', params)
+
+def iter_category_location_counts(start_date=None, end_date=None):
+    """Lost items per (category, location) pair"""
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT category, location, COUNT(*) as count FROM lost_items
+        {_where(conditions)}
+        GROUP BY category, location
+        ORDER BY category, location
+    ''', params)
+
+def iter_confidence_histogram(bin_width=10, start_date=None, end_date=None):
+    """Matches per confidence bin; scores are percentages, 100 falls in the last bin"""
+    last_bin = (100 - 1) // bin_width
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    return _iter_rows(f'''
+        SELECT MIN(CAST(confidence_score / ? AS INTEGER), ?) * ? as bin_start,
+               COUNT(*) as count
+        FROM matches
+        {_where(conditions)}
+        GROUP BY bin_start
+        ORDER BY bin_start
+    ''', [bin_width, last_bin, bin_width] + params)
+
+@cache.cached()
+def get_daily_heatmap(start_date=None, end_date=None):
+    """Get reports per day, for a calendar heatmap"""
+    results = list(iter_daily_counts(start_date, end_date))
+    
+    return {
+        'labels': [row['day'] for row in results],
+        'data': [row['count'] for row in results]
+    }
+
+@cache.cached()
+def get_hourly_heatmap(start_date=None, end_date=None):
+    """Get reports per weekday and hour as a 7x24 grid"""
+    grid = [[0] * 24 for _ in WEEKDAYS]
+    for row in iter_hourly_counts(start_date, end_date):
+        grid[row['weekday']][row['hour']] = row['count']
+    
+    return {
+        'weekdays': WEEKDAYS,
+        'hours': list(range(24)),
+        'data': grid
+    }
+
+@cache.cached()
+def get_category_location_crosstab(start_date=None, end_date=None):
+    """Get a category x location table of lost item counts"""
+    cells = list(iter_category_location_counts(start_date, end_date))
+    categories = sorted({row['category'] for row in cells})
+    locations = sorted({row['location'] for row in cells})
+    category_index = {category: i for i, category in enumerate(categories)}
+    location_index = {location: i for i, location in enumerate(locations)}
+    
+    table = [[0] * len(locations) for _ in categories]
+    for row in cells:
+        table[category_index[row['category']]][location_index[row['location']]] = row['count']
+    
+    return {
+        'categories': categories,
+        'locations': locations,
+        'data': table
+    }
+
+@cache.cached()
+def get_confidence_histogram(bin_width=10, start_date=None, end_date=None):
+    """Get match counts per confidence bin, including empty bins"""
+    counts = {row['bin_start']: row['count']
+              for row in iter_confidence_histogram(bin_width, start_date, end_date)}
+    bins = range(0, 100, bin_width)
+    
+    return {
+        'labels': [f'{start}-{min(start + bin_width, 100)}%' for start in bins],
+        'data': [counts.get(start, 0) for start in bins]
+    }
+
+@cache.cached()
+def get_match_accuracy_stats(start_date=None, end_date=None):
     """Get statistics about match accuracy"""
     conn = db.get_db_connection()
     cursor = conn.cursor()
     
+    conditions, params = _date_filter('created_at', start_date, end_date)
+    
     # Get average confidence score
-    cursor.execute('SELECT AVG(confidence_score) as avg_score FROM matches')
+    cursor.execute(f'SELECT AVG(confidence_score) as avg_score FROM matches {_where(conditions)}',
+                   params)
     avg_score = cursor.fetchone()
     
     # Get matches by confidence range
-    cursor.execute('''
+    cursor.execute(f'''
         SELECT 
             CASE 
                 WHEN confidence_score >= 80 THEN 'High (80-100%)'
@@ -127,8 +331,9 @@ def get_match_accuracy_stats():
             END as confidence_range,
             COUNT(*) as count
         FROM matches
+        {_where(conditions)}
         GROUP BY confidence_range
-    ''')
+    ''', params)
     
     ranges = cursor.fetchall()
     conn.close()
@@ -138,5 +343,18 @@ def get_match_accuracy_stats():
         'distribution': {
             'labels': [row['confidence_range'] for row in ranges],
             'data': [row['count'] for row in ranges]
-        }
-    }
\ No newline at end of file
+        },
+        'histogram': get_confidence_histogram(10, start_date, end_date)
+    }
+
+# Reports served by /api/analytics/<name>: (summary, row stream)
+REPORTS = {
+    'categories': (get_category_distribution, iter_category_counts),
+    'locations': (lambda start_date, end_date: get_location_hotspots(10, start_date, end_date),
+                  iter_location_counts),
+    'daily': (get_daily_heatmap, iter_daily_counts),
+    'hourly': (get_hourly_heatmap, iter_hourly_counts),
+    'crosstab': (get_category_location_crosstab, iter_category_location_counts),
+    'confidence': (get_match_accuracy_stats,
+                   lambda start_date, end_date: iter_confidence_histogram(10, start_date, end_date)),
+}
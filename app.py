@@ -1,16 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, session
-from werkzeug.utils import secure_filename
+"""
+Lost&Found AI web application.
+
+create_app() builds the Flask app; `flask --app app` finds it on its own.
+Importing this module is cheap: the matcher (numpy, scipy, and
+scikit-learn when it refits) is only imported by the code that matches,
+normally the background workers, and the schema is set up once by
+`flask --app app init-db` rather than on every start.
+"""
+from flask import (Flask, Blueprint, render_template, request, redirect, url_for, flash, jsonify,
+                   session, current_app, Response, stream_with_context, before_render_template,
+                   template_rendered, abort, send_from_directory)
 import os
+import sys
+import json
+import threading
+import time
+import click
 from datetime import datetime
 import database as db
-import matcher
 import otp_service
 import analytics
+import worker
+import importer
+import instrumentation
+import uploads
 
-app = Flask(__name__)
-app.secret_key = 'your-secret-key-change-this-in-production'
-app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+bp = Blueprint('main', __name__, cli_group=None)
 
 # Allowed extensions for photo uploads
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
@@ -18,17 +33,98 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-# Initialize database
-db.init_db()
+def create_app(config=None):
+    """
+    Build the application. `config` overrides the defaults below, e.g.
+    MATCH_WORKERS=0 and REMATCH_INTERVAL=0 for an app without background
+    threads. Nothing touches the database until the first request.
+    """
+    app = Flask(__name__)
+    app.request_class = uploads.UploadRequest  # stream uploads to disk while parsing
+    app.secret_key = 'your-secret-key-change-this-in-production'
+    app.config['UPLOAD_FOLDER'] = os.path.join(uploads.STATIC_FOLDER, uploads.UPLOAD_DIR)
+    app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
+    
+    # Background matching workers running in this process; set to 0 when
+    # matching runs in separate `python worker.py` processes instead
+    app.config['MATCH_WORKERS'] = int(os.environ.get('LOSTFOUND_MATCH_WORKERS', 1))
+    
+    # Periodically re-match new items against older unmatched ones (0 disables it)
+    app.config['REMATCH_INTERVAL'] = float(os.environ.get('LOSTFOUND_REMATCH_INTERVAL', 300))
+    
+    app.config.update(config or {})
+    app.register_blueprint(bp)
+    
+    # Per-request timing with spans for every database call, the matcher
+    # phases and template rendering; served at /metrics
+    if instrumentation.ENABLED:
+        instrumentation.instrument_module(db, 'db', exclude=(
+            'get_pool', 'get_db_connection', 'bind_connection', 'release_connection',
+            'transaction', 'after_commit', 'encode_cursor', 'decode_cursor'))
+        before_render_template.connect(instrumentation.template_started, app)
+        template_rendered.connect(instrumentation.template_rendered, app)
+    
+    return app
+
+_startup_lock = threading.Lock()
+
+@bp.before_app_request
+def start_background_threads():
+    """
+    On the first request, check the schema and start the in-process
+    matching workers and re-match scheduler. Starting them here rather than
+    in create_app() keeps them out of CLI commands and scripts that only
+    build the app, and out of a parent process that forks server workers.
+    """
+    if current_app.extensions.get('lostfound.started'):
+        return
+    with _startup_lock:
+        if current_app.extensions.get('lostfound.started'):
+            return
+        if not db.schema_is_current():
+            raise RuntimeError(f"The schema of {db.DATABASE} is not up to date; "
+                               f"run `flask --app app init-db`")
+        worker.start_in_process_workers(current_app.config['MATCH_WORKERS'])
+        if current_app.config['REMATCH_INTERVAL'] > 0:
+            worker.start_rematch_scheduler(current_app.config['REMATCH_INTERVAL'])
+        current_app.extensions['lostfound.started'] = True
+
+@bp.before_app_request
+def start_request_timer():
+    """Start timing the request and collecting its spans"""
+    if instrumentation.ENABLED:
+        instrumentation.start_request()
 
-@app.route('/')
+@bp.after_app_request
+def finish_request_timer(response):
+    """Record the request's latency and report its spans in a Server-Timing header"""
+    if instrumentation.ENABLED:
+        spans = instrumentation.finish_request(request.endpoint, request.method,
+                                               response.status_code, request.path)
+        if spans:
+            response.headers['Server-Timing'] = instrumentation.render_spans(spans)
+    return response
+
+@bp.before_app_request
+def bind_db_connection():
+    """Serve every database call of a request from one pooled connection"""
+    db.bind_connection()
+
+@bp.teardown_app_request
+def release_db_connection(exc):
+    db.release_connection()
+    if instrumentation.ENABLED and exc is not None:
+        # after_request is skipped when the view raised
+        instrumentation.finish_request(request.endpoint, request.method, 500, request.path)
+
+@bp.route('/')
 def index():
     """Landing page with stats"""
     stats = db.get_stats()
     recent_recoveries = db.get_recent_recoveries(limit=5)
     return render_template('index.html', stats=stats, recent_recoveries=recent_recoveries)
 
-@app.route('/report_lost', methods=['GET', 'POST'])
+@bp.route('/report_lost', methods=['GET', 'POST'])
 def report_lost():
     """Report a lost item"""
     if request.method == 'POST':
@@ -43,45 +139,30 @@ def report_lost():
         contact_phone = request.form['contact_phone']
         contact_email = request.form['contact_email']
         
-        # Handle file upload
+        # Store the upload under its content hash; thumbnails are made in the background
         photo_path = None
         if 'photo' in request.files:
             file = request.files['photo']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(f"lost_{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}")
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                photo_path = f"uploads/{filename}"
+                photo_path = uploads.store_upload(file)
+        photo_hash = uploads.photo_hash(photo_path)
         
-        # Insert into database
-        lost_item_id = db.insert_lost_item(
-            category, item_name, description, color, location, lost_date,
-            contact_name, contact_phone, contact_email, photo_path
-        )
+        # Insert the item and queue AI matching against found items
+        with db.transaction():
+            lost_item_id = db.insert_lost_item(
+                category, item_name, description, color, location, lost_date,
+                contact_name, contact_phone, contact_email, photo_path, photo_hash
+            )
+            db.enqueue_job('match_lost', lost_item_id)
+            if photo_path:
+                db.enqueue_job('photo_variants_lost', lost_item_id)
         
-        # Run AI matching against found items
-        matches = matcher.find_matches_for_lost_item(lost_item_id)
-        
-        if matches:
-            # Store matches in database
-            for match in matches:
-                db.insert_match(
-                    lost_item_id, 
-                    match['found_item_id'], 
-                    match['confidence_score'],
-                    match['category_score'],
-                    match['location_score'],
-                    match['description_score']
-                )
-            
-            flash(f'Lost item reported! We found {len(matches)} potential matches.', 'success')
-            return redirect(url_for('matches', lost_item_id=lost_item_id))
-        else:
-            flash('Lost item reported! We will notify you when a matching item is found.', 'info')
-            return redirect(url_for('my_items'))
+        flash('Lost item reported! Our AI is searching for matches now.', 'success')
+        return redirect(url_for('main.matches', lost_item_id=lost_item_id))
     
     return render_template('report_lost.html')
 
-@app.route('/report_found', methods=['GET', 'POST'])
+@bp.route('/report_found', methods=['GET', 'POST'])
 def report_found():
     """Report a found item"""
     if request.method == 'POST':
@@ -96,45 +177,30 @@ def report_found():
         contact_name = request.form['contact_name']
         contact_phone = request.form['contact_phone']
         
-        # Handle file upload
+        # Store the upload under its content hash; thumbnails are made in the background
         photo_path = None
         if 'photo' in request.files:
             file = request.files['photo']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(f"found_{datetime.now().strftime('%Y%m%d%H%M%S')}_{file.filename}")
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                photo_path = f"uploads/{filename}"
-        
-        # Insert into database
-        found_item_id = db.insert_found_item(
-            category, item_name, description, color, found_location, found_date,
-            current_location, contact_name, contact_phone, photo_path
-        )
+                photo_path = uploads.store_upload(file)
+        photo_hash = uploads.photo_hash(photo_path)
         
-        # Run AI matching against lost items
-        matches = matcher.find_matches_for_found_item(found_item_id)
+        # Insert the item and queue AI matching against lost items
+        with db.transaction():
+            found_item_id = db.insert_found_item(
+                category, item_name, description, color, found_location, found_date,
+                current_location, contact_name, contact_phone, photo_path, photo_hash
+            )
+            db.enqueue_job('match_found', found_item_id)
+            if photo_path:
+                db.enqueue_job('photo_variants_found', found_item_id)
         
-        if matches:
-            # Store matches in database
-            for match in matches:
-                db.insert_match(
-                    match['lost_item_id'], 
-                    found_item_id, 
-                    match['confidence_score'],
-                    match['category_score'],
-                    match['location_score'],
-                    match['description_score']
-                )
-            
-            flash(f'Found item reported! We found {len(matches)} potential matches.', 'success')
-            return redirect(url_for('matches', found_item_id=found_item_id))
-        else:
-            flash('Found item reported! We will notify owners when there is a match.', 'info')
-            return redirect(url_for('index'))
+        flash('Found item reported! Our AI is searching for matching owners now.', 'success')
+        return redirect(url_for('main.matches', found_item_id=found_item_id))
     
     return render_template('report_found.html')
 
-@app.route('/matches')
+@bp.route('/matches')
 def matches():
     """Display match results"""
     lost_item_id = request.args.get('lost_item_id', type=int)
@@ -152,17 +218,22 @@ def matches():
         item_type = 'found'
     else:
         flash('Invalid request', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    return render_template('matches.html', item=item, matches=match_results, item_type=item_type)
+    # While matching is still queued the page polls /api/match_status
+    job = db.get_latest_job(f'match_{item_type}', item['id']) if item else None
+    matching_pending = bool(job and job['status'] in ('queued', 'running'))
+    
+    return render_template('matches.html', item=item, matches=match_results, item_type=item_type,
+                           matching_pending=matching_pending)
 
-@app.route('/claim/<int:match_id>')
+@bp.route('/claim/<int:match_id>')
 def claim_item(match_id):
     """Initiate claim process"""
     match = db.get_match(match_id)
     if not match:
         flash('Match not found', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     # Generate OTPs for both parties
     claimer_otp = otp_service.generate_otp()
@@ -178,16 +249,16 @@ def claim_item(match_id):
     session['finder_phone'] = match['found_contact_phone']
     
     flash(f'Claim initiated! OTP sent to both parties.', 'success')
-    return redirect(url_for('verify', verification_id=verification_id))
+    return redirect(url_for('main.verify', verification_id=verification_id))
 
-@app.route('/verify/<int:verification_id>', methods=['GET', 'POST'])
+@bp.route('/verify/<int:verification_id>', methods=['GET', 'POST'])
 def verify(verification_id):
     """OTP verification page"""
     verification = db.get_verification(verification_id)
     
     if not verification:
         flash('Verification not found', 'error')
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     if request.method == 'POST':
         user_type = request.form['user_type']  # 'claimer' or 'finder'
@@ -213,31 +284,45 @@ def verify(verification_id):
             db.mark_verification_complete(verification_id)
             db.update_match_status(verification['match_id'], 'verified')
             flash('Both parties verified! Handover can proceed.', 'success')
-            return redirect(url_for('timeline', match_id=verification['match_id']))
+            return redirect(url_for('main.timeline', match_id=verification['match_id']))
         
-        return redirect(url_for('verify', verification_id=verification_id))
+        return redirect(url_for('main.verify', verification_id=verification_id))
     
     # For hackathon demo: show OTPs on screen
     return render_template('verify.html', verification=verification, verification_id=verification_id)
 
-@app.route('/timeline/<int:match_id>')
+@bp.route('/timeline/<int:match_id>')
 def timeline(match_id):
     """Display recovery timeline"""
-    match = db.get_match(match_id)
-    if not match:
+    detail = db.get_match_detail(match_id)
+    if not detail:
         flash('Match not found', 'error')
-        return redirect(url_for('index'))
-    
-    timeline_events = db.get_timeline_events(match_id)
+        return redirect(url_for('main.index'))
     
-    return render_template('timeline.html', match=match, timeline=timeline_events)
+    return render_template('timeline.html', match=detail.match, timeline=detail.timeline())
 
-@app.route('/analytics')
+def get_date_range():
+    """Read optional start/end (YYYY-MM-DD) query arguments; raises ValueError if malformed"""
+    dates = []
+    for name in ('start', 'end'):
+        value = request.args.get(name) or None
+        if value:
+            value = datetime.strptime(value, '%Y-%m-%d').strftime('%Y-%m-%d')
+        dates.append(value)
+    return dates
+
+@bp.route('/analytics')
 def analytics_page():
     """Analytics dashboard"""
+    try:
+        start_date, end_date = get_date_range()
+    except ValueError:
+        flash('Dates must be in YYYY-MM-DD format', 'error')
+        start_date, end_date = None, None
+    
     # Get analytics data
-    category_stats = analytics.get_category_distribution()
-    location_stats = analytics.get_location_hotspots()
+    category_stats = analytics.get_category_distribution(start_date, end_date)
+    location_stats = analytics.get_location_hotspots(10, start_date, end_date)
     recovery_rate = analytics.get_recovery_rate()
     time_to_recovery = analytics.get_average_recovery_time()
     
@@ -245,32 +330,314 @@ def analytics_page():
                          category_stats=category_stats,
                          location_stats=location_stats,
                          recovery_rate=recovery_rate,
-                         time_to_recovery=time_to_recovery)
+                         time_to_recovery=time_to_recovery,
+                         start_date=start_date,
+                         end_date=end_date)
 
-@app.route('/my_items')
+@bp.route('/my_items')
 def my_items():
     """User dashboard - simplified for hackathon"""
     # In production, this would be user-specific
     # For hackathon, show recent items
-    lost_items = db.get_recent_lost_items(limit=10)
-    found_items = db.get_recent_found_items(limit=10)
+    try:
+        lost_items, lost_next = db.get_lost_items_page(10, request.args.get('lost_cursor'))
+        found_items, found_next = db.get_found_items_page(10, request.args.get('found_cursor'))
+    except ValueError:
+        flash('Invalid page link', 'error')
+        return redirect(url_for('main.my_items'))
     
-    return render_template('my_items.html', lost_items=lost_items, found_items=found_items)
+    return render_template('my_items.html', lost_items=lost_items, found_items=found_items,
+                           lost_next=lost_next, found_next=found_next,
+                           active_tab=request.args.get('tab', 'lost'))
+
+def remove_from_match_index(side, item_id):
+    """
+    Drop an item from this process's match index. Only a process that has
+    matched (so imported the matcher) has an index; others need no update.
+    """
+    matcher = sys.modules.get('matcher')
+    if matcher is not None:
+        matcher.remove_from_index(side, item_id)
 
-@app.route('/mark_recovered/<int:match_id>')
+@bp.route('/mark_recovered/<int:match_id>')
 def mark_recovered(match_id):
     """Mark item as successfully recovered"""
+    match = db.get_match(match_id)
+    if not match:
+        flash('Match not found', 'error')
+        return redirect(url_for('main.index'))
+    
     db.update_match_status(match_id, 'recovered')
+    
+    # Recovered items no longer take part in matching
+    db.update_lost_item_status(match['lost_item_id'], 'recovered')
+    db.update_found_item_status(match['found_item_id'], 'recovered')
+    remove_from_match_index('lost', match['lost_item_id'])
+    remove_from_match_index('found', match['found_item_id'])
+    
     flash('Item marked as recovered! Thank you for using Lost&Found AI.', 'success')
-    return redirect(url_for('timeline', match_id=match_id))
+    return redirect(url_for('main.timeline', match_id=match_id))
+
+# Photos are content-addressed, so their URLs never change content
+MEDIA_MAX_AGE = 365 * 24 * 3600
+MEDIA_PENDING_MAX_AGE = 60      # original served while its thumbnail is being made
+
+@bp.app_template_global()
+def photo_url(photo_path, size=None):
+    """URL of an uploaded photo, or of its resized variant ('thumb' or 'medium')"""
+    return url_for('main.media', photo_path=photo_path, size=size)
+
+@bp.route('/media/<path:photo_path>')
+def media(photo_path):
+    """Serve an uploaded photo; ?size=thumb|medium serves a resized (WebP if accepted) variant"""
+    if not photo_path.startswith(uploads.UPLOAD_DIR + '/') or '/.' in photo_path:
+        abort(404)
+    size = request.args.get('size')
+    path, is_variant = uploads.best_variant(photo_path, size,
+                                            'image/webp' in request.headers.get('Accept', ''))
+    immutable = is_variant or (size is None and uploads.is_content_addressed(path))
+    
+    response = send_from_directory(
+        uploads.STATIC_FOLDER, path,
+        max_age=MEDIA_MAX_AGE if immutable else MEDIA_PENDING_MAX_AGE,
+        etag=os.path.basename(path) if uploads.is_content_addressed(photo_path) else True)
+    if immutable:
+        response.cache_control.immutable = True
+    if size:
+        response.vary.add('Accept')
+    return response
+
+@bp.route('/metrics')
+def metrics():
+    """Request, database, matcher and template timings in Prometheus text format"""
+    return Response(instrumentation.render_metrics(), mimetype='text/plain; version=0.0.4')
 
 # API endpoints for AJAX calls
-@app.route('/api/stats')
+@bp.route('/api/stats')
 def api_stats():
     """Get current stats"""
     return jsonify(db.get_stats())
 
+@bp.route('/api/analytics/<name>')
+def api_analytics(name):
+    """Analytics report as JSON, or its rows streamed as NDJSON with ?format=ndjson"""
+    if name not in analytics.REPORTS:
+        return jsonify({'error': f'unknown report {name}',
+                        'reports': sorted(analytics.REPORTS)}), 404
+    try:
+        start_date, end_date = get_date_range()
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    
+    summary, rows = analytics.REPORTS[name]
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(row) + '\n' for row in rows(start_date, end_date))
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+    
+    return jsonify(summary(start_date, end_date))
+
+# Contact details are only shown on the pages a claim goes through
+PRIVATE_FIELDS = ('contact_name', 'contact_phone', 'contact_email')
+
+def page_response(rows, next_cursor):
+    """JSON body for one keyset page"""
+    return jsonify({
+        'items': [{key: value for key, value in row.items() if key not in PRIVATE_FIELDS}
+                  for row in rows],
+        'next_cursor': next_cursor
+    })
+
+def page_args():
+    """Read limit and cursor query arguments"""
+    return request.args.get('limit', 20, type=int), request.args.get('cursor')
+
+@bp.route('/api/lost_items')
+def api_lost_items():
+    """Page through lost items, newest first"""
+    limit, cursor = page_args()
+    try:
+        return page_response(*db.get_lost_items_page(limit, cursor, request.args.get('status')))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+
+@bp.route('/api/found_items')
+def api_found_items():
+    """Page through found items, newest first"""
+    limit, cursor = page_args()
+    try:
+        return page_response(*db.get_found_items_page(limit, cursor, request.args.get('status')))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+
+@bp.route('/api/matches')
+def api_matches():
+    """Page through an item's matches, best first"""
+    lost_item_id = request.args.get('lost_item_id', type=int)
+    found_item_id = request.args.get('found_item_id', type=int)
+    if lost_item_id is None and found_item_id is None:
+        return jsonify({'error': 'lost_item_id or found_item_id is required'}), 400
+    
+    limit, cursor = page_args()
+    try:
+        return page_response(*db.get_matches_page(lost_item_id, found_item_id, limit, cursor))
+    except ValueError:
+        return jsonify({'error': 'invalid cursor'}), 400
+
+@bp.route('/api/match_status')
+def api_match_status():
+    """Get the matching job status and match count for an item"""
+    lost_item_id = request.args.get('lost_item_id', type=int)
+    found_item_id = request.args.get('found_item_id', type=int)
+    
+    if lost_item_id:
+        job = db.get_latest_job('match_lost', lost_item_id)
+        match_results = db.get_matches_for_lost_item(lost_item_id)
+    elif found_item_id:
+        job = db.get_latest_job('match_found', found_item_id)
+        match_results = db.get_matches_for_found_item(found_item_id)
+    else:
+        return jsonify({'error': 'lost_item_id or found_item_id is required'}), 400
+    
+    return jsonify({
+        'status': job['status'] if job else None,
+        'match_count': len(match_results)
+    })
+
+@bp.cli.command('init-db')
+def init_db_command():
+    """Create the tables and apply pending schema migrations (safe to repeat)"""
+    applied = db.init_db()
+    if applied:
+        print(f"Applied migrations {', '.join(map(str, applied))} to {db.DATABASE}.")
+    else:
+        print(f"{db.DATABASE} is up to date.")
+
+@bp.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a hot read path does a full table scan"""
+    problems = db.check_query_plans()
+    for name, sql, detail in problems:
+        print(f"{name}: {detail}\n    {sql}")
+    if problems:
+        raise SystemExit(1)
+    print("All hot query paths use indexes.")
+
+@bp.cli.command('rebuild-aggregates')
+def rebuild_aggregates_command():
+    """Recompute the aggregate counter tables from the item tables"""
+    db.rebuild_aggregates()
+    print("Aggregates rebuilt.")
+
+@bp.cli.command('check-aggregates')
+def check_aggregates_command():
+    """Fail if an aggregate counter disagrees with the item tables"""
+    problems = db.check_aggregates()
+    for table, key, expected, actual in problems:
+        print(f"{table} {key}: expected {expected}, found {actual}")
+    if problems:
+        raise SystemExit(1)
+    print("All aggregates are consistent.")
+
+@bp.cli.command('import-items')
+@click.argument('side', type=click.Choice(['lost', 'found']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=importer.IMPORT_BATCH_SIZE, show_default=True,
+              help='rows inserted per transaction')
+@click.option('--match/--no-match', default=True, show_default=True,
+              help='run one matching pass over the imported items afterwards')
+@click.option('--notify/--no-notify', default=False, show_default=True,
+              help='notify owners about the matches found')
+def import_items_command(side, path, batch_size, match, notify):
+    """Bulk import lost or found items from a CSV or JSONL file"""
+    def report_import(imported):
+        print(f"  {imported} rows imported")
+    
+    before, state = db.get_max_item_ids(), db.get_rematch_state()
+    try:
+        result = importer.import_items(side, importer.read_records(path), batch_size, report_import)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    rate = result['imported'] / result['seconds'] if result['seconds'] else 0
+    print(f"Imported {result['imported']} {side} items in {result['seconds']:.1f}s "
+          f"({rate:,.0f} rows/s), skipped {result['skipped']} bad rows")
+    
+    if not match:
+        print("Matching deferred to the next re-match run.")
+        return
+    
+    started = time.perf_counter()
+    reported = 0
+    def report_matching(scored):
+        # Called once per scored block; print about every 1000 items
+        nonlocal reported
+        if scored // 1000 > reported // 1000:
+            elapsed = time.perf_counter() - started
+            print(f"  {scored} lost items matched ({scored / elapsed:,.0f} items/s)")
+        reported = scored
+    
+    summary = importer.match_imported(side, before, state, notify, report_matching)
+    print(f"Matched {summary['lost_items']} lost x {summary['found_items']} found items in "
+          f"{time.perf_counter() - started:.1f}s, added {summary['matches_added']} matches, "
+          f"sent {summary['notifications_sent']} notifications")
+
+@bp.cli.command('rematch')
+def rematch_command():
+    """Match items reported since the last run against older items"""
+    import rematch
+    summary = rematch.run_rematch()
+    if summary is None:
+        print("Another re-match run is in progress; nothing to do.")
+        return
+    print(f"New lost items: {summary['new_lost_items']}, "
+          f"new found items: {summary['new_found_items']}, "
+          f"matches added: {summary['matches_added']}, "
+          f"notifications sent: {summary['notifications_sent']}")
+
+@bp.cli.command('match-all')
+@click.option('--top-n', default=3, show_default=True, help='matches kept per lost item')
+@click.option('--threshold', default=0.40, show_default=True, help='minimum confidence (0-1)')
+@click.option('--processes', default=1, show_default=True, help='scoring processes')
+@click.option('--block-cells', type=int,
+              help='lost x found pairs scored per block (bounds memory) '
+                   '[default: matcher.BATCH_BLOCK_CELLS]')
+def match_all_command(top_n, threshold, processes, block_cells):
+    """Re-score every active lost item against every active found item"""
+    import matcher
+    def report(scored):
+        print(f"  {scored} lost items scored")
+    
+    summary = matcher.run_batch_matching(top_n, threshold, processes,
+                                         block_cells or matcher.BATCH_BLOCK_CELLS, report)
+    print(f"Scored {summary['lost_items']} lost x {summary['found_items']} found items in "
+          f"{summary['seconds']:.1f}s, wrote {summary['matches_written']} matches "
+          f"({summary['matches_added']} new)")
+
+@bp.cli.command('hash-photos')
+def hash_photos_command():
+    """Compute the perceptual hash of item photos uploaded before photos were hashed"""
+    for side in ('lost', 'found'):
+        photos = db.get_unhashed_photos(side)
+        hashes = [(item_id, uploads.photo_hash(photo_path)) for item_id, photo_path in photos]
+        hashes = [(item_id, photo_hash) for item_id, photo_hash in hashes if photo_hash is not None]
+        db.set_photo_hashes(side, hashes)
+        print(f"{side.capitalize()} items: hashed {len(hashes)} of {len(photos)} photos")
+
+@bp.cli.command('match-snapshot')
+def match_snapshot_command():
+    """Fit the match index and save the snapshot workers map at startup"""
+    import matcher
+    if not matcher.SNAPSHOT_PATH:
+        raise click.ClickException("Snapshots are disabled (LOSTFOUND_MATCH_SNAPSHOT is empty)")
+    index = matcher.save_index_snapshot()
+    if index.vectorizer is None:
+        print("No item descriptions to index yet; no snapshot written.")
+        return
+    print(f"Saved {len(index.sides['lost'])} lost and {len(index.sides['found'])} found items "
+          f"to {matcher.SNAPSHOT_PATH}")
+
 if __name__ == '__main__':
-    # Create upload folder if it doesn't exist
+    # Development server: set up the schema and upload folder, then serve
+    db.init_db()
+    app = create_app()
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
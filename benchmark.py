@@ -0,0 +1,480 @@
+"""
+Matching benchmark on a synthetic corpus.
+
+Generates lost and found items (categories, colors, locations and
+descriptions, with a controlled share of found items that really are one
+of the lost items), loads them into a scratch SQLite database and times
+matching, report submission and analytics at each scale. Results are
+written as JSON so two commits can be compared:
+
+    python benchmark.py --scales 1000 10000 100000 --output bench.json
+    python benchmark.py --scales 1000 10000 --compare bench.json
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+# The app is imported per run, after the database points at the scratch file;
+# jobs and re-matches are driven by the benchmark, not by background threads
+os.environ.setdefault('LOSTFOUND_MATCH_WORKERS', '0')
+os.environ.setdefault('LOSTFOUND_REMATCH_INTERVAL', '0')
+
+import analytics
+import cache
+import database as db
+import matcher
+import worker
+
+DEFAULT_SCALES = (1000, 10000, 100000)
+DEFAULT_QUERIES = 200       # timed calls per matching/report benchmark
+DEFAULT_REPEAT = 5          # timed calls per analytics query
+DEFAULT_OVERLAP = 0.3       # share of found items that are copies of a lost item
+DEFAULT_TOLERANCE = 0.20    # p95 slowdown reported as a regression by --compare
+STARTUP_RUNS = 5            # fresh processes per time-to-first-request benchmark
+STARTUP_ROUTES = {'startup_index': '/', 'startup_api_stats': '/api/stats'}
+STARTUP_BUDGET_MS = 500     # p95 time to first request that fails the run
+
+# Synthetic corpus
+CATEGORY_ITEMS = {
+    'Phone': ['iPhone 13', 'Samsung Galaxy S22', 'Pixel 7', 'OnePlus 9', 'Redmi Note 12'],
+    'Wallet': ['leather wallet', 'card holder', 'purse', 'coin pouch', 'travel wallet'],
+    'Keys': ['house keys', 'car key fob', 'bike lock key', 'locker key', 'key ring'],
+    'Bag': ['backpack', 'tote bag', 'laptop bag', 'gym bag', 'sling bag'],
+    'Documents': ['student ID card', 'passport', 'driving licence', 'folder of notes', 'bank card'],
+    'Electronics': ['laptop', 'wireless earbuds', 'headphones', 'power bank', 'calculator'],
+    'Jewelry': ['silver ring', 'gold chain', 'wrist watch', 'bracelet', 'earrings'],
+    'Clothing': ['hoodie', 'denim jacket', 'scarf', 'baseball cap', 'raincoat'],
+    'Books': ['textbook', 'notebook', 'novel', 'lab manual', 'sketchbook'],
+    'Other': ['water bottle', 'umbrella', 'glasses case', 'pencil case', 'lunch box'],
+}
+COLORS = ['black', 'white', 'blue', 'red', 'green', 'grey', 'brown', 'pink', 'silver', 'gold']
+DETAILS = [
+    'cracked screen', 'sticker on the back', 'scratched corner', 'almost new',
+    'name written inside', 'keychain attached', 'broken zip', 'initials engraved',
+    'slightly worn', 'transparent case', 'torn strap', 'coffee stain',
+    'two pens inside', 'charging cable attached', 'faded logo', 'missing button',
+]
+LOCATIONS = [
+    'Main Library', 'Library 2nd Floor', 'Cafeteria', 'Gym', 'Block A Room 101',
+    'Block B Lab 3', 'Parking Lot', 'Bus Stop', 'Auditorium', 'Student Center',
+    'Hostel Lobby', 'Sports Ground', 'Canteen', 'Admin Office', 'Computer Lab',
+]
+FIRST_NAMES = ['Asha', 'Ravi', 'Meera', 'John', 'Fatima', 'Li', 'Carlos', 'Nina', 'Omar', 'Sara']
+
+def _location(rng):
+    """Pick a location; a few places get most of the reports"""
+    return rng.choices(LOCATIONS, weights=[1 / (rank + 1) for rank in range(len(LOCATIONS))])[0]
+
+def _created_at(rng, now, days=90):
+    return (now - timedelta(seconds=rng.randrange(days * 86400))).strftime('%Y-%m-%d %H:%M:%S')
+
+def _describe(color, item_name, details):
+    return f"{color} {item_name}, {' and '.join(details)}"
+
+def generate_corpus(count, overlap=DEFAULT_OVERLAP, seed=0):
+    """
+    Generate `count` lost and `count` found items as insert tuples in
+    importer.IMPORT_COLUMNS order. A share `overlap` of the found items
+    describe one of the lost items again, with the details reworded and
+    sometimes a nearby location; returns (lost_rows, found_rows, pairs)
+    where pairs are (lost_index, found_index) of those true matches.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+    lost_rows, found_rows, pairs = [], [], []
+    lost_items = []
+
+    for _ in range(count):
+        category = rng.choice(list(CATEGORY_ITEMS))
+        item = {
+            'category': category,
+            'item_name': rng.choice(CATEGORY_ITEMS[category]),
+            'color': rng.choice(COLORS),
+            'details': rng.sample(DETAILS, 2),
+            'location': _location(rng),
+        }
+        lost_items.append(item)
+        name = rng.choice(FIRST_NAMES)
+        lost_rows.append((
+            category, item['item_name'],
+            _describe(item['color'], item['item_name'], item['details']),
+            item['color'], item['location'], now.strftime('%Y-%m-%d'),
+            name, f'+1555{rng.randrange(10 ** 7):07d}', f'{name.lower()}@example.com',
+            None, _created_at(rng, now)
+        ))
+
+    for index in range(count):
+        if rng.random() < overlap:
+            lost_index = rng.randrange(count)
+            item = dict(lost_items[lost_index])
+            # The finder notices one of the same details and one of their own
+            item['details'] = [rng.choice(item['details']), rng.choice(DETAILS)]
+            if rng.random() < 0.3:
+                item['location'] = _location(rng)
+            pairs.append((lost_index, index))
+        else:
+            category = rng.choice(list(CATEGORY_ITEMS))
+            item = {
+                'category': category,
+                'item_name': rng.choice(CATEGORY_ITEMS[category]),
+                'color': rng.choice(COLORS),
+                'details': rng.sample(DETAILS, 2),
+                'location': _location(rng),
+            }
+        name = rng.choice(FIRST_NAMES)
+        found_rows.append((
+            item['category'], item['item_name'],
+            _describe(item['color'], item['item_name'], item['details']),
+            item['color'], item['location'], now.strftime('%Y-%m-%d'), 'Security Desk',
+            name, f'+1555{rng.randrange(10 ** 7):07d}', None, _created_at(rng, now)
+        ))
+
+    return lost_rows, found_rows, pairs
+
+def seed_matches(pairs, seed=0, recovered_share=0.05):
+    """
+    Store the true pairs as matches (ids are row positions + 1 in a fresh
+    database) and walk a share of them to 'recovered', so the analytics
+    queries have matches, statuses and recovery times to aggregate
+    """
+    rng = random.Random(seed)
+    rows = []
+    for lost_index, found_index in pairs:
+        category, location, description = 100.0, rng.choice([100.0, 70.0, 0.0]), rng.uniform(30, 95)
+        rows.append((lost_index + 1, found_index + 1,
+                     matcher.weighted_score(description, category, location),
+                     category, location, description))
+    db.insert_matches_bulk(rows)
+
+    recovered = rng.sample(range(1, len(rows) + 1), int(len(rows) * recovered_share))
+    for match_id in recovered:
+        db.update_match_status(match_id, 'recovered')
+
+# Measurements
+def peak_rss_mb():
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def summarize(latencies, elapsed):
+    """Latency percentiles (ms), throughput and peak memory for a list of call times"""
+    ms = np.array(latencies or [0.0]) * 1000
+    return {
+        'count': len(latencies),
+        'p50_ms': float(np.percentile(ms, 50)),
+        'p95_ms': float(np.percentile(ms, 95)),
+        'p99_ms': float(np.percentile(ms, 99)),
+        'mean_ms': float(ms.mean()),
+        'max_ms': float(ms.max()),
+        'throughput_per_s': len(latencies) / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+def time_calls(func, calls):
+    """Call func(*args) for every args tuple and summarize the call times"""
+    latencies = []
+    started = time.perf_counter()
+    for args in calls:
+        call_started = time.perf_counter()
+        func(*args)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+def time_once(func, units=1):
+    """Time a single call; units is what throughput is counted in (e.g. rows)"""
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    return {
+        'seconds': elapsed,
+        'throughput_per_s': units / elapsed if elapsed else 0.0,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+# Time to first request: a fresh interpreter imports the app, builds it and
+# serves one route. Serving pages must not load the matcher's dependencies.
+STARTUP_PROBE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+sys.path.insert(0, {root!r})
+import database as db
+db.DATABASE = {database!r}
+import app
+client = app.create_app({{'MATCH_WORKERS': 0, 'REMATCH_INTERVAL': 0}}).test_client()
+status = client.get({path!r}).status_code
+print(json.dumps({{'seconds': time.perf_counter() - started, 'status': status,
+                  'peak_rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'heavy_modules': sorted({{name.split('.')[0] for name in sys.modules}}
+                                          & {{'numpy', 'scipy', 'sklearn'}})}}))
+'''
+
+def time_startup(database, path, runs=STARTUP_RUNS):
+    """
+    Time to first request for `path` in `runs` fresh processes: p50/p95 from
+    importing the app to its response, plus the wall time of the whole
+    process (interpreter start included) and any heavy modules it loaded
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    probe = STARTUP_PROBE.format(root=root, database=database, path=path)
+    latencies, wall, peak_rss, heavy = [], [], [], set()
+    started = time.perf_counter()
+    for _ in range(runs):
+        process_started = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', probe], capture_output=True, text=True,
+                                check=True, cwd=root).stdout
+        wall.append(time.perf_counter() - process_started)
+        result = json.loads(output.strip().splitlines()[-1])
+        if result['status'] != 200:
+            raise RuntimeError(f"{path} returned {result['status']} on a fresh start")
+        latencies.append(result['seconds'])
+        peak_rss.append(result['peak_rss'])
+        heavy.update(result['heavy_modules'])
+    stats = summarize(latencies, time.perf_counter() - started)
+    stats['process_p50_ms'] = float(np.percentile(np.array(wall) * 1000, 50))
+    # The app process's memory, not this one's (ru_maxrss: KiB on Linux, bytes on macOS)
+    stats['peak_rss_mb'] = max(peak_rss) / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+    stats['heavy_modules'] = sorted(heavy)
+    return stats
+
+def check_startup(report, budget_ms=STARTUP_BUDGET_MS):
+    """
+    Startup benchmarks over budget (p95 ms) or that loaded the matcher's
+    dependencies; returns (scale, benchmark, problem) for each
+    """
+    problems = []
+    for scale, results in report['scales'].items():
+        for name in STARTUP_ROUTES:
+            stats = results.get(name)
+            if stats is None:
+                continue
+            if stats['p95_ms'] > budget_ms:
+                problems.append((scale, name, f"p95 {stats['p95_ms']:.0f} ms > {budget_ms:.0f} ms"))
+            if stats['heavy_modules']:
+                problems.append((scale, name, f"imported {', '.join(stats['heavy_modules'])}"))
+    return problems
+
+# Analytics queries, timed without the result cache
+ANALYTICS_QUERIES = {
+    'analytics_category_distribution': lambda: analytics.get_category_distribution.uncached(),
+    'analytics_location_hotspots': lambda: analytics.get_location_hotspots.uncached(10),
+    'analytics_recovery_rate': analytics.get_recovery_rate,
+    'analytics_recovery_time': lambda: analytics.get_average_recovery_time.uncached(),
+    'analytics_daily_heatmap': lambda: analytics.get_daily_heatmap.uncached(),
+    'analytics_hourly_heatmap': lambda: analytics.get_hourly_heatmap.uncached(),
+    'analytics_crosstab': lambda: analytics.get_category_location_crosstab.uncached(),
+    'analytics_match_accuracy': lambda: analytics.get_match_accuracy_stats.uncached(),
+    'dashboard_stats': lambda: db.get_stats.uncached(),
+}
+
+def _report_form(side, row):
+    """Report form fields for a generated insert tuple"""
+    if side == 'lost':
+        fields = ('category', 'item_name', 'description', 'color', 'location', 'lost_date',
+                  'contact_name', 'contact_phone', 'contact_email')
+    else:
+        fields = ('category', 'item_name', 'description', 'color', 'found_location',
+                  'found_date', 'current_location', 'contact_name', 'contact_phone')
+    return dict(zip(fields, row))
+
+def run_scale(count, database, queries=DEFAULT_QUERIES, repeat=DEFAULT_REPEAT,
+              overlap=DEFAULT_OVERLAP, seed=0, log=print):
+    """Run every benchmark on a fresh database with `count` items per side"""
+    db.DATABASE = database
+    db.init_db()
+    matcher.SNAPSHOT_PATH = os.path.splitext(database)[0] + '.snapshot'
+    matcher.reset_index()
+    cache.invalidate()
+    import app as app_module
+    client = app_module.create_app().test_client()
+
+    results = {}
+    rng = random.Random(seed)
+    lost_rows, found_rows, pairs = generate_corpus(count, overlap, seed)
+    # Submitted reports are new rows, so generate them apart from the corpus
+    extra_lost, extra_found, _ = generate_corpus(queries, overlap, seed + 1)
+
+    log(f"[{count}] loading {2 * count} items")
+    results['load'] = time_once(lambda: (db.insert_lost_items_bulk(lost_rows),
+                                          db.insert_found_items_bulk(found_rows)), 2 * count)
+    seed_matches(pairs, seed)
+
+    log(f"[{count}] starting the app in fresh processes")
+    for name, path in STARTUP_ROUTES.items():
+        results[name] = time_startup(database, path)
+
+    log(f"[{count}] building the match index")
+    results['index_build'] = time_once(matcher.get_index, 2 * count)
+    # A second process starts from the snapshot the build saved
+    matcher.reset_index()
+    results['index_snapshot_load'] = time_once(matcher.get_index, 2 * count)
+
+    log(f"[{count}] matching {queries} lost and {queries} found items")
+    results['find_matches_for_lost_item'] = time_calls(
+        matcher.find_matches_for_lost_item, [(rng.randint(1, count),) for _ in range(queries)])
+    results['find_matches_for_found_item'] = time_calls(
+        matcher.find_matches_for_found_item, [(rng.randint(1, count),) for _ in range(queries)])
+
+    log(f"[{count}] submitting {queries} lost and {queries} found reports")
+    results['report_lost'] = time_calls(
+        lambda form: client.post('/report_lost', data=form),
+        [(_report_form('lost', row),) for row in extra_lost])
+    results['report_found'] = time_calls(
+        lambda form: client.post('/report_found', data=form),
+        [(_report_form('found', row),) for row in extra_found])
+
+    # Match the submitted reports the way the background worker would
+    jobs = []
+    while True:
+        job = db.claim_job()
+        if job is None:
+            break
+        jobs.append((job,))
+    results['match_job'] = time_calls(worker.run_job, jobs)
+
+    log(f"[{count}] running analytics queries")
+    for name, query in ANALYTICS_QUERIES.items():
+        results[name] = time_calls(query, [()] * repeat)
+
+    def load_analytics_page():
+        cache.invalidate()
+        client.get('/analytics')
+    results['analytics_page'] = time_calls(load_analytics_page, [()] * repeat)
+
+    matcher.reset_index()
+    return results
+
+def git_commit():
+    """Current commit of the working tree, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmarks(scales=DEFAULT_SCALES, queries=DEFAULT_QUERIES, repeat=DEFAULT_REPEAT,
+                   overlap=DEFAULT_OVERLAP, seed=0, keep=False, log=print):
+    """Run every scale in its own scratch database; returns the JSON report"""
+    directory = tempfile.mkdtemp(prefix='lostfound-bench-')
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'queries': queries,
+            'repeat': repeat,
+            'overlap': overlap,
+            'seed': seed,
+        },
+        'scales': {}
+    }
+    try:
+        for count in scales:
+            database = os.path.join(directory, f'bench_{count}.db')
+            report['scales'][str(count)] = run_scale(count, database, queries, repeat,
+                                                     overlap, seed, log)
+    finally:
+        if keep:
+            log(f"Scratch databases kept in {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+    return report
+
+def print_report(report):
+    """Print p50/p95/p99 and throughput for every benchmark"""
+    for scale, results in report['scales'].items():
+        print(f"\n{scale} items per side")
+        print(f"  {'benchmark':<36}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'per s':>12}")
+        for name, stats in results.items():
+            if 'p50_ms' in stats:
+                print(f"  {name:<36}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                      f"{stats['p99_ms']:>10.2f}{stats['throughput_per_s']:>12,.1f}")
+            else:
+                print(f"  {name:<36}{stats['seconds'] * 1000:>10.0f}{'':>20}"
+                      f"{stats['throughput_per_s']:>12,.1f}")
+        peak = max(stats['peak_rss_mb'] for stats in results.values())
+        print(f"  peak RSS {peak:.0f} MB")
+
+def compare_reports(baseline, current, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare p95 latency (or total seconds) of every benchmark both reports
+    ran; returns (scale, benchmark, baseline, current, ratio) for the ones
+    that got more than `tolerance` slower
+    """
+    regressions = []
+    for scale, results in current['scales'].items():
+        for name, stats in results.items():
+            before = baseline['scales'].get(scale, {}).get(name)
+            if before is None:
+                continue
+            metric = 'p95_ms' if 'p95_ms' in stats else 'seconds'
+            if not before.get(metric):
+                continue
+            ratio = stats[metric] / before[metric]
+            marker = '  REGRESSION' if ratio > 1 + tolerance else ''
+            print(f"  [{scale}] {name:<36}{before[metric]:>10.2f} -> {stats[metric]:>10.2f} "
+                  f"{metric} ({ratio:.2f}x){marker}")
+            if marker:
+                regressions.append((scale, name, before[metric], stats[metric], ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark matching, reports and analytics')
+    parser.add_argument('--scales', type=int, nargs='+', default=list(DEFAULT_SCALES),
+                        help='items per side for each run')
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES,
+                        help='timed calls per matching and report benchmark')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help='timed calls per analytics query')
+    parser.add_argument('--overlap', type=float, default=DEFAULT_OVERLAP,
+                        help='share of found items that describe a lost item')
+    parser.add_argument('--seed', type=int, default=0, help='corpus random seed')
+    parser.add_argument('--output', help='write the JSON report to this file')
+    parser.add_argument('--compare', help='baseline JSON report to compare against')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='p95 slowdown (0.2 = 20%%) counted as a regression')
+    parser.add_argument('--keep', action='store_true', help='keep the scratch databases')
+    parser.add_argument('--startup-budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help='fail if time to first request (p95) exceeds this (0 disables)')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.queries, args.repeat, args.overlap,
+                            args.seed, args.keep)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    failed = False
+    if args.startup_budget_ms:
+        problems = check_startup(report, args.startup_budget_ms)
+        for scale, name, problem in problems:
+            print(f"  [{scale}] {name}: {problem}  STARTUP")
+        failed = bool(problems)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"\nCompared with {args.compare} ({baseline['meta'].get('commit')})")
+        failed = bool(compare_reports(baseline, report, args.tolerance)) or failed
+    if failed:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
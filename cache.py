@@ -0,0 +1,208 @@
+"""
+Read-through cache for dashboard statistics and analytics.
+
+Results of decorated functions are kept for CACHE_TTL seconds and dropped
+as soon as a write that changes them commits. Two backends:
+
+    memory  - in-process LRU (default; one cache per process)
+    file    - pickled entries in a shared directory, so every Gunicorn
+              worker on the host shares them (defaults to /dev/shm)
+
+Invalidation bumps a generation counter instead of deleting entries, so a
+value computed from data read before the write is never stored after it.
+"""
+from collections import OrderedDict
+from functools import wraps
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+CACHE_BACKEND = os.environ.get('LOSTFOUND_CACHE_BACKEND', 'memory')
+CACHE_TTL = float(os.environ.get('LOSTFOUND_CACHE_TTL', 60))    # seconds
+CACHE_MAX_ENTRIES = int(os.environ.get('LOSTFOUND_CACHE_MAX_ENTRIES', 256))
+CACHE_DIR = os.environ.get('LOSTFOUND_CACHE_DIR') or os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'lostfound-cache')
+
+_MISSING = object()
+
+class MemoryCache:
+    """In-process LRU cache with per-entry expiry"""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self):
+        return self._generation
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+class FileCache:
+    """
+    Cache shared between processes through a directory of pickle files.
+    Entry files are named by key and generation and their mtime is set to
+    their expiry time, so every write can drop expired and stale-generation
+    entries, and then the ones expiring first beyond max_entries, from a
+    directory listing alone. The generation is a counter file, bumped under
+    a lock and replaced atomically.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_entries=CACHE_MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        os.makedirs(directory, exist_ok=True)
+        self._generation_path = os.path.join(directory, 'generation')
+        self._lock_path = os.path.join(directory, 'generation.lock')
+
+    def generation(self):
+        try:
+            with open(self._generation_path, 'rb') as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _path(self, key, generation):
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.directory, f'{digest}-{generation}.cache')
+
+    def _write(self, path, data, mtime=None):
+        """Write then rename, so readers never see a partial file"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            if mtime is not None:
+                os.utime(tmp_path, (mtime, mtime))
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def get(self, key):
+        try:
+            with open(self._path(key, self.generation()), 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return _MISSING
+        if expires_at < time.time():
+            return _MISSING
+        return value
+
+    def set(self, key, value, ttl, generation):
+        if generation != self.generation():
+            return
+        expires_at = time.time() + ttl
+        self._write(self._path(key, generation), pickle.dumps((expires_at, value)), expires_at)
+        self._evict(generation)
+
+    def _evict(self, generation):
+        """Remove expired and stale-generation entries, then any beyond max_entries"""
+        now = time.time()
+        suffix = f'-{generation}.cache'
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if not entry.name.endswith('.cache'):
+                    continue
+                try:
+                    expires_at = entry.stat().st_mtime
+                except FileNotFoundError:
+                    continue
+                if entry.name.endswith(suffix) and expires_at >= now:
+                    entries.append((expires_at, entry.path))
+                else:
+                    self._remove(entry.path)
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[:len(entries) - self.max_entries]:
+                self._remove(path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass   # another process evicted it first
+
+    def invalidate(self):
+        # The lock keeps concurrent invalidations from losing an increment
+        with open(self._lock_path, 'wb') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._write(self._generation_path, str(self.generation() + 1).encode())
+
+BACKENDS = {
+    'memory': MemoryCache,
+    'file': FileCache,
+}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    """Get the configured cache backend"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = BACKENDS[CACHE_BACKEND]()
+        return _cache
+
+def set_backend(name, **options):
+    """Switch to another backend, e.g. set_backend('file', directory='/tmp/cache')"""
+    global _cache
+    with _cache_lock:
+        _cache = BACKENDS[name](**options)
+
+def invalidate():
+    """Drop every cached result"""
+    get_cache().invalidate()
+
+def cached(ttl=None):
+    """Decorator: serve the function's result from the cache, keyed by its arguments"""
+    def decorator(func):
+        name = f'{func.__module__}.{func.__qualname__}'
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            key = repr((name, args, sorted(kwargs.items())))
+            value = cache.get(key)
+            if value is not _MISSING:
+                return value
+            generation = cache.generation()
+            value = func(*args, **kwargs)
+            cache.set(key, value, CACHE_TTL if ttl is None else ttl, generation)
+            return value
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
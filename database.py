@@ -1,17 +1,171 @@
 import sqlite3
+from contextlib import contextmanager
+from dataclasses import dataclass
 from datetime import datetime
+import base64
+import json
 import os
+import queue
+import threading
+
+import cache
 
 DATABASE = 'lostandfound.db'
 
+MAX_ID = 2 ** 63 - 1  # largest SQLite integer id
+
+# Connection pool settings
+POOL_SIZE = int(os.environ.get('LOSTFOUND_DB_POOL_SIZE', 8))  # idle connections kept open
+STATEMENT_CACHE_SIZE = int(os.environ.get('LOSTFOUND_DB_STATEMENT_CACHE', 256))
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections to one database file"""
+
+    def __init__(self, database, size=POOL_SIZE):
+        self.database = database
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        # Connections move between threads, but only one thread uses a
+        # connection at a time; the pool hands them out exclusively
+        conn = sqlite3.connect(self.database, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one if none is available"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Return a connection; anything left uncommitted is rolled back"""
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+class PooledConnection:
+    """
+    Connection handed out by get_db_connection().
+    Behaves like sqlite3.Connection, but close() gives it back to the pool,
+    or does nothing while the connection is bound to the current request.
+    """
+
+    def __init__(self, pool, conn, bound=False):
+        self._pool = pool
+        self._conn = conn
+        self._bound = bound
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def commit(self):
+        # Inside transaction() the unit of work commits once at the end
+        if self._bound and getattr(_local, 'transaction_depth', 0):
+            return
+        self._conn.commit()
+
+    def close(self):
+        if self._bound or self._conn is None:
+            return
+        self._pool.release(self._conn)
+        self._conn = None
+
+_pool = None
+_pool_lock = threading.Lock()
+_local = threading.local()
+
+def get_pool():
+    """Get the connection pool for the current DATABASE"""
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.database != DATABASE:
+            if _pool is not None:
+                _pool.close_all()
+            _pool = ConnectionPool(DATABASE)
+        return _pool
+
 def get_db_connection():
-    """Create database connection"""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get database connection (the request's bound one, or one from the pool)"""
+    pool = get_pool()
+    bound = getattr(_local, 'connection', None)
+    if bound is not None:
+        return PooledConnection(pool, bound, bound=True)
+    return PooledConnection(pool, pool.acquire())
+
+def bind_connection():
+    """Bind one pooled connection to the current thread until release_connection()"""
+    if getattr(_local, 'connection', None) is None:
+        _local.pool = get_pool()
+        _local.connection = _local.pool.acquire()
+
+def release_connection():
+    """Return the connection bound to the current thread to the pool"""
+    conn = getattr(_local, 'connection', None)
+    if conn is not None:
+        _local.connection = None
+        _local.pool.release(conn)
+
+@contextmanager
+def transaction():
+    """
+    Unit of work: every database call inside the block runs on the same
+    connection and is committed once at the end, or rolled back entirely
+    if the block raises. Nested blocks join the outer transaction.
+    """
+    bound_here = getattr(_local, 'connection', None) is None
+    if bound_here:
+        bind_connection()
+    depth = getattr(_local, 'transaction_depth', 0)
+    if depth == 0:
+        _local.after_commit = []
+    _local.transaction_depth = depth + 1
+    conn = _local.connection
+    try:
+        yield
+        if depth == 0:
+            conn.commit()
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        raise
+    finally:
+        _local.transaction_depth = depth
+        if bound_here:
+            release_connection()
+    if depth == 0:
+        callbacks, _local.after_commit = _local.after_commit, []
+        for callback in dict.fromkeys(callbacks):
+            callback()
+
+def after_commit(callback):
+    """Run callback once the current write is committed (at the end of transaction(), if one is open)"""
+    if getattr(_local, 'transaction_depth', 0):
+        _local.after_commit.append(callback)
+    else:
+        callback()
 
 def init_db():
-    """Initialize database with tables"""
+    """
+    Create the tables and apply pending migrations; returns the migration
+    versions applied. Safe to run any number of times, from any process.
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -87,29 +241,388 @@ def init_db():
     ''')
     
     conn.commit()
+    
+    # Bring the schema up to date
+    applied = migrate(conn)
+    
+    conn.close()
+    return applied
+
+# Aggregate counters
+# Seconds from a lost item's report to a recovery event `e`
+RECOVERY_SECONDS_SQL = '''
+    SELECT MAX(0, CAST(ROUND((julianday(e.created_at) - julianday(l.created_at)) * 86400)
+                       AS INTEGER)) AS seconds
+    FROM match_events e
+    JOIN matches m ON m.id = e.match_id
+    JOIN lost_items l ON l.id = m.lost_item_id
+'''
+
+# Dashboard totals and per-category/location/day counts of lost items are kept
+# in summary tables by triggers, so stats and analytics read a few rows
+# instead of scanning the item tables. Each entry is (table, key columns,
+# value columns, query computing the table from the base tables).
+AGGREGATES = [
+    ('stat_counters', ('name',), ('value',), '''
+        SELECT 'total_lost', COUNT(*) FROM lost_items
+        UNION ALL SELECT 'total_found', COUNT(*) FROM found_items
+        UNION ALL SELECT 'total_matches', COUNT(*) FROM matches
+        UNION ALL SELECT 'total_recovered', COUNT(*) FROM matches WHERE status = 'recovered'
+    '''),
+    ('lost_category_counts', ('category', 'status'), ('count',), '''
+        SELECT category, IFNULL(status, ''), COUNT(*) FROM lost_items
+        GROUP BY category, IFNULL(status, '')
+    '''),
+    ('lost_location_counts', ('location', 'status'), ('count',), '''
+        SELECT location, IFNULL(status, ''), COUNT(*) FROM lost_items
+        GROUP BY location, IFNULL(status, '')
+    '''),
+    ('lost_daily_counts', ('day', 'category'), ('count',), '''
+        SELECT IFNULL(DATE(created_at), ''), category, COUNT(*) FROM lost_items
+        GROUP BY IFNULL(DATE(created_at), ''), category
+    '''),
+    ('recovery_time_buckets', ('hour',), ('count', 'total_seconds', 'min_seconds', 'max_seconds'),
+     f'''
+        SELECT CAST(seconds / 3600 AS INTEGER) AS hour, COUNT(*), SUM(seconds), MIN(seconds),
+               MAX(seconds)
+        FROM ({RECOVERY_SECONDS_SQL}
+              WHERE e.id = (SELECT MIN(id) FROM match_events
+                            WHERE match_id = e.match_id AND event = 'status'
+                            AND status = 'recovered'))
+        GROUP BY hour
+    '''),
+]
+
+def _lost_item_counts_sql(row, delta):
+    """Trigger statements adding delta to every lost item bucket of OLD or NEW"""
+    return f'''
+        UPDATE stat_counters SET value = value + ({delta}) WHERE name = 'total_lost';
+        INSERT INTO lost_category_counts (category, status, count)
+        VALUES ({row}.category, IFNULL({row}.status, ''), {delta})
+        ON CONFLICT (category, status) DO UPDATE SET count = count + ({delta});
+        INSERT INTO lost_location_counts (location, status, count)
+        VALUES ({row}.location, IFNULL({row}.status, ''), {delta})
+        ON CONFLICT (location, status) DO UPDATE SET count = count + ({delta});
+        INSERT INTO lost_daily_counts (day, category, count)
+        VALUES (IFNULL(DATE({row}.created_at), ''), {row}.category, {delta})
+        ON CONFLICT (day, category) DO UPDATE SET count = count + ({delta});
+    '''
+
+AGGREGATE_SCHEMA = [
+    '''
+    CREATE TABLE IF NOT EXISTS stat_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lost_category_counts (
+        category TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (category, status)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lost_location_counts (
+        location TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (location, status)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS lost_daily_counts (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, category)
+    )
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS lost_items_counts_insert AFTER INSERT ON lost_items
+    BEGIN {_lost_item_counts_sql('NEW', 1)} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS lost_items_counts_delete AFTER DELETE ON lost_items
+    BEGIN {_lost_item_counts_sql('OLD', -1)} END
+    ''',
+    f'''
+    CREATE TRIGGER IF NOT EXISTS lost_items_counts_update
+    AFTER UPDATE OF category, location, status, created_at ON lost_items
+    BEGIN {_lost_item_counts_sql('OLD', -1)} {_lost_item_counts_sql('NEW', 1)} END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS found_items_counts_insert AFTER INSERT ON found_items
+    BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'total_found';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS found_items_counts_delete AFTER DELETE ON found_items
+    BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'total_found';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS matches_counts_insert AFTER INSERT ON matches
+    BEGIN
+        UPDATE stat_counters SET value = value + 1 WHERE name = 'total_matches';
+        UPDATE stat_counters SET value = value + 1
+        WHERE name = 'total_recovered' AND NEW.status = 'recovered';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS matches_counts_delete AFTER DELETE ON matches
+    BEGIN
+        UPDATE stat_counters SET value = value - 1 WHERE name = 'total_matches';
+        UPDATE stat_counters SET value = value - 1
+        WHERE name = 'total_recovered' AND OLD.status = 'recovered';
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS matches_counts_update AFTER UPDATE OF status ON matches
+    BEGIN
+        UPDATE stat_counters
+        SET value = value + (NEW.status IS 'recovered') - (OLD.status IS 'recovered')
+        WHERE name = 'total_recovered';
+    END
+    ''',
+]
+
+def _fill_aggregates(conn, tables=None):
+    """Recompute aggregate tables (all, or the named ones) from the base tables (no commit)"""
+    for table, keys, values, query in AGGREGATES:
+        if tables is not None and table not in tables:
+            continue
+        conn.execute(f'DELETE FROM {table}')
+        conn.execute(f'INSERT INTO {table} ({", ".join(keys + values)}) {query}')
+
+RECOVERY_SCHEMA = [
+    # Append-only log of what happened to a match and when
+    '''
+    CREATE TABLE IF NOT EXISTS match_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        match_id INTEGER NOT NULL,
+        event TEXT NOT NULL,
+        status TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (match_id) REFERENCES matches (id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_match_events_match ON match_events (match_id, event, status)',
+    # Time-to-recovery histogram in whole hours, for mean/median/p90; quantiles
+    # are interpolated between the shortest and longest time in a bucket
+    '''
+    CREATE TABLE IF NOT EXISTS recovery_time_buckets (
+        hour INTEGER PRIMARY KEY,
+        count INTEGER NOT NULL DEFAULT 0,
+        total_seconds INTEGER NOT NULL DEFAULT 0,
+        min_seconds INTEGER NOT NULL DEFAULT 0,
+        max_seconds INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+    # Only a match's first recovery counts
+    f'''
+    CREATE TRIGGER IF NOT EXISTS match_events_recovery_time AFTER INSERT ON match_events
+    WHEN NEW.event = 'status' AND NEW.status = 'recovered' AND NOT EXISTS (
+        SELECT 1 FROM match_events
+        WHERE match_id = NEW.match_id AND event = 'status' AND status = 'recovered'
+        AND id < NEW.id
+    )
+    BEGIN
+        INSERT INTO recovery_time_buckets (hour, count, total_seconds, min_seconds, max_seconds)
+        SELECT CAST(seconds / 3600 AS INTEGER), 1, seconds, seconds, seconds
+        FROM ({RECOVERY_SECONDS_SQL} WHERE e.id = NEW.id)
+        WHERE true
+        ON CONFLICT (hour) DO UPDATE SET count = count + 1,
+                                         total_seconds = total_seconds + excluded.total_seconds,
+                                         min_seconds = MIN(min_seconds, excluded.min_seconds),
+                                         max_seconds = MAX(max_seconds, excluded.max_seconds);
+    END
+    ''',
+]
+
+# Schema migrations
+# Applied in order by migrate(); each version runs once and is recorded in
+# schema_version. Steps are SQL statements or callables taking the connection.
+MIGRATIONS = [
+    (1, 'Indexes for hot query paths', [
+        'CREATE INDEX IF NOT EXISTS idx_lost_items_status_created ON lost_items (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_found_items_status_created ON found_items (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_lost_items_created ON lost_items (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_found_items_created ON found_items (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_lost_confidence ON matches (lost_item_id, confidence_score)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_found_confidence ON matches (found_item_id, confidence_score)',
+        'CREATE INDEX IF NOT EXISTS idx_matches_status_created ON matches (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_verifications_match ON verifications (match_id)',
+    ]),
+    (2, 'Background job queue', [
+        '''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            item_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'queued',
+            attempts INTEGER DEFAULT 0,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_kind_item ON jobs (kind, item_id)',
+    ]),
+    (3, 'Re-match engine high-water marks', [
+        '''
+        CREATE TABLE IF NOT EXISTS rematch_state (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        )
+        ''',
+        # Start from the current data so the first run does not re-notify history
+        '''
+        INSERT OR IGNORE INTO rematch_state (key, value)
+        SELECT 'lost', COALESCE(MAX(id), 0) FROM lost_items
+        UNION ALL SELECT 'found', COALESCE(MAX(id), 0) FROM found_items
+        UNION ALL SELECT 'matches', COALESCE(MAX(id), 0) FROM matches
+        ''',
+    ]),
+    (4, 'Aggregate counter tables maintained by triggers',
+        AGGREGATE_SCHEMA + [lambda conn: _fill_aggregates(conn, (
+            'stat_counters', 'lost_category_counts', 'lost_location_counts',
+            'lost_daily_counts'))]),
+    (5, 'Match event log and time-to-recovery histogram',
+        RECOVERY_SCHEMA + [lambda conn: _fill_aggregates(conn, ('recovery_time_buckets',))]),
+    (6, 'Indexes for id-ordered batch loads', [
+        'CREATE INDEX IF NOT EXISTS idx_lost_items_status_id ON lost_items (status, id)',
+        'CREATE INDEX IF NOT EXISTS idx_found_items_status_id ON found_items (status, id)',
+    ]),
+    # photo_hash is a 64-bit dHash stored as a signed integer
+    (7, 'Perceptual photo hashes and image match scores', [
+        'ALTER TABLE lost_items ADD COLUMN photo_hash INTEGER',
+        'ALTER TABLE found_items ADD COLUMN photo_hash INTEGER',
+        'ALTER TABLE matches ADD COLUMN image_score REAL',
+    ]),
+    # A random id telling apart databases recreated at the same path, and a
+    # revision bumped by updates the match index cannot see (see get_index_source)
+    (8, 'Database identity for match index snapshots', [
+        '''
+        CREATE TABLE IF NOT EXISTS database_info (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+        ''',
+        '''
+        INSERT OR IGNORE INTO database_info (key, value)
+        VALUES ('database_id', lower(hex(randomblob(16)))), ('items_revision', '0')
+        ''',
+    ]),
+    # The histogram is derived data: rebuild it with the new columns and trigger
+    (9, 'Shortest and longest time per recovery time bucket', [
+        'DROP TRIGGER IF EXISTS match_events_recovery_time',
+        'DROP TABLE IF EXISTS recovery_time_buckets',
+    ] + RECOVERY_SCHEMA + [lambda conn: _fill_aggregates(conn, ('recovery_time_buckets',))]),
+]
+
+def get_schema_version(conn):
+    """Get the latest applied migration version"""
+    row = conn.execute('SELECT MAX(version) AS version FROM schema_version').fetchone()
+    return row['version'] or 0
+
+def migrate(conn):
+    """Apply pending migrations, each in its own transaction; returns the versions applied"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+    
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        if version <= get_schema_version(conn):
+            continue
+        
+        # Take the write lock first so concurrent processes apply each migration once
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if version <= get_schema_version(conn):
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)',
+                         (version, description))
+            conn.commit()
+            applied.append(version)
+        except Exception:
+            conn.rollback()
+            raise
+    
+    return applied
+
+def schema_is_current():
+    """Whether every migration has been applied, without changing anything"""
+    conn = get_db_connection()
+    try:
+        version = get_schema_version(conn)
+    except sqlite3.OperationalError:
+        # No schema_version table yet
+        version = 0
     conn.close()
-    print("Database initialized successfully!")
+    return version >= MIGRATIONS[-1][0]
 
 # Lost Items Operations
 def insert_lost_item(category, item_name, description, color, location, lost_date, 
-                     contact_name, contact_phone, contact_email, photo_path):
+                     contact_name, contact_phone, contact_email, photo_path, photo_hash=None):
     """Insert a new lost item"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
         INSERT INTO lost_items (category, item_name, description, color, location, lost_date,
-                               contact_name, contact_phone, contact_email, photo_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                               contact_name, contact_phone, contact_email, photo_path, photo_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (category, item_name, description, color, location, lost_date,
-          contact_name, contact_phone, contact_email, photo_path))
+          contact_name, contact_phone, contact_email, photo_path, photo_hash))
     
     lost_item_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    after_commit(cache.invalidate)
     
     return lost_item_id
 
+def insert_lost_items_bulk(items):
+    """
+    Insert many lost items with one executemany.
+    Each item is a (category, item_name, description, color, location, lost_date,
+    contact_name, contact_phone, contact_email, photo_path, created_at) tuple;
+    a None created_at means now.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.executemany('''
+        INSERT INTO lost_items (category, item_name, description, color, location, lost_date,
+                               contact_name, contact_phone, contact_email, photo_path, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', items)
+    
+    inserted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+    
+    return inserted
+
 def get_lost_item(item_id):
     """Get a specific lost item"""
     conn = get_db_connection()
@@ -126,12 +639,36 @@ def get_all_lost_items():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM lost_items WHERE status = "active" ORDER BY created_at DESC')
+    cursor.execute("SELECT * FROM lost_items WHERE status = 'active' ORDER BY created_at DESC")
     items = cursor.fetchall()
     conn.close()
     
     return [dict(item) for item in items]
 
+def get_active_lost_items_after(item_id, up_to_id=None, limit=None):
+    """Get active lost items with an id above the given one (and up to up_to_id), oldest first"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM lost_items WHERE status = 'active' AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+                   (item_id, up_to_id if up_to_id is not None else MAX_ID,
+                    limit if limit is not None else -1))
+    items = cursor.fetchall()
+    conn.close()
+    
+    return [dict(item) for item in items]
+
+def update_lost_item_status(item_id, status):
+    """Update lost item status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('UPDATE lost_items SET status = ? WHERE id = ?', (status, item_id))
+    
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+
 def get_recent_lost_items(limit=10):
     """Get recent lost items"""
     conn = get_db_connection()
@@ -145,24 +682,50 @@ def get_recent_lost_items(limit=10):
 
 # Found Items Operations
 def insert_found_item(category, item_name, description, color, found_location, found_date,
-                      current_location, contact_name, contact_phone, photo_path):
+                      current_location, contact_name, contact_phone, photo_path, photo_hash=None):
     """Insert a new found item"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
         INSERT INTO found_items (category, item_name, description, color, found_location, 
-                                found_date, current_location, contact_name, contact_phone, photo_path)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                                found_date, current_location, contact_name, contact_phone,
+                                photo_path, photo_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (category, item_name, description, color, found_location, found_date,
-          current_location, contact_name, contact_phone, photo_path))
+          current_location, contact_name, contact_phone, photo_path, photo_hash))
     
     found_item_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    after_commit(cache.invalidate)
     
     return found_item_id
 
+def insert_found_items_bulk(items):
+    """
+    Insert many found items with one executemany.
+    Each item is a (category, item_name, description, color, found_location, found_date,
+    current_location, contact_name, contact_phone, photo_path, created_at) tuple;
+    a None created_at means now.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.executemany('''
+        INSERT INTO found_items (category, item_name, description, color, found_location,
+                                found_date, current_location, contact_name, contact_phone,
+                                photo_path, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+    ''', items)
+    
+    inserted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+    
+    return inserted
+
 def get_found_item(item_id):
     """Get a specific found item"""
     conn = get_db_connection()
@@ -179,12 +742,36 @@ def get_all_found_items():
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT * FROM found_items WHERE status = "active" ORDER BY created_at DESC')
+    cursor.execute("SELECT * FROM found_items WHERE status = 'active' ORDER BY created_at DESC")
+    items = cursor.fetchall()
+    conn.close()
+    
+    return [dict(item) for item in items]
+
+def get_active_found_items_after(item_id, up_to_id=None, limit=None):
+    """Get active found items with an id above the given one (and up to up_to_id), oldest first"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute("SELECT * FROM found_items WHERE status = 'active' AND id > ? AND id <= ? ORDER BY id LIMIT ?",
+                   (item_id, up_to_id if up_to_id is not None else MAX_ID,
+                    limit if limit is not None else -1))
     items = cursor.fetchall()
     conn.close()
     
     return [dict(item) for item in items]
 
+def update_found_item_status(item_id, status):
+    """Update found item status"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('UPDATE found_items SET status = ? WHERE id = ?', (status, item_id))
+    
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+
 def get_recent_found_items(limit=10):
     """Get recent found items"""
     conn = get_db_connection()
@@ -213,22 +800,101 @@ def insert_match(lost_item_id, found_item_id, confidence_score,
     match_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    after_commit(cache.invalidate)
     
     return match_id
 
+def _match_row(match):
+    """Match tuple padded with a NULL image_score when it has none"""
+    match = tuple(match)
+    return match + (None,) if len(match) == 6 else match
+
+def insert_matches_bulk(matches, skip_existing=False):
+    """
+    Insert many matches with one executemany.
+    Each match is a (lost_item_id, found_item_id, confidence_score,
+    category_score, location_score, description_score[, image_score])
+    tuple. With skip_existing, pairs that already have a match row are
+    left alone.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    matches = [_match_row(match) for match in matches]
+    
+    if skip_existing:
+        cursor.executemany('''
+            INSERT INTO matches (lost_item_id, found_item_id, confidence_score,
+                               category_score, location_score, description_score, image_score)
+            SELECT ?, ?, ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM matches WHERE lost_item_id = ? AND found_item_id = ?
+            )
+        ''', [match + (match[0], match[1]) for match in matches])
+    else:
+        cursor.executemany('''
+            INSERT INTO matches (lost_item_id, found_item_id, confidence_score,
+                               category_score, location_score, description_score, image_score)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', matches)
+    
+    inserted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+    
+    return inserted
+
+def upsert_match_scores(matches):
+    """
+    Store freshly computed scores: pairs that already have a match row get
+    the new scores (status and history are kept), the rest are inserted.
+    Takes the same tuples as insert_matches_bulk; returns the number inserted.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    matches = [_match_row(match) for match in matches]
+    
+    cursor.executemany('''
+        UPDATE matches
+        SET confidence_score = ?, category_score = ?, location_score = ?, description_score = ?,
+            image_score = ?
+        WHERE lost_item_id = ? AND found_item_id = ?
+    ''', [match[2:] + (match[0], match[1]) for match in matches])
+    
+    cursor.executemany('''
+        INSERT INTO matches (lost_item_id, found_item_id, confidence_score,
+                           category_score, location_score, description_score, image_score)
+        SELECT ?, ?, ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM matches WHERE lost_item_id = ? AND found_item_id = ?
+        )
+    ''', [match + (match[0], match[1]) for match in matches])
+    
+    inserted = cursor.rowcount
+    conn.commit()
+    conn.close()
+    after_commit(cache.invalidate)
+    
+    return inserted
+
+# Match columns joined with both items, shared by get_match() and get_match_detail()
+MATCH_DETAIL_COLUMNS = '''
+    m.*,
+    l.item_name as lost_item_name, l.description as lost_description, 
+    l.category as lost_category, l.location as lost_location,
+    l.contact_name as lost_contact_name, l.contact_phone as lost_contact_phone,
+    f.item_name as found_item_name, f.description as found_description,
+    f.category as found_category, f.found_location,
+    f.contact_name as found_contact_name, f.contact_phone as found_contact_phone
+'''
+
 def get_match(match_id):
     """Get a specific match with full details"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    cursor.execute('''
-        SELECT m.*,
-               l.item_name as lost_item_name, l.description as lost_description, 
-               l.category as lost_category, l.location as lost_location,
-               l.contact_name as lost_contact_name, l.contact_phone as lost_contact_phone,
-               f.item_name as found_item_name, f.description as found_description,
-               f.category as found_category, f.found_location,
-               f.contact_name as found_contact_name, f.contact_phone as found_contact_phone
+    cursor.execute(f'''
+        SELECT {MATCH_DETAIL_COLUMNS}
         FROM matches m
         JOIN lost_items l ON m.lost_item_id = l.id
         JOIN found_items f ON m.found_item_id = f.id
@@ -240,8 +906,109 @@ def get_match(match_id):
     
     return dict(match) if match else None
 
-def get_matches_for_lost_item(lost_item_id):
-    """Get all matches for a lost item"""
+@dataclass
+class MatchDetail:
+    """A match with both items, its first verification and its event history"""
+    match: dict                 # same keys as get_match()
+    lost_created_at: str
+    verification: dict | None   # id, status, created_at, verified_at
+    events: list                # match_events rows, oldest first
+
+    def recovered_at(self):
+        """When the match was first marked recovered, if it was"""
+        for event in self.events:
+            if event['event'] == 'status' and event['status'] == 'recovered':
+                return event['created_at']
+        return None
+
+    def timeline(self):
+        """Timeline entries for the recovery journey page"""
+        match = self.match
+        timeline = [
+            {
+                'event': 'Item Reported Lost',
+                'timestamp': self.lost_created_at,
+                'status': 'completed'
+            },
+            {
+                'event': 'AI Match Found',
+                'timestamp': match['created_at'],
+                'status': 'completed',
+                'details': f"{match['confidence_score']:.0f}% confidence"
+            }
+        ]
+        
+        verification = self.verification
+        if verification:
+            timeline.append({
+                'event': 'Verification Initiated',
+                'timestamp': verification['created_at'],
+                'status': 'completed' if verification['status'] == 'completed' else 'in_progress'
+            })
+            
+            if verification['verified_at']:
+                timeline.append({
+                    'event': 'Both Parties Verified',
+                    'timestamp': verification['verified_at'],
+                    'status': 'completed'
+                })
+        
+        if match['status'] == 'recovered':
+            timeline.append({
+                'event': 'Item Successfully Recovered',
+                # Matches recovered before events were recorded fall back to the match time
+                'timestamp': self.recovered_at() or match['created_at'],
+                'status': 'completed'
+            })
+        
+        return timeline
+
+def get_match_detail(match_id):
+    """Load a match, both items, its verification and its events in one query"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(f'''
+        SELECT {MATCH_DETAIL_COLUMNS},
+               l.created_at as lost_created_at,
+               v.id as verification_id, v.status as verification_status,
+               v.created_at as verification_created_at, v.verified_at as verification_verified_at,
+               (SELECT json_group_array(json_object('id', e.id, 'event', e.event,
+                                                    'status', e.status, 'created_at', e.created_at))
+                FROM match_events e WHERE e.match_id = m.id) as events
+        FROM matches m
+        JOIN lost_items l ON m.lost_item_id = l.id
+        JOIN found_items f ON m.found_item_id = f.id
+        LEFT JOIN verifications v
+            ON v.id = (SELECT MIN(id) FROM verifications WHERE match_id = m.id)
+        WHERE m.id = ?
+    ''', (match_id,))
+    
+    row = cursor.fetchone()
+    conn.close()
+    
+    if not row:
+        return None
+    
+    row = dict(row)
+    verification = None
+    if row['verification_id'] is not None:
+        verification = {
+            'id': row['verification_id'],
+            'status': row['verification_status'],
+            'created_at': row['verification_created_at'],
+            'verified_at': row['verification_verified_at']
+        }
+    events = sorted(json.loads(row.pop('events')), key=lambda event: event['id'])
+    lost_created_at = row.pop('lost_created_at')
+    for column in ('verification_id', 'verification_status',
+                   'verification_created_at', 'verification_verified_at'):
+        del row[column]
+    
+    return MatchDetail(row, lost_created_at, verification, events)
+
+def get_matches_for_lost_item(lost_item_id, limit=3):
+    """Get the best matches for a lost item"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -253,16 +1020,16 @@ def get_matches_for_lost_item(lost_item_id):
         JOIN found_items f ON m.found_item_id = f.id
         WHERE m.lost_item_id = ?
         ORDER BY m.confidence_score DESC
-        LIMIT 3
-    ''', (lost_item_id,))
+        LIMIT ?
+    ''', (lost_item_id, limit))
     
     matches = cursor.fetchall()
     conn.close()
     
     return [dict(match) for match in matches]
 
-def get_matches_for_found_item(found_item_id):
-    """Get all matches for a found item"""
+def get_matches_for_found_item(found_item_id, limit=3):
+    """Get the best matches for a found item"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
@@ -274,8 +1041,8 @@ def get_matches_for_found_item(found_item_id):
         JOIN lost_items l ON m.lost_item_id = l.id
         WHERE m.found_item_id = ?
         ORDER BY m.confidence_score DESC
-        LIMIT 3
-    ''', (found_item_id,))
+        LIMIT ?
+    ''', (found_item_id, limit))
     
     matches = cursor.fetchall()
     conn.close()
@@ -288,9 +1055,12 @@ def update_match_status(match_id, status):
     cursor = conn.cursor()
     
     cursor.execute('UPDATE matches SET status = ? WHERE id = ?', (status, match_id))
+    cursor.execute("INSERT INTO match_events (match_id, event, status) VALUES (?, 'status', ?)",
+                   (match_id, status))
     
     conn.commit()
     conn.close()
+    after_commit(cache.invalidate)
 
 # Verification Operations
 def insert_verification(match_id, claimer_otp, finder_otp):
@@ -304,6 +1074,8 @@ def insert_verification(match_id, claimer_otp, finder_otp):
     ''', (match_id, claimer_otp, finder_otp))
     
     verification_id = cursor.lastrowid
+    cursor.execute("INSERT INTO match_events (match_id, event) VALUES (?, 'verification_started')",
+                   (match_id,))
     conn.commit()
     conn.close()
     
@@ -352,41 +1124,450 @@ def mark_verification_complete(verification_id):
         SET status = 'completed', verified_at = CURRENT_TIMESTAMP
         WHERE id = ?
     ''', (verification_id,))
+    cursor.execute('''
+        INSERT INTO match_events (match_id, event)
+        SELECT match_id, 'verification_completed' FROM verifications WHERE id = ?
+    ''', (verification_id,))
     
     conn.commit()
     conn.close()
 
+# Matcher candidate source
+# Only the columns the matcher scores on, so contact details and photo paths
+# never leave SQLite while matching
+MATCH_COLUMNS = {
+    'lost': 'id, category, item_name, description, color, location, photo_hash',
+    'found': 'id, category, item_name, description, color, found_location, photo_hash',
+}
+CANDIDATE_FETCH_SIZE = 500   # rows fetched per round trip
+
+def iter_match_candidates(side, after_id=0, up_to_id=None, fetch_size=CANDIDATE_FETCH_SIZE):
+    """
+    Yield the active items of a side ('lost' or 'found') with an id in
+    (after_id, up_to_id], oldest first, fetch_size rows at a time
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(f'''
+            SELECT {MATCH_COLUMNS[side]} FROM {side}_items
+            WHERE status = 'active' AND id > ? AND id <= ?
+            ORDER BY id
+        ''', (after_id, up_to_id if up_to_id is not None else MAX_ID))
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+def get_unhashed_photos(side):
+    """(id, photo_path) of the items of a side that have a photo but no photo_hash yet"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(f'''
+        SELECT id, photo_path FROM {side}_items
+        WHERE photo_path IS NOT NULL AND photo_hash IS NULL
+        ORDER BY id
+    ''')
+    
+    rows = cursor.fetchall()
+    conn.close()
+    
+    return [(row['id'], row['photo_path']) for row in rows]
+
+def set_photo_hashes(side, hashes):
+    """Store photo hashes for many items of a side; hashes are (item_id, photo_hash) tuples"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.executemany(f'UPDATE {side}_items SET photo_hash = ? WHERE id = ?',
+                       [(photo_hash, item_id) for item_id, photo_hash in hashes])
+    if hashes:
+        _bump_items_revision(cursor)
+    
+    conn.commit()
+    conn.close()
+
+def get_active_item_ids(side):
+    """Ids of the active items of a side, ascending"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute(f"SELECT id FROM {side}_items WHERE status = 'active' ORDER BY id")
+    ids = [row[0] for row in cursor.fetchall()]
+    conn.close()
+    
+    return ids
+
+def _bump_items_revision(cursor):
+    """Record an in-place change to item columns the matcher reads"""
+    cursor.execute('''
+        UPDATE database_info SET value = CAST(value AS INTEGER) + 1 WHERE key = 'items_revision'
+    ''')
+
+def get_index_source():
+    """
+    Identity of the item data a match index snapshot was built from: the
+    database's random id and its items revision. Inserts and status changes
+    are reconciled when a snapshot is loaded; anything else that changes
+    what the matcher reads (e.g. set_photo_hashes) bumps the revision.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT key, value FROM database_info')
+    info = {row['key']: row['value'] for row in cursor.fetchall()}
+    conn.close()
+    
+    return f"{info['database_id']}/{info['items_revision']}"
+
+# Keyset pagination
+# Pages are ordered newest first (created_at, id) for items and best first
+# (confidence_score, id) for matches. A page's cursor holds the sort key of its
+# last row, and the next page starts strictly after it, so every page costs
+# one index range scan however deep the client has scrolled.
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(*values):
+    """Opaque cursor for the sort key of the last row of a page"""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor):
+    """Sort key stored in a cursor from encode_cursor(); raises ValueError if malformed"""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if not isinstance(values, list) or len(values) != 2:
+        raise ValueError('malformed cursor')
+    # Only values SQLite can bind as query parameters
+    if not all(value is None or isinstance(value, (str, int, float)) for value in values):
+        raise ValueError('malformed cursor')
+    return values
+
+def _fetch_page(sql, conditions, params, order_by, limit, sort_keys):
+    """Run a keyset page query; returns (rows, cursor for the next page or None)"""
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    where = 'WHERE ' + ' AND '.join(conditions) if conditions else ''
+    cursor.execute(f'{sql} {where} ORDER BY {order_by} LIMIT ?', params + [limit + 1])
+    rows = [dict(row) for row in cursor.fetchall()]
+    conn.close()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*(rows[-1][key] for key in sort_keys))
+    return rows, next_cursor
+
+def get_lost_items_page(limit=20, cursor=None, status=None):
+    """Get a page of lost items, newest first"""
+    conditions, params = [], []
+    if status:
+        conditions.append('status = ?')
+        params.append(status)
+    if cursor:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    return _fetch_page('SELECT * FROM lost_items', conditions, params,
+                       'created_at DESC, id DESC', limit, ('created_at', 'id'))
+
+def get_found_items_page(limit=20, cursor=None, status=None):
+    """Get a page of found items, newest first"""
+    conditions, params = [], []
+    if status:
+        conditions.append('status = ?')
+        params.append(status)
+    if cursor:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    return _fetch_page('SELECT * FROM found_items', conditions, params,
+                       'created_at DESC, id DESC', limit, ('created_at', 'id'))
+
+def get_matches_page(lost_item_id=None, found_item_id=None, limit=20, cursor=None):
+    """Get a page of one item's matches (with the other item's columns), best first"""
+    if lost_item_id is not None:
+        sql = '''
+            SELECT m.*, f.*,
+                   m.id as match_id,
+                   m.confidence_score, m.category_score, m.location_score, m.description_score
+            FROM matches m
+            JOIN found_items f ON m.found_item_id = f.id
+        '''
+        conditions, params = ['m.lost_item_id = ?'], [lost_item_id]
+    else:
+        sql = '''
+            SELECT m.*, l.*,
+                   m.id as match_id,
+                   m.confidence_score, m.category_score, m.location_score, m.description_score
+            FROM matches m
+            JOIN lost_items l ON m.lost_item_id = l.id
+        '''
+        conditions, params = ['m.found_item_id = ?'], [found_item_id]
+    if cursor:
+        conditions.append('(m.confidence_score, m.id) < (?, ?)')
+        params.extend(decode_cursor(cursor))
+    return _fetch_page(sql, conditions, params, 'm.confidence_score DESC, m.id DESC',
+                       limit, ('confidence_score', 'match_id'))
+
+# Re-match Engine Operations
+def get_rematch_state():
+    """Get the re-match high-water marks as a dict"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('SELECT key, value FROM rematch_state')
+    state = {row['key']: row['value'] for row in cursor.fetchall()}
+    conn.close()
+    
+    return state
+
+def advance_rematch_state(old_state, new_state):
+    """
+    Move the high-water marks from old_state to new_state.
+    Returns False, with none of them moved, if another run already moved one
+    of them; inside transaction() the caller's writes are kept, so roll them
+    back too by raising.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    # A savepoint undoes the marks already moved when a later one fails,
+    # without touching the rest of the caller's transaction
+    if not conn.in_transaction:
+        cursor.execute('BEGIN')
+    cursor.execute('SAVEPOINT advance_rematch_state')
+    moved = True
+    for key, value in new_state.items():
+        cursor.execute('UPDATE rematch_state SET value = ? WHERE key = ? AND value = ?',
+                       (value, key, old_state[key]))
+        if cursor.rowcount != 1:
+            cursor.execute('ROLLBACK TO advance_rematch_state')
+            moved = False
+            break
+    cursor.execute('RELEASE advance_rematch_state')
+    
+    conn.commit()
+    conn.close()
+    
+    return moved
+
+def get_max_item_ids():
+    """Get the highest lost item, found item and match ids"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT (SELECT COALESCE(MAX(id), 0) FROM lost_items) AS lost,
+               (SELECT COALESCE(MAX(id), 0) FROM found_items) AS found,
+               (SELECT COALESCE(MAX(id), 0) FROM matches) AS matches
+    ''')
+    row = dict(cursor.fetchone())
+    conn.close()
+    
+    return row
+
+def get_matched_pairs(lost_item_ids):
+    """
+    Get the pairs already matched for some lost items, as
+    {(lost_item_id, found_item_id): confidence_score}
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    pairs = {}
+    lost_item_ids = list(lost_item_ids)
+    for start in range(0, len(lost_item_ids), 500):
+        chunk = lost_item_ids[start:start + 500]
+        cursor.execute(f'''
+            SELECT lost_item_id, found_item_id, confidence_score FROM matches
+            WHERE lost_item_id IN ({','.join('?' * len(chunk))})
+        ''', chunk)
+        pairs.update(((row['lost_item_id'], row['found_item_id']), row['confidence_score'])
+                     for row in cursor.fetchall())
+    conn.close()
+    
+    return pairs
+
+def get_match_notifications(after_match_id, up_to_match_id):
+    """Get, per lost item, how many matches were created in an id range"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT l.id AS lost_item_id, l.item_name, l.contact_phone, COUNT(*) AS match_count
+        FROM matches m
+        JOIN lost_items l ON m.lost_item_id = l.id
+        WHERE m.id > ? AND m.id <= ?
+        GROUP BY l.id
+    ''', (after_match_id, up_to_match_id))
+    
+    notifications = cursor.fetchall()
+    conn.close()
+    
+    return [dict(notification) for notification in notifications]
+
+# Job Queue Operations
+JOB_MAX_ATTEMPTS = 3
+
+def enqueue_job(kind, item_id):
+    """Queue a background job for an item"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('INSERT INTO jobs (kind, item_id) VALUES (?, ?)', (kind, item_id))
+    
+    job_id = cursor.lastrowid
+    conn.commit()
+    conn.close()
+    
+    return job_id
+
+def claim_job():
+    """Atomically take the oldest queued job and mark it running"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        UPDATE jobs
+        SET status = 'running', attempts = attempts + 1, started_at = CURRENT_TIMESTAMP
+        WHERE id = (SELECT id FROM jobs WHERE status = 'queued' ORDER BY id LIMIT 1)
+        RETURNING *
+    ''')
+    rows = cursor.fetchall()
+    job = rows[0] if rows else None
+    
+    conn.commit()
+    conn.close()
+    
+    return dict(job) if job else None
+
+def complete_job(job_id):
+    """Mark a job as done"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        UPDATE jobs SET status = 'done', error = NULL, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (job_id,))
+    
+    conn.commit()
+    conn.close()
+
+def fail_job(job_id, error):
+    """Record a job failure; it is retried until JOB_MAX_ATTEMPTS is reached"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        UPDATE jobs
+        SET status = CASE WHEN attempts < ? THEN 'queued' ELSE 'failed' END,
+            error = ?, finished_at = CURRENT_TIMESTAMP
+        WHERE id = ?
+    ''', (JOB_MAX_ATTEMPTS, error, job_id))
+    
+    conn.commit()
+    conn.close()
+
+def requeue_stale_jobs(timeout_seconds):
+    """Put back jobs left running by a worker that died"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        UPDATE jobs SET status = 'queued'
+        WHERE status = 'running' AND started_at < datetime('now', ?)
+    ''', (f'-{int(timeout_seconds)} seconds',))
+    
+    requeued = cursor.rowcount
+    conn.commit()
+    conn.close()
+    
+    return requeued
+
+def get_latest_job(kind, item_id):
+    """Get the most recent job of a kind for an item"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    
+    cursor.execute('''
+        SELECT * FROM jobs WHERE kind = ? AND item_id = ?
+        ORDER BY id DESC LIMIT 1
+    ''', (kind, item_id))
+    
+    job = cursor.fetchone()
+    conn.close()
+    
+    return dict(job) if job else None
+
 # Stats and Analytics
+# Cached; the write functions above invalidate the cache when they commit
+@cache.cached()
 def get_stats():
     """Get dashboard statistics"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Total lost items
-    cursor.execute('SELECT COUNT(*) as count FROM lost_items')
-    total_lost = cursor.fetchone()['count']
+    # Kept up to date by triggers (see AGGREGATES)
+    cursor.execute('''
+        SELECT name, value FROM stat_counters
+        WHERE name IN ('total_lost', 'total_found', 'total_matches', 'total_recovered')
+    ''')
+    counters = {row['name']: row['value'] for row in cursor.fetchall()}
     
-    # Total found items
-    cursor.execute('SELECT COUNT(*) as count FROM found_items')
-    total_found = cursor.fetchone()['count']
+    conn.close()
     
-    # Total matches
-    cursor.execute('SELECT COUNT(*) as count FROM matches')
-    total_matches = cursor.fetchone()['count']
+    return {
+        'total_lost': counters.get('total_lost', 0),
+        'total_found': counters.get('total_found', 0),
+        'total_matches': counters.get('total_matches', 0),
+        'total_recovered': counters.get('total_recovered', 0)
+    }
+
+def rebuild_aggregates():
+    """Recompute the aggregate counter tables from the base tables"""
+    conn = get_db_connection()
     
-    # Successful recoveries
-    cursor.execute('SELECT COUNT(*) as count FROM matches WHERE status = "recovered"')
-    total_recovered = cursor.fetchone()['count']
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        _fill_aggregates(conn)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    cache.invalidate()
+
+def check_aggregates():
+    """
+    Compare the aggregate tables with counts computed from the base tables.
+    Returns a list of (table, key, expected, actual) for every difference.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
     
+    problems = []
+    for table, keys, values, query in AGGREGATES:
+        split = len(keys)
+        expected = {tuple(row[:split]): tuple(row[split:])
+                    for row in cursor.execute(query).fetchall()}
+        actual = {tuple(row[:split]): tuple(row[split:]) for row in cursor.execute(
+            f'SELECT {", ".join(keys + values)} FROM {table}').fetchall()}
+        zero = (0,) * len(values)
+        for key in sorted(set(expected) | set(actual), key=repr):
+            # Buckets that dropped to zero stay in the table
+            if expected.get(key, zero) != actual.get(key, zero):
+                problems.append((table, key, expected.get(key, zero), actual.get(key, zero)))
     conn.close()
     
-    return {
-        'total_lost': total_lost,
-        'total_found': total_found,
-        'total_matches': total_matches,
-        'total_recovered': total_recovered
-    }
+    return problems
 
+@cache.cached()
 def get_recent_recoveries(limit=5):
     """Get recent successful recoveries"""
     conn = get_db_connection()
@@ -408,61 +1589,69 @@ def get_recent_recoveries(limit=5):
 
 def get_timeline_events(match_id):
     """Get timeline events for a match"""
-    match = get_match(match_id)
+    detail = get_match_detail(match_id)
     
-    if not match:
-        return []
-    
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get lost item creation
-    cursor.execute('SELECT created_at FROM lost_items WHERE id = ?', (match['lost_item_id'],))
-    lost_created = cursor.fetchone()
-    
-    # Get match creation
-    cursor.execute('SELECT created_at FROM matches WHERE id = ?', (match_id,))
-    match_created = cursor.fetchone()
-    
-    # Get verification details
-    cursor.execute('SELECT * FROM verifications WHERE match_id = ?', (match_id,))
-    verification = cursor.fetchone()
-    
-    conn.close()
-    
-    timeline = [
-        {
-            'event': 'Item Reported Lost',
-            'timestamp': lost_created['created_at'],
-            'status': 'completed'
-        },
-        {
-            'event': 'AI Match Found',
-            'timestamp': match_created['created_at'],
-            'status': 'completed',
-            'details': f"{match['confidence_score']:.0f}% confidence"
-        }
+    return detail.timeline() if detail else []
+
+# Query plan checks
+def _is_full_scan(detail):
+    """Whether an EXPLAIN QUERY PLAN step reads a whole table or sorts in a temp b-tree"""
+    if detail.startswith('SCAN') and 'USING' not in detail:
+        return True
+    return 'USE TEMP B-TREE' in detail
+
+def check_query_plans():
+    """
+    Run the hot read paths, EXPLAIN QUERY PLAN every SELECT they issue and
+    report steps that fall back to full table scans.
+    Returns a list of (function name, sql, plan detail); empty means all good.
+    """
+    bound_here = getattr(_local, 'connection', None) is None
+    if bound_here:
+        bind_connection()
+    conn = _local.connection
+    
+    row = conn.execute('SELECT MAX(id) AS id FROM matches').fetchone()
+    match_id = row['id'] or 0
+    row = conn.execute('SELECT MAX(id) AS id FROM verifications').fetchone()
+    verification_id = row['id'] or 0
+    
+    hot_paths = [
+        (get_all_lost_items, ()),
+        (get_all_found_items, ()),
+        (get_recent_lost_items, (10,)),
+        (get_recent_found_items, (10,)),
+        (get_lost_items_page, (20, encode_cursor('9999-12-31', MAX_ID), 'active')),
+        (get_found_items_page, (20, encode_cursor('9999-12-31', MAX_ID))),
+        (get_matches_page, (match_id, None, 20, encode_cursor(100, MAX_ID))),
+        (get_active_lost_items_after, (0, None, 500)),
+        (lambda: list(iter_match_candidates('found')), ()),
+        (get_matches_for_lost_item, (match_id,)),
+        (get_matches_for_found_item, (match_id,)),
+        (get_recent_recoveries.uncached, (5,)),
+        (get_timeline_events, (match_id,)),
+        (get_verification, (verification_id,)),
+        (get_stats.uncached, ()),
     ]
     
-    if verification:
-        timeline.append({
-            'event': 'Verification Initiated',
-            'timestamp': verification['created_at'],
-            'status': 'completed' if verification['status'] == 'completed' else 'in_progress'
-        })
-        
-        if verification['verified_at']:
-            timeline.append({
-                'event': 'Both Parties Verified',
-                'timestamp': verification['verified_at'],
-                'status': 'completed'
-            })
-    
-    if match['status'] == 'recovered':
-        timeline.append({
-            'event': 'Item Successfully Recovered',
-            'timestamp': match_created['created_at'],  # Use match timestamp as placeholder
-            'status': 'completed'
-        })
-    
-    return timeline
\ No newline at end of file
+    problems = []
+    try:
+        for function, args in hot_paths:
+            statements = []
+            conn.set_trace_callback(statements.append)
+            try:
+                function(*args)
+            finally:
+                conn.set_trace_callback(None)
+            
+            for sql in statements:
+                if not sql.lstrip().upper().startswith('SELECT'):
+                    continue
+                for step in conn.execute('EXPLAIN QUERY PLAN ' + sql):
+                    if _is_full_scan(step['detail']):
+                        problems.append((function.__name__, ' '.join(sql.split()), step['detail']))
+    finally:
+        if bound_here:
+            release_connection()
+    
+    return problems
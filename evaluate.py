@@ -0,0 +1,272 @@
+"""
+Matching quality and speed evaluation against labelled lost/found pairs.
+
+Every engine ranks found items for the labelled lost items; the report
+shows recall@k, precision of the matches kept at the threshold, agreement
+with the reference engine and latency side by side, so a faster engine is
+only accepted when it holds quality:
+
+    python evaluate.py --synthetic 5000
+    python evaluate.py --database lostandfound.db --labels pairs.csv --engines matcher reference
+    python evaluate.py --synthetic 100000 --engines matcher lsh --lsh-tables 24 --lsh-bits 14
+
+Labels are CSV or JSONL rows with lost_item_id and found_item_id columns.
+The reference engine is the plain per-pair scorer (create_feature_text,
+TF-IDF cosine, calculate_category_score, calculate_location_score,
+weighted_score and the photo hash distance) with no index, pruning or
+caching; new engines are added to ENGINES.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import benchmark
+import database as db
+import importer
+import matcher
+from match_index import make_vectorizer
+
+DEFAULT_KS = (1, 3, 10)
+DEFAULT_THRESHOLD = 0.40
+DEFAULT_TOP_N = 3           # matches the app keeps per item
+DEFAULT_QUERIES = 500       # labelled lost items evaluated
+
+# Engines: factory() -> rank(lost_item, top_n, threshold) returning
+# [(found_item_id, confidence_score)] best first, confidence in percent
+def _matcher_engine(engine):
+    matcher.MATCH_ENGINE = engine
+    matcher.reset_index()
+    matcher.get_index()
+
+    def rank(lost_item, top_n, threshold):
+        return [(found_item_id, scores['confidence_score'])
+                for found_item_id, scores in matcher.score_item(lost_item, 'lost', top_n, threshold)]
+    return rank
+
+def make_matcher_engine():
+    """The production matcher (cached index, candidate pruning, chunked scoring)"""
+    return _matcher_engine('exact')
+
+def make_lsh_engine():
+    """The matcher with LSH candidate shortlists (matcher.LSH_* settings)"""
+    return _matcher_engine('lsh')
+
+def make_reference_engine():
+    """Score every active found item pair by pair with the original scoring functions"""
+    lost_items = list(db.iter_match_candidates('lost'))
+    found_items = list(db.iter_match_candidates('found'))
+    vectorizer = make_vectorizer()
+    texts = [matcher.create_feature_text(item) for item in lost_items + found_items]
+    try:
+        vectorizer.fit(texts)
+        found_matrix = vectorizer.transform(texts[len(lost_items):])
+    except ValueError:
+        vectorizer = None
+
+    def rank(lost_item, top_n, threshold):
+        if vectorizer is not None:
+            query = vectorizer.transform([matcher.create_feature_text(lost_item)])
+            descriptions = (found_matrix @ query.T).toarray().ravel()
+        else:
+            descriptions = np.zeros(len(found_items))
+
+        scored = []
+        for found_item, description_score in zip(found_items, descriptions):
+            confidence = matcher.weighted_score(
+                description_score,
+                matcher.calculate_category_score(lost_item['category'], found_item['category']),
+                matcher.calculate_location_score(lost_item['location'],
+                                                 found_item['found_location']))
+            photo_hash = matcher.photo_hash_key(lost_item.get('photo_hash'))
+            other_hash = matcher.photo_hash_key(found_item.get('photo_hash'))
+            if photo_hash is not None and other_hash is not None:
+                confidence = matcher.with_image_score(
+                    confidence, float(matcher.image_similarity((photo_hash ^ other_hash).bit_count())))
+            if confidence >= threshold:
+                scored.append((confidence, found_item['id']))
+        # Highest confidence first, newest item first on ties (as the matcher)
+        scored.sort(reverse=True)
+        return [(found_item_id, confidence * 100) for confidence, found_item_id in scored[:top_n]]
+    return rank
+
+ENGINES = {
+    'reference': make_reference_engine,
+    'matcher': make_matcher_engine,
+    'lsh': make_lsh_engine,
+}
+
+def load_labels(path):
+    """{lost_item_id: {found_item_id, ...}} from a CSV or JSONL file"""
+    labels = {}
+    for record in importer.read_records(path):
+        labels.setdefault(int(record['lost_item_id']), set()).add(int(record['found_item_id']))
+    return labels
+
+def load_synthetic(count, overlap=benchmark.DEFAULT_OVERLAP, seed=0):
+    """Fill the (fresh) database with a synthetic corpus; returns its labels"""
+    lost_rows, found_rows, pairs = benchmark.generate_corpus(count, overlap, seed)
+    db.insert_lost_items_bulk(lost_rows)
+    db.insert_found_items_bulk(found_rows)
+    labels = {}
+    for lost_index, found_index in pairs:
+        labels.setdefault(lost_index + 1, set()).add(found_index + 1)
+    return labels
+
+def evaluate_engine(rank, queries, labels, ks=DEFAULT_KS, threshold=DEFAULT_THRESHOLD,
+                    top_n=DEFAULT_TOP_N):
+    """
+    Rank every query and score the result against the labels.
+    Returns (metrics, rankings) with rankings {lost_item_id: [found_item_id, ...]}.
+    """
+    depth = max(max(ks), top_n)
+    latencies = []
+    rankings = {}
+    started = time.perf_counter()
+    for lost_item in queries:
+        call_started = time.perf_counter()
+        results = rank(lost_item, depth, threshold)
+        latencies.append(time.perf_counter() - call_started)
+        rankings[lost_item['id']] = [found_item_id for found_item_id, _ in results]
+    elapsed = time.perf_counter() - started
+
+    total_pairs = sum(len(labels[lost_item['id']]) for lost_item in queries)
+    hits = {k: 0 for k in ks}
+    kept = correct = 0
+    for lost_item in queries:
+        truth = labels[lost_item['id']]
+        ranked = rankings[lost_item['id']]
+        for k in ks:
+            hits[k] += len(truth.intersection(ranked[:k]))
+        kept += len(ranked[:top_n])
+        correct += len(truth.intersection(ranked[:top_n]))
+
+    metrics = {f'recall@{k}': hits[k] / total_pairs if total_pairs else 0.0 for k in ks}
+    metrics['precision'] = correct / kept if kept else 0.0
+    metrics['matches_kept'] = kept
+    metrics['latency'] = benchmark.summarize(latencies, elapsed)
+    return metrics, rankings
+
+def agreement(rankings, reference_rankings, k):
+    """Mean share of the reference's top k that an engine also returns in its top k"""
+    shares = []
+    for lost_item_id, expected in reference_rankings.items():
+        expected = expected[:k]
+        if expected:
+            shares.append(len(set(expected).intersection(rankings[lost_item_id][:k])) / len(expected))
+    return sum(shares) / len(shares) if shares else 1.0
+
+def run_evaluation(labels, engines=tuple(ENGINES), queries=DEFAULT_QUERIES, ks=DEFAULT_KS,
+                   threshold=DEFAULT_THRESHOLD, top_n=DEFAULT_TOP_N, seed=0, log=print):
+    """Evaluate each engine on the same sample of labelled lost items"""
+    candidates = [item for item in db.iter_match_candidates('lost') if item['id'] in labels]
+    sample = random.Random(seed).sample(candidates, min(queries, len(candidates)))
+    sample.sort(key=lambda item: item['id'])
+
+    report = {
+        'meta': {
+            'commit': benchmark.git_commit(),
+            'queries': len(sample),
+            'labelled_pairs': sum(len(labels[item['id']]) for item in sample),
+            'threshold': threshold,
+            'top_n': top_n,
+            'ks': list(ks),
+        },
+        'engines': {}
+    }
+    all_rankings = {}
+    for name in engines:
+        log(f"[{name}] preparing")
+        setup_started = time.perf_counter()
+        rank = ENGINES[name]()
+        setup_seconds = time.perf_counter() - setup_started
+        log(f"[{name}] ranking {len(sample)} lost items")
+        metrics, all_rankings[name] = evaluate_engine(rank, sample, labels, ks, threshold, top_n)
+        metrics['setup_seconds'] = setup_seconds
+        report['engines'][name] = metrics
+
+    if 'reference' in all_rankings:
+        for name, rankings in all_rankings.items():
+            report['engines'][name]['agreement'] = {
+                f'@{k}': agreement(rankings, all_rankings['reference'], k) for k in ks}
+    return report
+
+def print_report(report):
+    """Print quality and latency of every engine side by side"""
+    meta = report['meta']
+    print(f"\n{meta['queries']} lost items, {meta['labelled_pairs']} labelled pairs, "
+          f"threshold {meta['threshold']:.2f}, top {meta['top_n']} kept")
+    columns = [f'recall@{k}' for k in meta['ks']] + ['precision']
+    header = ''.join(f'{column:>12}' for column in columns)
+    print(f"  {'engine':<12}{header}{'agree@' + str(meta['ks'][-1]):>12}"
+          f"{'p50 ms':>10}{'p95 ms':>10}{'setup s':>10}")
+    for name, metrics in report['engines'].items():
+        values = ''.join(f'{metrics[column]:>12.3f}' for column in columns)
+        agree = metrics.get('agreement', {}).get(f"@{meta['ks'][-1]}")
+        agree = f'{agree:>12.3f}' if agree is not None else f"{'-':>12}"
+        print(f"  {name:<12}{values}{agree}{metrics['latency']['p50_ms']:>10.2f}"
+              f"{metrics['latency']['p95_ms']:>10.2f}{metrics['setup_seconds']:>10.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare matching engines on labelled pairs')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--labels', help='CSV/JSONL of true lost_item_id,found_item_id pairs')
+    source.add_argument('--synthetic', type=int, metavar='COUNT',
+                        help='evaluate on a generated corpus with COUNT items per side')
+    parser.add_argument('--database', default=db.DATABASE,
+                        help='SQLite database the labels refer to')
+    parser.add_argument('--engines', nargs='+', choices=sorted(ENGINES), default=list(ENGINES))
+    parser.add_argument('--queries', type=int, default=DEFAULT_QUERIES,
+                        help='labelled lost items to evaluate')
+    parser.add_argument('--k', type=int, nargs='+', default=list(DEFAULT_KS), dest='ks',
+                        help='cut-offs for recall@k')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--top-n', type=int, default=DEFAULT_TOP_N,
+                        help='matches kept per item when measuring precision')
+    parser.add_argument('--overlap', type=float, default=benchmark.DEFAULT_OVERLAP,
+                        help='share of synthetic found items that describe a lost item')
+    parser.add_argument('--lsh-tables', type=int, default=matcher.LSH_TABLES)
+    parser.add_argument('--lsh-bits', type=int, default=matcher.LSH_BITS)
+    parser.add_argument('--lsh-probes', type=int, default=matcher.LSH_PROBES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write the JSON report to this file')
+    args = parser.parse_args()
+
+    matcher.LSH_TABLES, matcher.LSH_BITS = args.lsh_tables, args.lsh_bits
+    matcher.LSH_PROBES, matcher.LSH_INDEX_PATH = args.lsh_probes, ''
+    matcher.SNAPSHOT_PATH = ''
+    directory = None
+    if args.synthetic:
+        directory = tempfile.mkdtemp(prefix='lostfound-eval-')
+        db.DATABASE = os.path.join(directory, 'eval.db')
+        db.init_db()
+        labels = load_synthetic(args.synthetic, args.overlap, args.seed)
+    else:
+        db.DATABASE = args.database
+        labels = load_labels(args.labels)
+
+    try:
+        report = run_evaluation(labels, args.engines, args.queries, sorted(args.ks),
+                                args.threshold, args.top_n, args.seed)
+    finally:
+        matcher.reset_index()
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+    print_report(report)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+    if not report['meta']['queries']:
+        sys.exit('No labelled lost item is active in the database')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Bulk import of existing lost and found records (CSV or JSON Lines).
+
+Rows are inserted with executemany, IMPORT_BATCH_SIZE rows per transaction,
+and no matching jobs are queued for them. Once the whole file is loaded the
+imported id range is matched in one blocked batch pass (see
+matcher.run_batch_matching) against the other side and the matches are
+stored in bulk:
+
+    flask --app app import-items lost venue_lost.csv
+"""
+import csv
+import json
+import os
+import time
+
+import database as db
+
+IMPORT_BATCH_SIZE = 5000
+
+# Columns in insert order; created_at is optional and defaults to now
+IMPORT_COLUMNS = {
+    'lost': ('category', 'item_name', 'description', 'color', 'location', 'lost_date',
+             'contact_name', 'contact_phone', 'contact_email', 'photo_path', 'created_at'),
+    'found': ('category', 'item_name', 'description', 'color', 'found_location', 'found_date',
+              'current_location', 'contact_name', 'contact_phone', 'photo_path', 'created_at'),
+}
+REQUIRED_COLUMNS = {
+    'lost': ('category', 'item_name', 'description', 'location', 'lost_date',
+             'contact_name', 'contact_phone'),
+    'found': ('category', 'item_name', 'description', 'found_location', 'found_date',
+              'current_location', 'contact_name', 'contact_phone'),
+}
+INSERT_BULK = {
+    'lost': db.insert_lost_items_bulk,
+    'found': db.insert_found_items_bulk,
+}
+
+def read_records(path):
+    """
+    Yield records from a .csv or .jsonl/.ndjson file as dicts. A JSONL line
+    that does not parse is logged with its line number and yielded as None,
+    so import_items skips it like any other bad row.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, newline='', encoding='utf-8') as f:
+        if extension == '.csv':
+            yield from csv.DictReader(f)
+        elif extension in ('.jsonl', '.ndjson'):
+            for number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError as e:
+                    print(f"[Import] {path}:{number}: skipping malformed line ({e})")
+                    record = None
+                yield record
+        else:
+            raise ValueError(f'unsupported file type {extension!r} (use .csv or .jsonl)')
+
+def to_row(side, record):
+    """
+    Insert tuple for a record; raises ValueError when the record is not an
+    object or a required column is empty
+    """
+    if not isinstance(record, dict):
+        raise ValueError('not an object')
+    missing = [column for column in REQUIRED_COLUMNS[side] if not record.get(column)]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    return tuple(record.get(column) or None for column in IMPORT_COLUMNS[side])
+
+def import_items(side, records, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Insert records into lost_items or found_items in batches.
+    Returns {'imported', 'skipped', 'seconds'}; progress, if given, is called
+    with the number of rows imported after every batch.
+    """
+    started = time.perf_counter()
+    imported = 0
+    skipped = 0
+    batch = []
+
+    for record in records:
+        try:
+            batch.append(to_row(side, record))
+        except ValueError:
+            skipped += 1
+            continue
+        if len(batch) >= batch_size:
+            imported += INSERT_BULK[side](batch)
+            batch = []
+            if progress:
+                progress(imported)
+
+    if batch:
+        imported += INSERT_BULK[side](batch)
+        if progress:
+            progress(imported)
+
+    return {
+        'imported': imported,
+        'skipped': skipped,
+        'seconds': time.perf_counter() - started
+    }
+
+def match_imported(side, before, state, notify=False, progress=None):
+    """
+    Match the items imported after `before` (get_max_item_ids() taken before
+    the import) with one batch pass: new lost items against every found
+    item, or every lost item against the new found items.
+
+    The re-match high-water marks (`state`, taken before the import) that
+    had caught up with `before` are moved past the imported items and the
+    new matches, so the next re-match run neither scores nor notifies them
+    again; owners are notified here instead if `notify` is set. Returns
+    run_batch_matching's summary plus notifications_sent.
+    """
+    import matcher
+    import otp_service
+    import rematch
+
+    after = {'lost': 0, 'found': 0}
+    after[side] = before[side]
+    limits = db.get_max_item_ids()
+    summary = matcher.run_batch_matching(rematch.REMATCH_TOP_N, progress=progress, after=after)
+    limits['matches'] = db.get_max_item_ids()['matches']
+
+    caught_up = {key: limits[key] for key in (side, 'matches') if state[key] == before[key]}
+    notifications = []
+    if caught_up and db.advance_rematch_state(state, caught_up):
+        if notify and 'matches' in caught_up:
+            notifications = db.get_match_notifications(before['matches'], limits['matches'])
+            otp_service.send_match_notifications(notifications)
+
+    summary['notifications_sent'] = len(notifications)
+    return summary
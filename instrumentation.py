@@ -0,0 +1,303 @@
+"""
+Request timing, hot-path spans and an opt-in sampling profiler.
+
+Every request is timed by endpoint, and the code it runs records named
+spans: each database.py function (db.<name>), the matcher phases
+(matcher.*) and template rendering (template.<name>). Totals are served
+at /metrics in Prometheus text format; they are per process, so scrape
+every worker.
+
+With LOSTFOUND_PROFILE_SLOW_MS set, a background thread samples the stack
+of every in-flight request every LOSTFOUND_PROFILE_INTERVAL_MS, and
+requests slower than the threshold dump their samples (collapsed stacks,
+ready for flamegraph.pl) and span breakdown to LOSTFOUND_PROFILE_DIR.
+"""
+import bisect
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+import inspect
+import json
+import os
+import sys
+import threading
+import time
+
+ENABLED = os.environ.get('LOSTFOUND_INSTRUMENTATION', '1') != '0'
+PROFILE_SLOW_MS = float(os.environ.get('LOSTFOUND_PROFILE_SLOW_MS', 0))   # 0 disables profiling
+PROFILE_INTERVAL_MS = float(os.environ.get('LOSTFOUND_PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('LOSTFOUND_PROFILE_DIR', 'profiles')
+
+# Histogram buckets in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_local = threading.local()
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.label_names, labels)} {value}')
+        return lines
+
+class Histogram:
+    """Cumulative histogram with labels, as Prometheus expects it"""
+
+    def __init__(self, name, help_text, label_names=(), buckets=BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}   # labels -> [count per bucket..., overflow, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        position = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 3)
+            series[position] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for labels, series in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f'{self.name}_bucket'
+                                 f'{_labels(self.label_names, labels, [("le", bound)])} {cumulative}')
+                lines.append(f'{self.name}_bucket'
+                             f'{_labels(self.label_names, labels, [("le", "+Inf")])} {series[-1]}')
+                lines.append(f'{self.name}_sum{_labels(self.label_names, labels)} {series[-2]}')
+                lines.append(f'{self.name}_count{_labels(self.label_names, labels)} {series[-1]}')
+        return lines
+
+REQUEST_SECONDS = Histogram('lostfound_request_seconds', 'Request latency by endpoint',
+                            ('endpoint', 'method'))
+REQUESTS = Counter('lostfound_requests_total', 'Requests by endpoint and status',
+                   ('endpoint', 'method', 'status'))
+SPAN_SECONDS = Histogram('lostfound_span_seconds',
+                         'Time in database calls, matcher phases and template rendering',
+                         ('span',))
+SLOW_PROFILES = Counter('lostfound_slow_request_profiles_total',
+                        'Slow requests whose profile was written', ('endpoint',))
+METRICS = [REQUEST_SECONDS, REQUESTS, SPAN_SECONDS, SLOW_PROFILES]
+
+def render_metrics():
+    """All metrics in Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+# Spans
+def record_span(name, seconds):
+    """Add one timed call of `name` to the metrics and to the current request"""
+    SPAN_SECONDS.observe((name,), seconds)
+    spans = getattr(_local, 'spans', None)
+    if spans is not None:
+        total = spans.get(name)
+        if total is None:
+            spans[name] = [1, seconds]
+        else:
+            total[0] += 1
+            total[1] += seconds
+
+@contextmanager
+def span(name):
+    """Time the enclosed block as span `name`"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - started)
+
+def timed(name):
+    """
+    Decorator: time every call as span `name`. For generator functions only
+    the time spent producing items counts, not the time the caller spends
+    between them.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                elapsed = 0.0
+                generator = func(*args, **kwargs)
+                try:
+                    while True:
+                        started = time.perf_counter()
+                        try:
+                            item = next(generator)
+                        finally:
+                            elapsed += time.perf_counter() - started
+                        yield item
+                except StopIteration:
+                    return
+                finally:
+                    generator.close()
+                    record_span(name, elapsed)
+            generator_wrapper.span_name = name
+            return generator_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record_span(name, time.perf_counter() - started)
+        wrapper.span_name = name
+        return wrapper
+    return decorator
+
+def instrument_module(module, prefix, exclude=()):
+    """Wrap every public function defined in `module` with timed('<prefix>.<name>')"""
+    for name, value in list(vars(module).items()):
+        if (name.startswith('_') or name in exclude or not inspect.isfunction(value)
+                or value.__module__ != module.__name__ or hasattr(value, 'span_name')):
+            continue
+        setattr(module, name, timed(f'{prefix}.{name}')(value))
+
+# Requests
+def start_request():
+    """Begin collecting spans (and stack samples, when profiling) for this thread's request"""
+    _local.spans = {}
+    _local.request_started = time.perf_counter()
+    if PROFILE_SLOW_MS > 0:
+        _sampler.watch(threading.get_ident())
+
+def finish_request(endpoint, method, status, path=''):
+    """Record the request's latency; profile it if it was slow. Returns its span totals."""
+    started = getattr(_local, 'request_started', None)
+    if started is None:
+        return {}
+    elapsed = time.perf_counter() - started
+    spans, _local.spans, _local.request_started = _local.spans, None, None
+    endpoint = endpoint or 'unknown'
+
+    REQUEST_SECONDS.observe((endpoint, method), elapsed)
+    REQUESTS.inc((endpoint, method, str(status)))
+
+    if PROFILE_SLOW_MS > 0:
+        samples = _sampler.unwatch(threading.get_ident())
+        if elapsed * 1000 >= PROFILE_SLOW_MS:
+            write_profile(endpoint, method, path, elapsed, spans, samples)
+            SLOW_PROFILES.inc((endpoint,))
+    return spans
+
+def render_spans(spans):
+    """Per-request span totals as a Server-Timing header value"""
+    return ', '.join(f'{name.replace(".", "-")};dur={seconds * 1000:.2f}'
+                     for name, (_, seconds) in sorted(spans.items(), key=lambda s: -s[1][1]))
+
+# Template rendering (receivers for Flask's before_render_template/template_rendered)
+def template_started(sender, template, context, **extra):
+    _local.template_started = time.perf_counter()
+
+def template_rendered(sender, template, context, **extra):
+    started = getattr(_local, 'template_started', None)
+    if started is not None:
+        _local.template_started = None
+        record_span(f'template.{template.name}', time.perf_counter() - started)
+
+# Sampling profiler
+class StackSampler:
+    """
+    Samples the Python stacks of watched threads at a fixed interval.
+    Only threads serving a request are watched, so idle time costs nothing
+    beyond the sampler thread waking up.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._watched = {}    # thread id -> {collapsed stack: samples}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, thread_id):
+        with self._lock:
+            self._watched[thread_id] = {}
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-profiler',
+                                                daemon=True)
+                self._thread.start()
+
+    def unwatch(self, thread_id):
+        with self._lock:
+            return self._watched.pop(thread_id, {})
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._watched:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is None:
+                        continue
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                                     f':{code.co_firstlineno})')
+                        frame = frame.f_back
+                    key = ';'.join(reversed(stack))
+                    stacks[key] = stacks.get(key, 0) + 1
+
+_sampler = StackSampler(PROFILE_INTERVAL_MS / 1000)
+
+def write_profile(endpoint, method, path, elapsed, spans, samples):
+    """
+    Write a slow request's profile: <name>.folded (collapsed stacks for
+    flamegraph.pl / speedscope) and <name>.json (timing and span breakdown)
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = (f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint}"
+            f"-{elapsed * 1000:.0f}ms").replace('/', '_')
+    base = os.path.join(PROFILE_DIR, name)
+
+    with open(base + '.folded', 'w') as f:
+        for stack, count in sorted(samples.items(), key=lambda sample: -sample[1]):
+            f.write(f'{stack} {count}\n')
+
+    with open(base + '.json', 'w') as f:
+        json.dump({
+            'endpoint': endpoint,
+            'method': method,
+            'path': path,
+            'duration_ms': elapsed * 1000,
+            'sample_interval_ms': PROFILE_INTERVAL_MS,
+            'samples': sum(samples.values()),
+            'spans': {span_name: {'calls': calls, 'ms': seconds * 1000}
+                      for span_name, (calls, seconds)
+                      in sorted(spans.items(), key=lambda item: -item[1][1])},
+        }, f, indent=2)
+    return base
@@ -0,0 +1,1166 @@
+"""
+In-memory TF-IDF index over the active lost and found items.
+
+The index keeps one fitted vocabulary shared by both sides and a sparse
+document matrix per side, so matching a new report only vectorizes that
+one report and takes a sparse dot product against the cached matrix.
+New items are appended incrementally, items that leave 'active' are
+masked out, and the vocabulary and IDF weights are refitted periodically
+by a background thread.
+
+Optionally, description candidates come from random-projection LSH
+buckets (ProjectionLSH) instead of the term postings, for corpora where
+the postings of common terms cover most of the side. Shortlisted rows are
+still scored with the exact cosine, so only recall is approximate. The
+bucket keys are saved to disk and reused after a restart while the fitted
+vocabulary and IDF weights are unchanged.
+
+The whole index can also be saved as a snapshot (see snapshot.py) that
+other processes memory-map instead of refitting: a worker that starts
+with a snapshot on disk is ready to match in milliseconds, shares the
+matrices with every other worker through the page cache, and never
+imports scikit-learn unless it refits itself. Every refit replaces the
+snapshot atomically, and the other processes swap to it on their next
+refit check instead of refitting too.
+"""
+import bisect
+from functools import lru_cache
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+import numpy as np
+from scipy import sparse
+
+import instrumentation
+import snapshot
+from snapshot import PackedStrings
+
+SIDES = ('lost', 'found')
+
+REFIT_INTERVAL = 300        # seconds between background refit checks
+REFIT_MAX_AGE = 3600        # refit at least this often to pick up removals from other processes
+SYNC_REFIT_MAX_DOCS = 200   # small corpora are simply refitted on every change
+DELTA_MAX_ROWS = 1024       # appended rows kept apart from the main matrix before merging
+LSH_SEED = 20240229         # hyperplanes are drawn from this seed, so processes agree
+PHOTO_HASH_CHUNKS = 4       # 16-bit substrings of the 64-bit photo hashes, one table each
+SNAPSHOT_VERSION = 1        # layout of the arrays in an index snapshot
+
+TOKEN_PATTERN = re.compile(r'(?u)\b\w\w+\b')    # TfidfVectorizer's default tokens
+
+
+def make_vectorizer():
+    """TF-IDF settings used for every fit (scikit-learn is only imported to fit)"""
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    return TfidfVectorizer(
+        max_features=100,
+        ngram_range=(1, 2),  # Use unigrams and bigrams
+        min_df=1
+    )
+
+
+class TfidfModel:
+    """
+    The transform half of a fitted make_vectorizer(): its vocabulary and IDF
+    weights. Vectorizes texts as TfidfVectorizer.transform does (lowercased
+    word tokens, unigrams and bigrams, raw counts times IDF, L2-normalized)
+    without importing scikit-learn.
+    """
+
+    def __init__(self, terms, idf):
+        self.terms = terms      # term of every column
+        self.idf_ = idf
+        self._vocabulary = None
+
+    @classmethod
+    def from_vectorizer(cls, vectorizer):
+        vocabulary = vectorizer.vocabulary_
+        return cls(sorted(vocabulary, key=vocabulary.get),
+                   np.asarray(vectorizer.idf_, dtype=np.float64))
+
+    @property
+    def vocabulary_(self):
+        """term -> column"""
+        if self._vocabulary is None:
+            self._vocabulary = {term: column for column, term in enumerate(self.terms)}
+        return self._vocabulary
+
+    def transform(self, texts):
+        vocabulary = self.vocabulary_
+        indptr, indices, counts = [0], [], []
+        for text in texts:
+            tokens = TOKEN_PATTERN.findall(text.lower())
+            row = {}
+            for term in tokens + [' '.join(pair) for pair in zip(tokens, tokens[1:])]:
+                column = vocabulary.get(term)
+                if column is not None:
+                    row[column] = row.get(column, 0) + 1
+            for column in sorted(row):
+                indices.append(column)
+                counts.append(row[column])
+            indptr.append(len(indices))
+
+        indices = np.array(indices, dtype=np.int32)
+        indptr = np.array(indptr, dtype=np.int32)
+        data = np.array(counts, dtype=np.float64) * self.idf_[indices]
+        owner = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        norms = np.sqrt(np.bincount(owner, weights=data * data, minlength=len(texts)))
+        data /= norms[owner]
+        return sparse.csr_matrix((data, indices, indptr), shape=(len(texts), len(self.terms)))
+
+
+class KeyTable:
+    """
+    Interns normalized category strings as small integer codes.
+    A table loaded from a snapshot builds its lookup dict on first use.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = [] if strings is None else strings   # key of every code
+        self._codes = None
+
+    @property
+    def codes(self):
+        """key -> code"""
+        if self._codes is None:
+            self._codes = {key: code for code, key in enumerate(self.strings)}
+        return self._codes
+
+    def intern(self, key):
+        """Code for a key, allocating one if needed; None maps to -1"""
+        if key is None:
+            return -1
+        code = self.codes.get(key)
+        if code is None:
+            if not isinstance(self.strings, list):
+                self._thaw()
+            code = self.codes[key] = len(self.strings)
+            self.strings.append(key)
+            self._added(key)
+        return code
+
+    def lookup(self, key):
+        """Code for a key without allocating; unknown keys map to -2"""
+        if key is None:
+            return -1
+        return self.codes.get(key, -2)
+
+    def _thaw(self):
+        """Copy snapshot-backed storage into growable structures before the first new key"""
+        self.strings = list(self.strings)
+
+    def _added(self, key):
+        pass
+
+
+class LocationTable(KeyTable):
+    """
+    Interns cleaned location strings and keeps, per location code, its
+    string and the codes of its distinct words in CSR-style arrays that
+    grow by doubling
+    """
+
+    def __init__(self, strings=None, words=None, word_indptr=None, word_indices=None):
+        super().__init__(strings)
+        self.words = [] if words is None else words     # word of every word code
+        self._word_codes = None
+        self._word_indptr = np.zeros(1, dtype=np.int64) if word_indptr is None else word_indptr
+        self._word_indices = np.zeros(0, dtype=np.int64) if word_indices is None else word_indices
+
+    @property
+    def word_codes(self):
+        """word -> word code"""
+        if self._word_codes is None:
+            self._word_codes = {word: code for code, word in enumerate(self.words)}
+        return self._word_codes
+
+    def _thaw(self):
+        super()._thaw()
+        self.words = list(self.words)
+        self._word_indptr = np.array(self._word_indptr)
+        self._word_indices = np.array(self._word_indices)
+
+    def _added(self, key):
+        word_codes = self.word_codes
+        codes = []
+        for word in set(key.split()):
+            code = word_codes.get(word)
+            if code is None:
+                code = word_codes[word] = len(self.words)
+                self.words.append(word)
+            codes.append(code)
+        self._append_words(codes)
+
+    def _append_words(self, words):
+        start = self._word_indptr[len(self.strings) - 1]
+        end = start + len(words)
+        if end > len(self._word_indices):
+            self._word_indices = np.resize(self._word_indices,
+                                           max(end, 2 * len(self._word_indices)))
+        self._word_indices[start:end] = words
+        if len(self.strings) + 1 > len(self._word_indptr):
+            self._word_indptr = np.resize(self._word_indptr, 2 * len(self._word_indptr))
+        self._word_indptr[len(self.strings)] = end
+
+    def word_arrays(self):
+        """(indptr, indices) of the words of every location code, trimmed"""
+        indptr = self._word_indptr[:len(self.strings) + 1]
+        return indptr, self._word_indices[:indptr[-1]]
+
+    def words_of(self, codes):
+        """
+        Flattened words of the given location codes.
+        Returns (owner, words, counts): the position in `codes` each word
+        belongs to, the word codes, and the number of words per location.
+        """
+        starts = self._word_indptr[codes]
+        counts = self._word_indptr[codes + 1] - starts
+        owner = np.repeat(np.arange(len(codes)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return owner, self._word_indices[np.repeat(starts, counts) + offsets], counts
+
+
+class SortedKeyTables:
+    """
+    Integer keys of rows in several tables, each table kept sorted together
+    with the row of every key, so the rows holding given keys are found by
+    binary search. Entries added since the last merge are kept apart and
+    compared directly. The sorted arrays are never written in place, so
+    they can be read-only snapshot views.
+    """
+
+    def __init__(self, tables, sorted_keys=None, rows=None):
+        self.tables = tables
+        self.sorted_keys = (np.zeros((tables, 0), dtype=np.int64)
+                            if sorted_keys is None else sorted_keys)
+        self.rows = np.zeros((tables, 0), dtype=np.int64) if rows is None else rows
+        self._delta_keys = []
+        self._delta_rows = []
+
+    def build(self, keys, rows):
+        """Replace the contents with `keys` (one key per table for each entry) of `rows`"""
+        order = np.argsort(keys, axis=0, kind='stable').T
+        self.sorted_keys = np.take_along_axis(keys.T, order, axis=1)
+        self.rows = np.asarray(rows, dtype=np.int64)[order]
+        self._delta_keys, self._delta_rows = [], []
+
+    def append(self, keys, row):
+        """Add one entry; merged into the sorted tables every DELTA_MAX_ROWS entries"""
+        self._delta_keys.append(keys)
+        self._delta_rows.append(row)
+        if len(self._delta_rows) >= DELTA_MAX_ROWS:
+            self.merge()
+
+    def merged(self):
+        """(sorted_keys, rows) including the appended entries, leaving the tables as they are"""
+        if not self._delta_rows:
+            return self.sorted_keys, self.rows
+        keys = np.array(self._delta_keys, dtype=np.int64).reshape(-1, self.tables)
+        rows = np.array(self._delta_rows, dtype=np.int64)
+        sorted_keys, sorted_rows = [], []
+        for table in range(self.tables):
+            order = np.argsort(keys[:, table], kind='stable')
+            new_keys = keys[order, table]
+            positions = np.searchsorted(self.sorted_keys[table], new_keys)
+            sorted_keys.append(np.insert(self.sorted_keys[table], positions, new_keys))
+            sorted_rows.append(np.insert(self.rows[table], positions, rows[order]))
+        return np.array(sorted_keys), np.array(sorted_rows)
+
+    def merge(self):
+        """Move the appended entries into the sorted tables"""
+        self.sorted_keys, self.rows = self.merged()
+        self._delta_keys, self._delta_rows = [], []
+
+    def keys_by_row(self, row_count):
+        """(row_count, tables) keys in row order; rows without an entry get -1"""
+        sorted_keys, rows = self.merged()
+        keys = np.full((row_count, self.tables), -1, dtype=np.int64)
+        for table in range(self.tables):
+            keys[rows[table], table] = sorted_keys[table]
+        return keys
+
+    def find(self, probe_keys):
+        """Sorted rows holding, in some table t, one of the keys in probe_keys[t]"""
+        found = []
+        for table in range(self.tables):
+            keys = self.sorted_keys[table]
+            starts = np.searchsorted(keys, probe_keys[table], 'left')
+            lengths = np.searchsorted(keys, probe_keys[table], 'right') - starts
+            total = lengths.sum()
+            if total:
+                positions = (np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+                             + np.arange(total))
+                found.append(self.rows[table][positions])
+        if self._delta_rows:
+            keys = np.array(self._delta_keys, dtype=np.int64).reshape(-1, self.tables)
+            hit = np.zeros(len(keys), dtype=bool)
+            for table in range(self.tables):
+                hit |= np.isin(keys[:, table], probe_keys[table])
+            found.append(np.array(self._delta_rows, dtype=np.int64)[hit])
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(found))
+
+
+class ProjectionLSH:
+    """
+    Random-projection (SimHash) LSH over the normalized TF-IDF rows of one
+    side. Each of `tables` hash tables keys a row by the signs of its
+    projections onto `bits` random hyperplanes, so rows at a small angle to
+    the query (high cosine) share a bucket with it in at least one table with
+    high probability. More tables raise recall, more bits shrink buckets.
+    Rows without any vocabulary term get key -1 and are never returned.
+    """
+
+    def __init__(self, n_features, tables, bits, seed=LSH_SEED, table=None):
+        self.tables = tables
+        self.bits = bits
+        self.planes = np.random.default_rng(seed).standard_normal((n_features, tables * bits))
+        self._powers = 1 << np.arange(bits, dtype=np.int64)
+        self.table = SortedKeyTables(tables) if table is None else table
+
+    def keys(self, matrix):
+        """(rows, tables) bucket keys of the rows of a sparse matrix"""
+        projected = np.asarray(matrix @ self.planes).reshape(matrix.shape[0], self.tables, self.bits)
+        keys = (projected > 0).astype(np.int64) @ self._powers
+        keys[np.diff(matrix.tocsr().indptr) == 0] = -1
+        return keys
+
+    def build(self, keys):
+        """Replace the tables with the keys of rows 0..len(keys)-1"""
+        self.table.build(keys, np.arange(len(keys)))
+
+    def append(self, vector, row):
+        """Add an appended row (a 1-row sparse matrix)"""
+        self.table.append(self.keys(vector)[0], row)
+
+    def candidates(self, vector, probes=0):
+        """
+        Rows sharing a bucket with the query vector in any table. With
+        probes=1 the buckets one bit away from the query's are searched too
+        (multi-probe LSH), which raises recall without more tables.
+        """
+        query = self.keys(vector)[0]
+        if query[0] < 0:
+            return np.zeros(0, dtype=np.int64)
+        probe_keys = query[:, None]
+        if probes:
+            probe_keys = np.hstack([probe_keys, query[:, None] ^ self._powers[None, :]])
+        return self.table.find(probe_keys)
+
+
+_POPCOUNT8 = np.array([bin(value).count('1') for value in range(256)], dtype=np.int64)
+
+def hamming_distances(photo_hash, hashes):
+    """Hamming distances between a 64-bit hash and an array of them"""
+    xor = np.bitwise_xor(np.asarray(hashes, dtype=np.uint64), np.uint64(photo_hash))
+    return _POPCOUNT8[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+class PhotoIndex:
+    """
+    Multi-index hashing over 64-bit perceptual photo hashes. Every hash is
+    split into PHOTO_HASH_CHUNKS chunks with one sorted table per chunk; two
+    hashes within Hamming distance r agree within r // PHOTO_HASH_CHUNKS bits
+    on at least one chunk, so a search only probes the chunk values that
+    close to the query's, and the caller checks the full distance of the
+    rows found. Only rows with a photo are stored.
+    """
+
+    CHUNK_BITS = 64 // PHOTO_HASH_CHUNKS
+
+    def __init__(self, table=None):
+        self.table = SortedKeyTables(PHOTO_HASH_CHUNKS) if table is None else table
+
+    @classmethod
+    def chunks(cls, hashes):
+        """(hashes, PHOTO_HASH_CHUNKS) chunk values of an array of hashes"""
+        hashes = np.asarray(hashes, dtype=np.uint64).reshape(-1, 1)
+        shifts = np.arange(PHOTO_HASH_CHUNKS, dtype=np.uint64) * np.uint64(cls.CHUNK_BITS)
+        return ((hashes >> shifts) & np.uint64((1 << cls.CHUNK_BITS) - 1)).astype(np.int64)
+
+    def build(self, hashes, rows):
+        self.table.build(self.chunks(hashes), rows)
+
+    def add(self, photo_hash, row):
+        self.table.append(self.chunks([photo_hash])[0], row)
+
+    def candidates(self, photo_hash, max_distance):
+        """Rows whose hash may be within max_distance of photo_hash (a superset)"""
+        masks = _chunk_masks(max_distance // PHOTO_HASH_CHUNKS)
+        query = self.chunks([photo_hash])[0]
+        return self.table.find(query[:, None] ^ masks[None, :])
+
+@lru_cache(maxsize=None)
+def _chunk_masks(radius):
+    """Every chunk value with at most `radius` bits set"""
+    values = np.arange(1 << PhotoIndex.CHUNK_BITS, dtype=np.int64)
+    return values[hamming_distances(0, values) <= radius]
+
+
+def _block_key(key):
+    """Blocking keys (tuples of strings) as the strings the postings are sorted by"""
+    return '\x1f'.join(key)
+
+def _build_postings(groups):
+    """(sorted keys, indptr, rows) CSR-style postings from {encoded key: rows}"""
+    keys = sorted(groups)
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum([len(groups[key]) for key in keys], out=indptr[1:])
+    if not keys:
+        return keys, indptr, np.zeros(0, dtype=np.int64)
+    return keys, indptr, np.concatenate([np.asarray(groups[key], dtype=np.int64) for key in keys])
+
+class _RowArray:
+    """
+    Per-row array of a SideIndex: a view of the used part of a buffer that
+    append() grows by doubling. Assigning an array replaces the buffer and
+    sets the row count.
+    """
+
+    def __set_name__(self, owner, name):
+        self.buffer = '_' + name
+
+    def __get__(self, side_index, owner=None):
+        if side_index is None:
+            return self
+        return getattr(side_index, self.buffer)[:side_index._rows]
+
+    def __set__(self, side_index, values):
+        setattr(side_index, self.buffer, values)
+        side_index._rows = len(values)
+
+
+class SideIndex:
+    """
+    Document matrix, blocking keys and row bookkeeping for one side (lost or
+    found). Rows are kept in ascending item id order, so an item's row is
+    found by binary search; everything is held in flat arrays, which is what
+    lets a side be saved to and memory-mapped from a snapshot.
+    """
+
+    ids = _RowArray()
+    category_codes = _RowArray()
+    location_codes = _RowArray()
+    alive = _RowArray()
+    photo_hashes = _RowArray()
+    has_photo = _RowArray()
+    ROW_ARRAYS = ('ids', 'category_codes', 'location_codes', 'alive', 'photo_hashes', 'has_photo')
+
+    def __init__(self, n_features=0):
+        self.n_features = n_features
+        self.ids = np.zeros(0, dtype=np.int64)  # item id for every row, ascending
+        self.category_codes = np.zeros(0, dtype=np.int64)
+        self.location_codes = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.main = sparse.csr_matrix((0, n_features))
+        self._main_csc = None   # term -> rows postings view of `main`
+        self.delta = []         # rows appended since the last merge
+        self._delta_matrix = None
+        self.block_keys = []    # sorted encoded blocking keys of the postings below
+        self.block_indptr = np.zeros(1, dtype=np.int64)
+        self.block_postings = np.zeros(0, dtype=np.int64)
+        self.blocks = {}        # encoded blocking key -> rows appended since the postings were built
+        self.photo_hashes = np.zeros(0, dtype=np.uint64)    # perceptual photo hash of every row
+        self.has_photo = np.zeros(0, dtype=bool)
+        self.photos = PhotoIndex()
+        self.lsh = None         # ProjectionLSH over the rows, when enabled
+        self.high_water = 0     # highest item id seen
+
+    def __len__(self):
+        return int(np.count_nonzero(self.alive))
+
+    def row_of(self, item_id):
+        """Row of an alive item, or None"""
+        row = int(np.searchsorted(self.ids, item_id))
+        if row < len(self.ids) and self.ids[row] == item_id and self.alive[row]:
+            return row
+        return None
+
+    def append(self, item_id, vector, category_code, location_code, blocks=(), photo_hash=None):
+        """Add one vectorized item as a new row (ids must arrive in ascending order)"""
+        if len(self.ids) and item_id <= self.ids[-1]:
+            return
+        row = self._rows
+        if row == len(self._ids):
+            # Grow every row array by doubling (snapshot buffers are copied here)
+            for name in self.ROW_ARRAYS:
+                buffer = '_' + name
+                setattr(self, buffer, np.resize(getattr(self, buffer), max(16, 2 * row)))
+        self._ids[row] = item_id
+        self._category_codes[row] = category_code
+        self._location_codes[row] = location_code
+        self._photo_hashes[row] = np.uint64(photo_hash if photo_hash is not None else 0)
+        self._has_photo[row] = photo_hash is not None
+        self._alive[row] = True
+        self._rows = row + 1
+        for key in blocks:
+            self.blocks.setdefault(_block_key(key), []).append(row)
+        if photo_hash is not None:
+            self.photos.add(photo_hash, row)
+        self.delta.append(vector)
+        self._delta_matrix = None
+        if self.lsh is not None:
+            self.lsh.append(vector, row)
+        self.high_water = max(self.high_water, item_id)
+
+        if len(self.delta) >= DELTA_MAX_ROWS:
+            self.main = sparse.vstack([self.main] + self.delta, format='csr')
+            self._main_csc = None
+            self.delta = []
+
+    def remove(self, item_id):
+        """Mask out an item; the row itself is dropped at the next refit"""
+        row = self.row_of(item_id)
+        if row is None:
+            return False
+        self.alive[row] = False
+        return True
+
+    def description_hits(self, vector):
+        """
+        Cosine similarity against a normalized query vector, computed only
+        from the postings of the query's terms. Returns (rows, scores) for
+        the alive rows sharing at least one term with the query.
+        """
+        if vector is None or not vector.nnz or not len(self.ids):
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        hit_rows, hit_scores = [], []
+        n_main = self.main.shape[0]
+        if n_main:
+            if self._main_csc is None:
+                self._main_csc = self.main.tocsc()
+            postings = self._main_csc[:, vector.indices]
+            weights = np.repeat(vector.data, np.diff(postings.indptr))
+            rows, inverse = np.unique(postings.indices, return_inverse=True)
+            hit_rows.append(rows)
+            hit_scores.append(np.bincount(inverse, weights=postings.data * weights,
+                                          minlength=len(rows)))
+        if self.delta:
+            if self._delta_matrix is None:
+                self._delta_matrix = sparse.vstack(self.delta, format='csr')
+            scores = (self._delta_matrix @ vector.T).toarray().ravel()
+            rows = np.flatnonzero(scores)
+            hit_rows.append(rows + n_main)
+            hit_scores.append(scores[rows])
+
+        rows = np.concatenate(hit_rows)
+        scores = np.concatenate(hit_scores)
+        keep = self.alive[rows] & (scores > 0)
+        return rows[keep], scores[keep]
+
+    def lsh_hits(self, vector, probes=0):
+        """
+        description_hits restricted to the LSH shortlist: the exact cosine
+        of the alive rows sharing a bucket with the query
+        """
+        if vector is None or not vector.nnz or self.lsh is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+
+        rows = self.lsh.candidates(vector, probes)
+        rows = rows[self.alive[rows]]
+        n_main = self.main.shape[0]
+        in_main = rows < n_main
+        scores = np.zeros(len(rows))
+        if in_main.any():
+            scores[in_main] = (self.main[rows[in_main]] @ vector.T).toarray().ravel()
+        if not in_main.all():
+            if self._delta_matrix is None:
+                self._delta_matrix = sparse.vstack(self.delta, format='csr')
+            scores[~in_main] = (self._delta_matrix[rows[~in_main] - n_main]
+                                @ vector.T).toarray().ravel()
+        keep = scores > 0
+        return rows[keep], scores[keep]
+
+    def photo_hits(self, photo_hash, max_distance):
+        """(rows, Hamming distances) of alive rows whose photo is within max_distance"""
+        rows = self.photos.candidates(photo_hash, max_distance)
+        distances = hamming_distances(photo_hash, self.photo_hashes[rows])
+        keep = (distances <= max_distance) & self.alive[rows]
+        return rows[keep], distances[keep]
+
+    def block_rows(self, keys):
+        """Sorted alive rows sharing any of the given blocking keys"""
+        rows = []
+        for key in keys:
+            key = _block_key(key)
+            position = bisect.bisect_left(self.block_keys, key)
+            if position < len(self.block_keys) and self.block_keys[position] == key:
+                rows.append(self.block_postings[self.block_indptr[position]:
+                                                self.block_indptr[position + 1]])
+            if key in self.blocks:
+                rows.append(np.array(self.blocks[key], dtype=np.int64))
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(rows))
+        return rows[self.alive[rows]]
+
+    # Snapshots
+    def snapshot_arrays(self):
+        """Arrays that save this side, appended rows merged in"""
+        if self.delta:
+            matrix = sparse.vstack([self.main] + self.delta, format='csr')
+            columns = matrix.tocsc()
+        else:
+            matrix = self.main
+            if self._main_csc is None:
+                self._main_csc = matrix.tocsc()
+            columns = self._main_csc
+
+        block_keys, block_indptr, block_postings = self.block_keys, self.block_indptr, self.block_postings
+        if self.blocks:
+            groups = {key: [block_postings[block_indptr[position]:block_indptr[position + 1]]]
+                      for position, key in enumerate(block_keys)}
+            for key, rows in self.blocks.items():
+                groups.setdefault(key, []).append(np.array(rows, dtype=np.int64))
+            block_keys, block_indptr, block_postings = _build_postings(
+                {key: np.concatenate(parts) for key, parts in groups.items()})
+        block_blob, block_offsets = snapshot.pack_strings(block_keys)
+
+        arrays = {
+            'ids': self.ids,
+            'alive': self.alive,
+            'category_codes': self.category_codes,
+            'location_codes': self.location_codes,
+            'photo_hashes': self.photo_hashes,
+            'has_photo': self.has_photo,
+            'csr_data': matrix.data,
+            'csr_indices': matrix.indices,
+            'csr_indptr': matrix.indptr,
+            'csc_data': columns.data,
+            'csc_indices': columns.indices,
+            'csc_indptr': columns.indptr,
+            'block_keys_blob': block_blob,
+            'block_keys_offsets': block_offsets,
+            'block_indptr': block_indptr,
+            'block_postings': block_postings,
+        }
+        arrays['photo_keys'], arrays['photo_rows'] = self.photos.table.merged()
+        if self.lsh is not None:
+            arrays['lsh_keys'], arrays['lsh_rows'] = self.lsh.table.merged()
+        return arrays
+
+    @classmethod
+    def from_snapshot(cls, arrays, n_features, high_water):
+        """Side backed by the (read-only, memory-mapped) arrays of snapshot_arrays()"""
+        side_index = cls(n_features)
+        side_index.ids = arrays['ids']
+        side_index.alive = np.array(arrays['alive'])    # the only array written in place
+        side_index.category_codes = arrays['category_codes']
+        side_index.location_codes = arrays['location_codes']
+        side_index.photo_hashes = arrays['photo_hashes']
+        side_index.has_photo = arrays['has_photo']
+        shape = (len(side_index.ids), n_features)
+        side_index.main = sparse.csr_matrix(
+            (arrays['csr_data'], arrays['csr_indices'], arrays['csr_indptr']), shape=shape)
+        side_index._main_csc = sparse.csc_matrix(
+            (arrays['csc_data'], arrays['csc_indices'], arrays['csc_indptr']), shape=shape)
+        side_index.block_keys = PackedStrings(arrays['block_keys_blob'], arrays['block_keys_offsets'])
+        side_index.block_indptr = arrays['block_indptr']
+        side_index.block_postings = arrays['block_postings']
+        side_index.photos = PhotoIndex(SortedKeyTables(PHOTO_HASH_CHUNKS, arrays['photo_keys'],
+                                                       arrays['photo_rows']))
+        side_index.high_water = high_water
+        return side_index
+
+
+class MatchIndex:
+    """
+    Long-lived TF-IDF index shared by all matching calls in a process.
+
+    `load_documents(side)` must return the active items of one side in
+    ascending id order as dicts with 'id', 'text', 'category_key',
+    'location_key', 'blocks' and optionally 'photo_hash' (unsigned 64-bit
+    perceptual hash) keys; it is used for every full (re)fit, so a refit
+    also picks up inserts and status changes made by other processes. The
+    category and location keys are normalized strings (or None) interned as
+    integer codes so candidates can be scored as arrays; 'blocks' are tuples
+    of strings (category, exact location, ...) the matcher can ask for
+    candidates by.
+
+    With lsh_tables > 0, searches take description candidates from a
+    ProjectionLSH per side (lsh_bits per key, lsh_probes as in
+    ProjectionLSH.candidates) whose keys are saved to lsh_path, if given.
+
+    With a snapshot_path, every refit saves the index there and
+    load_snapshot() maps it instead of refitting. snapshot_source (a string,
+    or a callable returning one) identifies the data the documents come
+    from, and snapshots of another source are ignored. `load_item_ids(side)`,
+    if given, returns the ascending ids of the active items of a side and
+    the highest id the side ever used; a loaded snapshot is reconciled with
+    them, and rejected if it lacks active items it should hold.
+    """
+
+    def __init__(self, load_documents, lsh_tables=0, lsh_bits=12, lsh_probes=0, lsh_path=None,
+                 snapshot_path=None, snapshot_source='', load_item_ids=None):
+        self.load_documents = load_documents
+        self.lsh_tables = lsh_tables
+        self.lsh_bits = lsh_bits
+        self.lsh_probes = lsh_probes
+        self.lsh_path = lsh_path
+        self.snapshot_path = snapshot_path
+        self.snapshot_source = snapshot_source
+        self.load_item_ids = load_item_ids
+        self.vectorizer = None  # TfidfModel of the current fit
+        self.sides = {side: SideIndex() for side in SIDES}
+        self.categories = KeyTable()
+        self.locations = LocationTable()
+        self.changes = 0
+        self.fitted_at = 0.0
+        self.documents_loaded_at = 0.0
+        self._lock = threading.RLock()
+        self._refit_lock = threading.Lock()
+        self._removed_during_refit = None
+        self._added_during_refit = None
+        self._recent_removals = []  # (time, side, item id), replayed onto loaded snapshots
+        self._snapshot_id = None    # snapshot.file_id of the snapshot last written or loaded
+        self._fitted_source = None  # snapshot source the current documents were loaded from
+        self._stop = threading.Event()
+        self._thread = None
+
+    # Fitting
+    def refit(self):
+        """Refit vocabulary and IDF on all active items and rebuild both matrices"""
+        with self._refit_lock:
+            with self._lock:
+                self._removed_during_refit = set()
+                self._added_during_refit = []
+                changes_before = self.changes
+
+            source = self._current_source()
+            loaded_at = time.time()
+            documents = {side: list(self.load_documents(side)) for side in SIDES}
+            texts = [doc['text'] for side in SIDES for doc in documents[side]]
+
+            vectorizer = make_vectorizer()
+            try:
+                with instrumentation.span('matcher.tfidf_fit'):
+                    matrix = vectorizer.fit_transform(texts)
+                model = TfidfModel.from_vectorizer(vectorizer)
+            except ValueError:
+                # Empty corpus or no usable tokens yet
+                model, matrix = None, None
+
+            sides = {}
+            offset = 0
+            for side in SIDES:
+                docs = documents[side]
+                side_index = SideIndex(len(model.terms) if model else 0)
+                if model is not None:
+                    side_index.main = matrix[offset:offset + len(docs)].tocsr()
+                side_index.ids = np.array([doc['id'] for doc in docs], dtype=np.int64)
+                with self._lock:
+                    side_index.category_codes = np.array(
+                        [self.categories.intern(doc['category_key']) for doc in docs],
+                        dtype=np.int64)
+                    side_index.location_codes = np.array(
+                        [self.locations.intern(doc['location_key']) for doc in docs],
+                        dtype=np.int64)
+                photo_hashes = [doc.get('photo_hash') for doc in docs]
+                side_index.has_photo = np.array([photo_hash is not None
+                                                 for photo_hash in photo_hashes], dtype=bool)
+                side_index.photo_hashes = np.array(
+                    [photo_hash if photo_hash is not None else 0 for photo_hash in photo_hashes],
+                    dtype=np.uint64)
+                photo_rows = np.flatnonzero(side_index.has_photo)
+                side_index.photos.build(side_index.photo_hashes[photo_rows], photo_rows)
+                groups = {}
+                for row, doc in enumerate(docs):
+                    for key in doc['blocks']:
+                        groups.setdefault(_block_key(key), []).append(row)
+                (side_index.block_keys, side_index.block_indptr,
+                 side_index.block_postings) = _build_postings(groups)
+                side_index.alive = np.ones(len(docs), dtype=bool)
+                side_index.high_water = int(side_index.ids[-1]) if len(docs) else 0
+                sides[side] = side_index
+                offset += len(docs)
+
+            if self.lsh_tables and model is not None:
+                with instrumentation.span('matcher.lsh_build'):
+                    self._build_lsh(model, sides)
+
+            with self._lock:
+                # Replay items appended while we were fitting (the documents
+                # may have been loaded before they were reported), then removals
+                for side, doc in self._added_during_refit:
+                    if model is None:
+                        sides[side].high_water = max(sides[side].high_water, doc['id'])
+                        continue
+                    sides[side].append(doc['id'], model.transform([doc['text']]),
+                                       self.categories.intern(doc['category_key']),
+                                       self.locations.intern(doc['location_key']),
+                                       doc['blocks'], doc.get('photo_hash'))
+                self._added_during_refit = None
+                for side, item_id in self._removed_during_refit:
+                    sides[side].remove(item_id)
+                self._removed_during_refit = None
+                self._recent_removals = [removal for removal in self._recent_removals
+                                         if removal[0] >= loaded_at]
+
+                self.vectorizer = model
+                self.sides = sides
+                self.changes -= changes_before
+                self.fitted_at = time.time()
+                self.documents_loaded_at = loaded_at
+                self._fitted_source = source
+
+            if self.snapshot_path and model is not None:
+                self.save_snapshot()
+
+    def _maybe_refit_now(self):
+        """Refit synchronously while the corpus is still tiny"""
+        total = sum(len(side_index) for side_index in self.sides.values())
+        if self.vectorizer is None or total <= SYNC_REFIT_MAX_DOCS:
+            self.refit()
+            return True
+        return False
+
+    # LSH keys on disk
+    def _lsh_fingerprint(self, vectorizer):
+        """Identifies the vectorizer and LSH settings saved keys were computed with"""
+        digest = hashlib.sha1(f'{self.lsh_tables}/{self.lsh_bits}/{LSH_SEED}'.encode())
+        for term, column in sorted(vectorizer.vocabulary_.items()):
+            digest.update(f'{term}\t{column}\n'.encode())
+        digest.update(np.ascontiguousarray(vectorizer.idf_, dtype=np.float64).tobytes())
+        return digest.hexdigest()
+
+    def _load_lsh_keys(self, fingerprint):
+        """{side: (item ids, key rows)} from lsh_path when it matches the fingerprint"""
+        if not self.lsh_path or not os.path.exists(self.lsh_path):
+            return {}
+        try:
+            with np.load(self.lsh_path) as saved:
+                if str(saved['fingerprint']) != fingerprint:
+                    return {}
+                return {side: (saved[f'{side}_ids'], saved[f'{side}_keys']) for side in SIDES}
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def _save_lsh_keys(self, fingerprint, sides):
+        """Atomically replace lsh_path with the keys of every row"""
+        directory = os.path.dirname(os.path.abspath(self.lsh_path))
+        os.makedirs(directory, exist_ok=True)
+        arrays = {'fingerprint': np.array(fingerprint)}
+        for side in SIDES:
+            arrays[f'{side}_ids'] = sides[side].ids
+            arrays[f'{side}_keys'] = sides[side].lsh.table.keys_by_row(len(sides[side].ids))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(tmp_path, self.lsh_path)
+        except OSError as exc:
+            print(f"[MatchIndex] Could not save LSH keys: {exc}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _build_lsh(self, vectorizer, sides):
+        """Give every side an LSH, reusing saved keys for rows that have one"""
+        fingerprint = self._lsh_fingerprint(vectorizer)
+        saved = self._load_lsh_keys(fingerprint)
+        stale = not saved
+        for side in SIDES:
+            side_index = sides[side]
+            lsh = ProjectionLSH(side_index.n_features, self.lsh_tables, self.lsh_bits)
+            ids = side_index.ids
+            keys = np.empty((len(ids), self.lsh_tables), dtype=np.int64)
+            missing = np.ones(len(ids), dtype=bool)
+            if side in saved:
+                saved_ids, saved_keys = saved[side]
+                _, saved_rows, rows = np.intersect1d(saved_ids, ids, assume_unique=True,
+                                                     return_indices=True)
+                keys[rows] = saved_keys[saved_rows]
+                missing[rows] = False
+                stale = stale or len(rows) != len(saved_ids)
+            if missing.any():
+                missing_rows = np.flatnonzero(missing)
+                keys[missing_rows] = lsh.keys(side_index.main[missing_rows])
+                stale = True
+            lsh.build(keys)
+            side_index.lsh = lsh
+        if self.lsh_path and stale:
+            self._save_lsh_keys(fingerprint, sides)
+
+    # Snapshots
+    def save_snapshot(self):
+        """Write the current index to snapshot_path, atomically replacing the previous one"""
+        with self._lock:
+            if self.vectorizer is None:
+                return False
+            arrays = {'idf': self.vectorizer.idf_}
+            arrays['terms_blob'], arrays['terms_offsets'] = snapshot.pack_strings(
+                self.vectorizer.terms)
+            arrays['categories_blob'], arrays['categories_offsets'] = snapshot.pack_strings(
+                self.categories.strings)
+            arrays['locations_blob'], arrays['locations_offsets'] = snapshot.pack_strings(
+                self.locations.strings)
+            arrays['words_blob'], arrays['words_offsets'] = snapshot.pack_strings(
+                self.locations.words)
+            arrays['location_word_indptr'], arrays['location_word_indices'] = \
+                self.locations.word_arrays()
+            for side in SIDES:
+                for name, array in self.sides[side].snapshot_arrays().items():
+                    arrays[f'{side}.{name}'] = array
+            metadata = {
+                'version': SNAPSHOT_VERSION,
+                'source': self._fitted_source,
+                'fitted_at': self.fitted_at,
+                'documents_loaded_at': self.documents_loaded_at,
+                'high_water': {side: int(self.sides[side].high_water) for side in SIDES},
+                'lsh': ([self.lsh_tables, self.lsh_bits, LSH_SEED]
+                        if self.sides['lost'].lsh is not None else None),
+            }
+
+        with instrumentation.span('matcher.snapshot_save'):
+            try:
+                snapshot.write_snapshot(self.snapshot_path, arrays, metadata)
+            except OSError as exc:
+                print(f"[MatchIndex] Could not save snapshot: {exc}")
+                return False
+        self._snapshot_id = snapshot.file_id(self.snapshot_path)
+        return True
+
+    def load_snapshot(self):
+        """
+        Swap in the snapshot at snapshot_path, memory-mapped read-only.
+        Items reported after it was written are appended by the next sync.
+        Returns False, keeping the current state, when there is no usable
+        snapshot of this source.
+        """
+        if not self.snapshot_path:
+            return False
+        file_id = snapshot.file_id(self.snapshot_path)
+        if file_id is None:
+            return False
+        try:
+            with instrumentation.span('matcher.snapshot_load'):
+                metadata, arrays = snapshot.read_snapshot(self.snapshot_path)
+        except (OSError, snapshot.SnapshotError) as exc:
+            print(f"[MatchIndex] Ignoring snapshot {self.snapshot_path}: {exc}")
+            return False
+        source = self._current_source()
+        if metadata.get('version') != SNAPSHOT_VERSION or metadata.get('source') != source:
+            return False
+
+        model = TfidfModel(PackedStrings(arrays['terms_blob'], arrays['terms_offsets']),
+                           arrays['idf'])
+        categories = KeyTable(PackedStrings(arrays['categories_blob'],
+                                            arrays['categories_offsets']))
+        locations = LocationTable(PackedStrings(arrays['locations_blob'],
+                                                arrays['locations_offsets']),
+                                  PackedStrings(arrays['words_blob'], arrays['words_offsets']),
+                                  arrays['location_word_indptr'], arrays['location_word_indices'])
+        sides = {}
+        for side in SIDES:
+            prefix = f'{side}.'
+            side_arrays = {name[len(prefix):]: array for name, array in arrays.items()
+                           if name.startswith(prefix)}
+            side_index = SideIndex.from_snapshot(side_arrays, len(model.terms),
+                                                 metadata['high_water'][side])
+            if self.lsh_tables:
+                if metadata.get('lsh') == [self.lsh_tables, self.lsh_bits, LSH_SEED]:
+                    side_index.lsh = ProjectionLSH(
+                        len(model.terms), self.lsh_tables, self.lsh_bits,
+                        table=SortedKeyTables(self.lsh_tables, side_arrays['lsh_keys'],
+                                              side_arrays['lsh_rows']))
+                else:
+                    side_index.lsh = ProjectionLSH(len(model.terms), self.lsh_tables, self.lsh_bits)
+                    side_index.lsh.build(side_index.lsh.keys(side_index.main))
+            sides[side] = side_index
+        if not self._reconcile(sides):
+            print(f"[MatchIndex] Snapshot {self.snapshot_path} does not match the database; "
+                  f"ignoring it")
+            return False
+
+        with self._lock:
+            if self.vectorizer is not None:
+                # Already serving: keep the interned codes searches in flight rely on
+                self._adopt_codes(sides, categories, locations)
+            else:
+                self.categories, self.locations = categories, locations
+            self._recent_removals = [removal for removal in self._recent_removals
+                                     if removal[0] >= metadata['documents_loaded_at']]
+            for _, side, item_id in self._recent_removals:
+                sides[side].remove(item_id)
+            self.vectorizer = model
+            self.sides = sides
+            self.changes = 0
+            self.fitted_at = metadata['fitted_at']
+            self.documents_loaded_at = metadata['documents_loaded_at']
+            self._fitted_source = source
+            self._snapshot_id = file_id
+        return True
+
+    def _current_source(self):
+        if callable(self.snapshot_source):
+            return self.snapshot_source()
+        return self.snapshot_source
+
+    def _reconcile(self, sides):
+        """
+        Mark exactly the active items of snapshot sides alive. Returns False
+        when a side cannot be used: an active item at or below its high-water
+        mark is missing (it would never be synced), or the mark is above
+        every id the side ever used.
+        """
+        if self.load_item_ids is None:
+            return True
+        for side, side_index in sides.items():
+            active_ids, max_id = self.load_item_ids(side)
+            active_ids = np.asarray(active_ids, dtype=np.int64)
+            if side_index.high_water > max_id:
+                return False
+            covered = active_ids[active_ids <= side_index.high_water]
+            rows = np.searchsorted(side_index.ids, covered)
+            if len(covered) and (rows.max() >= len(side_index.ids)
+                                 or (side_index.ids[rows] != covered).any()):
+                return False
+            side_index.alive = np.zeros(len(side_index.ids), dtype=bool)
+            side_index.alive[rows] = True
+        return True
+
+    def _adopt_codes(self, sides, categories, locations):
+        """Rewrite the codes of snapshot sides into this index's key tables"""
+        category_map = np.array([self.categories.intern(key) for key in categories.strings] + [-1],
+                                dtype=np.int64)
+        location_map = np.array([self.locations.intern(key) for key in locations.strings] + [-1],
+                                dtype=np.int64)
+        for side_index in sides.values():
+            # Code -1 (no key) maps through the trailing -1
+            side_index.category_codes = category_map[side_index.category_codes]
+            side_index.location_codes = location_map[side_index.location_codes]
+
+    def _snapshot_swapped(self):
+        """Whether another process replaced the snapshot since we last wrote or loaded it"""
+        if not self.snapshot_path:
+            return False
+        file_id = snapshot.file_id(self.snapshot_path)
+        return file_id is not None and file_id != self._snapshot_id
+
+    # Incremental updates
+    def transform(self, text):
+        """Vectorize a single text with the current vocabulary"""
+        vectorizer = self.vectorizer
+        if vectorizer is None:
+            return None
+        return vectorizer.transform([text])
+
+    def add_many(self, side, documents):
+        """Append newly reported items, refitting instead while the corpus is small"""
+        documents = list(documents)
+        if not documents:
+            return
+        with self._lock:
+            for doc in documents:
+                side_index = self.sides[side]
+                if len(side_index.ids) and doc['id'] <= side_index.ids[-1]:
+                    continue
+                if self._added_during_refit is not None:
+                    self._added_during_refit.append((side, doc))
+                if self.vectorizer is None:
+                    # Nothing to vectorize against yet; just bump the high-water mark
+                    side_index.high_water = max(side_index.high_water, doc['id'])
+                    self.changes += 1
+                    continue
+                side_index.append(doc['id'], self.transform(doc['text']),
+                                  self.categories.intern(doc['category_key']),
+                                  self.locations.intern(doc['location_key']),
+                                  doc['blocks'], doc.get('photo_hash'))
+                self.changes += 1
+        self._maybe_refit_now()
+
+    def remove(self, side, item_id):
+        """Drop an item that is no longer active"""
+        with self._lock:
+            if self._removed_during_refit is not None:
+                self._removed_during_refit.add((side, item_id))
+            if self.snapshot_path:
+                self._recent_removals.append((time.time(), side, item_id))
+            if self.sides[side].remove(item_id):
+                self.changes += 1
+
+    def high_water(self, side):
+        """Highest item id already indexed for a side"""
+        return self.sides[side].high_water
+
+    # Querying
+    def search(self, side, text, blocks=(), full_scan=False, photo_hash=None,
+               max_photo_distance=0):
+        """
+        Collect candidates for a query text from one side: every alive item
+        sharing a TF-IDF term with the query (or, with LSH, a bucket), plus
+        every item in one of the requested blocks (or every alive item when
+        `full_scan` is set), plus every item whose photo is within
+        max_photo_distance of `photo_hash`.
+        Returns (ids, category_codes, location_codes, similarities,
+        photo_distances) arrays, with zero similarity for candidates found
+        only by block or photo; photo_distances is None when no photo is
+        close enough and -1 for the other candidates otherwise.
+        """
+        with self._lock:
+            side_index = self.sides[side]
+            if side_index.lsh is not None and not full_scan:
+                hit_rows, hit_scores = side_index.lsh_hits(self.transform(text), self.lsh_probes)
+            else:
+                hit_rows, hit_scores = side_index.description_hits(self.transform(text))
+            photo_rows = photo_row_distances = None
+            if photo_hash is not None:
+                photo_rows, photo_row_distances = side_index.photo_hits(photo_hash,
+                                                                        max_photo_distance)
+                if not len(photo_rows):
+                    photo_rows = None
+
+            if full_scan:
+                rows = np.flatnonzero(side_index.alive)
+                similarities = np.zeros(len(side_index.ids))
+                similarities[hit_rows] = hit_scores
+                similarities = similarities[rows]
+            else:
+                extra_rows = side_index.block_rows(blocks)
+                if photo_rows is not None:
+                    extra_rows = np.union1d(extra_rows, photo_rows)
+                extra_rows = np.setdiff1d(extra_rows, hit_rows)
+                rows = np.concatenate([hit_rows, extra_rows])
+                similarities = np.concatenate([hit_scores, np.zeros(len(extra_rows))])
+
+            photo_distances = None
+            if photo_rows is not None:
+                distances_by_row = np.full(len(side_index.ids), -1, dtype=np.int64)
+                distances_by_row[photo_rows] = photo_row_distances
+                photo_distances = distances_by_row[rows]
+
+            return (side_index.ids[rows], side_index.category_codes[rows],
+                    side_index.location_codes[rows], similarities, photo_distances)
+
+    # Background refit
+    def start_background_refit(self, interval=REFIT_INTERVAL):
+        """Start the daemon thread that periodically refits IDF (or swaps in a newer snapshot)"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refit_loop, args=(interval,),
+                                        name='match-index-refit', daemon=True)
+        self._thread.start()
+
+    def stop_background_refit(self):
+        """Stop the background refit thread"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refit_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                # Another process refitted and saved a snapshot: map it instead of refitting
+                if self._snapshot_swapped() and self.load_snapshot():
+                    continue
+                if self.changes or time.time() - self.fitted_at >= REFIT_MAX_AGE:
+                    self.refit()
+            except Exception as exc:
+                print(f"[MatchIndex] Background refit failed: {exc}")
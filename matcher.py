@@ -1,7 +1,14 @@
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 import database as db
+from match_index import MatchIndex
+import instrumentation
+from scipy import sparse
+import heapq
+import multiprocessing
+import numpy as np
+import os
 import re
+import threading
+import time
 
 def clean_text(text):
     """Clean and preprocess text"""
@@ -43,6 +50,41 @@ def create_feature_text(item):
     combined = ' '.join(features)
     return clean_text(combined)
 
+# Scoring weights: Description 60%, Category 25%, Location 15%
+DESCRIPTION_WEIGHT = 0.60
+CATEGORY_WEIGHT = 0.25
+LOCATION_WEIGHT = 0.15
+
+def weighted_score(description_score, category_score, location_score):
+    """Combine component scores (0-1) into the final confidence (0-1)"""
+    return (
+        description_score * DESCRIPTION_WEIGHT +
+        category_score * CATEGORY_WEIGHT +
+        location_score * LOCATION_WEIGHT
+    )
+
+# Photos: near-identical pictures (perceptual hashes at most IMAGE_MAX_DISTANCE
+# bits apart out of 64) raise the confidence by up to IMAGE_WEIGHT of what is
+# left below 100%. A photo mismatch never lowers it: dHash only recognizes the
+# same picture, not the same object photographed differently.
+IMAGE_WEIGHT = 0.30
+IMAGE_MAX_DISTANCE = 10
+PHOTO_HASH_MASK = (1 << 64) - 1
+
+def image_similarity(distances):
+    """Image score (0-1) for Hamming distances between photo hashes; -1 means no photo"""
+    distances = np.asarray(distances)
+    return np.where((distances >= 0) & (distances <= IMAGE_MAX_DISTANCE),
+                    1.0 - distances / (IMAGE_MAX_DISTANCE + 1), 0.0)
+
+def with_image_score(confidence, image_score):
+    """Raise a weighted_score confidence (0-1) by the image score (0-1)"""
+    return confidence + IMAGE_WEIGHT * image_score * (1.0 - confidence)
+
+def photo_hash_key(photo_hash):
+    """Stored (signed) photo hash as the unsigned 64-bit value the index compares, or None"""
+    return photo_hash & PHOTO_HASH_MASK if photo_hash is not None else None
+
 def calculate_location_score(location1, location2):
     """Calculate location similarity score"""
     if not location1 or not location2:
@@ -82,6 +124,283 @@ def calculate_category_score(category1, category2):
     
     return 0.0
 
+# Long-lived TF-IDF index shared by every matching call in this process
+_index = None
+_index_lock = threading.Lock()
+
+# Matching engine: 'exact' takes description candidates from the TF-IDF term
+# postings; 'lsh' (for very large corpora) from random-projection LSH buckets.
+# Either way candidates are scored exactly, so LSH only trades recall for speed:
+# more tables or probes raise recall, more bits make buckets smaller and faster.
+MATCH_ENGINE = os.environ.get('LOSTFOUND_MATCH_ENGINE', 'exact')
+LSH_TABLES = int(os.environ.get('LOSTFOUND_LSH_TABLES', 16))
+LSH_BITS = int(os.environ.get('LOSTFOUND_LSH_BITS', 12))
+LSH_PROBES = int(os.environ.get('LOSTFOUND_LSH_PROBES', 1))   # 1: also search buckets one bit away
+LSH_INDEX_PATH = os.environ.get('LOSTFOUND_LSH_INDEX', 'lsh_index.npz')   # '' keeps keys in memory only
+
+# Every refit saves the index here; new processes map it instead of refitting
+SNAPSHOT_PATH = os.environ.get('LOSTFOUND_MATCH_SNAPSHOT', 'match_index.snapshot')   # '' disables snapshots
+
+def _item_location(side, item):
+    """Location column used for scoring on each side"""
+    return item.get('location', '') if side == 'lost' else item.get('found_location', '')
+
+def category_key(category):
+    """Normalized category used for exact comparison, None when missing"""
+    return category.lower() if category else None
+
+def location_key(location):
+    """Cleaned location used for comparison, None when missing"""
+    return clean_text(location) if location else None
+
+def _blocking_keys(category, location):
+    """
+    Index keys under which items that can score on category or on an
+    exact location match are found (mirrors the scalar score functions)
+    """
+    keys = []
+    category_code = category_key(category)
+    location_code = location_key(location)
+    
+    if category_code is not None:
+        keys.append(('category', category_code))
+    if location_code is not None:
+        keys.append(('location', location_code))
+    if category_code is not None and location_code is not None:
+        keys.append(('category_location', category_code, location_code))
+    
+    return keys
+
+def _to_document(side, item):
+    """Convert an item row into an index document"""
+    category = item.get('category', '')
+    location = _item_location(side, item)
+    return {
+        'id': item['id'],
+        'text': create_feature_text(item),
+        'category_key': category_key(category),
+        'location_key': location_key(location),
+        'blocks': _blocking_keys(category, location),
+        'photo_hash': photo_hash_key(item.get('photo_hash'))
+    }
+
+def _load_documents(side):
+    """Load every active item of a side for a full index fit"""
+    return [_to_document(side, item) for item in db.iter_match_candidates(side)]
+
+def _load_item_ids(side):
+    """Active ids and highest id of a side, to reconcile a loaded snapshot with"""
+    return db.get_active_item_ids(side), db.get_max_item_ids()[side]
+
+def _new_index():
+    """An empty MatchIndex with the configured engine and snapshot settings"""
+    snapshot = dict(snapshot_path=SNAPSHOT_PATH or None, snapshot_source=db.get_index_source,
+                    load_item_ids=_load_item_ids)
+    if MATCH_ENGINE == 'lsh':
+        return MatchIndex(_load_documents, lsh_tables=LSH_TABLES, lsh_bits=LSH_BITS,
+                          lsh_probes=LSH_PROBES, lsh_path=LSH_INDEX_PATH or None, **snapshot)
+    return MatchIndex(_load_documents, **snapshot)
+
+def get_index():
+    """Return the process-wide match index, building it on first use"""
+    global _index
+    with _index_lock:
+        if _index is None:
+            index = _new_index()
+            # Map the snapshot another process saved; refit only without one
+            if not index.load_snapshot():
+                index.refit()
+            index.start_background_refit()
+            _index = index
+    return _index
+
+def save_index_snapshot():
+    """Fit a fresh index on the active items and save it to SNAPSHOT_PATH"""
+    index = _new_index()
+    index.refit()
+    return index
+
+def reset_index():
+    """Drop the process-wide index, e.g. after pointing db.DATABASE at another file"""
+    global _index
+    with _index_lock:
+        if _index is not None:
+            _index.stop_background_refit()
+        _index = None
+
+def sync_index(side):
+    """Append items of a side reported since the index last looked"""
+    index = get_index()
+    new_items = db.iter_match_candidates(side, index.high_water(side))
+    index.add_many(side, (_to_document(side, item) for item in new_items))
+    return index
+
+def remove_from_index(side, item_id):
+    """Stop matching against an item whose status left 'active'"""
+    if _index is not None:
+        _index.remove(side, item_id)
+
+def _candidate_blocks(category, location, threshold):
+    """
+    Decide where candidates that share no TF-IDF term with the query can
+    come from. Returns (blocks, full_scan).
+    
+    Without a shared term the description score is 0, so such a candidate
+    scores at most weighted_score(0, c, l) with c in {0, 1} and l one of
+    1.0 (exact location), 0.7 (one location contains the other) or <= 0.5
+    (shared location words). Exact locations and categories are indexed;
+    containment is not, so whenever a 0.7 location score could clear the
+    threshold we fall back to scanning the whole category (or everything).
+    """
+    if weighted_score(0.0, 0.0, 0.7) >= threshold:
+        return [], True
+    
+    blocks = []
+    for key in _blocking_keys(category, location):
+        if key[0] == 'location' and weighted_score(0.0, 0.0, 1.0) >= threshold:
+            blocks.append(key)
+        elif key[0] == 'category' and weighted_score(0.0, 1.0, 0.7) >= threshold:
+            blocks.append(key)
+        elif (key[0] == 'category_location'
+              and weighted_score(0.0, 1.0, 0.7) < threshold <= weighted_score(0.0, 1.0, 1.0)):
+            blocks.append(key)
+    
+    return blocks, False
+
+def category_scores(index, category, codes):
+    """Vectorized calculate_category_score against interned category codes"""
+    query_code = index.categories.lookup(category_key(category))
+    if query_code < 0:
+        return np.zeros(len(codes))
+    return (codes == query_code).astype(float)
+
+def location_scores(index, location, codes):
+    """
+    Vectorized calculate_location_score against interned location codes.
+    Each distinct candidate location is scored once and broadcast back.
+    """
+    return location_key_scores(index.locations, location_key(location), codes)
+
+def location_key_scores(table, query_location, codes):
+    """location_scores for an already normalized location key, given the location table"""
+    scores = np.zeros(len(codes))
+    known = codes >= 0
+    if query_location is None or not known.any():
+        return scores
+    
+    unique, inverse = np.unique(codes[known], return_inverse=True)
+    strings = np.array([table.strings[code] for code in unique], dtype=str)
+    
+    # Exact match, then partial match (one contains the other)
+    exact = strings == query_location
+    contained = ((np.char.find(strings, query_location) >= 0) |
+                 (np.char.find(query_location, strings) >= 0))
+    
+    # Jaccard similarity of the word sets
+    query_words = set(query_location.split())
+    query_word_codes = [table.word_codes[word] for word in query_words if word in table.word_codes]
+    owner, words, word_counts = table.words_of(unique)
+    common = np.bincount(owner, weights=np.isin(words, query_word_codes), minlength=len(unique))
+    union = len(query_words) + word_counts - common
+    jaccard = np.divide(common, union, out=np.zeros(len(unique)), where=common > 0)
+    
+    unique_scores = np.where(exact, 1.0, np.where(contained, 0.7, jaccard * 0.5))
+    scores[known] = unique_scores[inverse]
+    return scores
+
+def _top_n(ids, confidence_scores, top_n):
+    """
+    Positions of the top N scores, highest first, newest item first on ties.
+    Uses argpartition to find the cut-off instead of sorting every candidate.
+    """
+    if len(confidence_scores) > top_n:
+        cutoff = confidence_scores[np.argpartition(-confidence_scores, top_n - 1)[top_n - 1]]
+        positions = np.flatnonzero(confidence_scores >= cutoff)
+    else:
+        positions = np.arange(len(confidence_scores))
+    order = np.lexsort((-ids[positions], -confidence_scores[positions]))
+    return positions[order][:top_n]
+
+SCORE_CHUNK_SIZE = 8192   # candidates scored per vectorized step
+
+def score_item(query_item, query_side, top_n=3, threshold=0.40, max_candidate_id=None):
+    """
+    Score one item against the active items of the opposite side that can
+    still reach the threshold (optionally only those with an id up to
+    max_candidate_id). Returns (candidate_id, scores) tuples sorted by
+    confidence.
+    """
+    other_side = 'found' if query_side == 'lost' else 'lost'
+    with instrumentation.span('matcher.index_sync'):
+        index = sync_index(other_side)
+
+    query_category = query_item.get('category', '')
+    query_location = _item_location(query_side, query_item)
+
+    blocks, full_scan = _candidate_blocks(query_category, query_location, threshold)
+    with instrumentation.span('matcher.feature_text'):
+        query_text = create_feature_text(query_item)
+    with instrumentation.span('matcher.similarity'):
+        ids, category_codes, location_codes, description, photo_distances = index.search(
+            other_side, query_text, blocks=blocks, full_scan=full_scan,
+            photo_hash=photo_hash_key(query_item.get('photo_hash')),
+            max_photo_distance=IMAGE_MAX_DISTANCE
+        )
+    if photo_distances is None:
+        image = np.zeros(len(ids))
+    else:
+        image = image_similarity(photo_distances)
+    if max_candidate_id is not None:
+        keep = ids <= max_candidate_id
+        ids, category_codes = ids[keep], category_codes[keep]
+        location_codes, description, image = location_codes[keep], description[keep], image[keep]
+    if not len(ids) or top_n <= 0:
+        return []
+
+    with instrumentation.span('matcher.scoring'):
+        category = category_scores(index, query_category, category_codes)
+        
+        # Upper bound with a perfect location score; the confidence is
+        # monotonic, so candidates below it can never clear the threshold
+        possible = with_image_score(weighted_score(description, category, 1.0), image) >= threshold
+        ids, location_codes = ids[possible], location_codes[possible]
+        description, category, image = description[possible], category[possible], image[possible]
+        
+        # Score the rest a chunk at a time, keeping only the best top_n so far
+        # in a min-heap ordered like _top_n (confidence, then newest id)
+        best = []
+        for start in range(0, len(ids), SCORE_CHUNK_SIZE):
+            chunk = slice(start, start + SCORE_CHUNK_SIZE)
+            location = location_scores(index, query_location, location_codes[chunk])
+            confidence = with_image_score(
+                weighted_score(description[chunk], category[chunk], location), image[chunk])
+            
+            # Weighted final score; only keep matches above threshold
+            passed = np.flatnonzero(confidence >= threshold)
+            for idx in passed[_top_n(ids[chunk][passed], confidence[passed], top_n)]:
+                entry = (float(confidence[idx]), int(ids[start + idx]),
+                         float(description[start + idx]), float(category[start + idx]),
+                         float(location[idx]), float(image[start + idx]))
+                if len(best) < top_n:
+                    heapq.heappush(best, entry)
+                elif entry[:2] > best[0][:2]:
+                    heapq.heapreplace(best, entry)
+    
+    with instrumentation.span('matcher.sort'):
+        best.sort(reverse=True)
+    
+    matches = []
+    for confidence, candidate_id, description, category, location, image in best:
+        matches.append((candidate_id, {
+            'confidence_score': confidence * 100,  # Convert to percentage
+            'description_score': description * 100,
+            'category_score': category * 100,
+            'location_score': location * 100,
+            'image_score': image * 100
+        }))
+    
+    return matches
+
 def find_matches_for_lost_item(lost_item_id, top_n=3, threshold=0.40):
     """
     Find matching found items for a lost item using AI
@@ -92,79 +411,13 @@ def find_matches_for_lost_item(lost_item_id, top_n=3, threshold=0.40):
     if not lost_item:
         return []
     
-    # Get all found items
-    found_items = db.get_all_found_items()
-    if not found_items:
-        return []
-    
-    # Create feature text for lost item
-    lost_text = create_feature_text(lost_item)
-    
-    # Create feature texts for all found items
-    found_texts = [create_feature_text(item) for item in found_items]
-    
-    # Combine all texts for TF-IDF
-    all_texts = [lost_text] + found_texts
-    
-    # Create TF-IDF vectors
-    vectorizer = TfidfVectorizer(
-        max_features=100,
-        ngram_range=(1, 2),  # Use unigrams and bigrams
-        min_df=1
-    )
-    
-    try:
-        tfidf_matrix = vectorizer.fit_transform(all_texts)
-    except:
-        # If TF-IDF fails, return empty results
-        return []
-    
-    # Calculate cosine similarity
-    lost_vector = tfidf_matrix[0:1]
-    found_vectors = tfidf_matrix[1:]
-    
-    similarities = cosine_similarity(lost_vector, found_vectors)[0]
-    
-    # Calculate comprehensive scores
     matches = []
-    for idx, found_item in enumerate(found_items):
-        description_score = float(similarities[idx])
-        
-        # Calculate location score
-        location_score = calculate_location_score(
-            lost_item.get('location', ''),
-            found_item.get('found_location', '')
-        )
-        
-        # Calculate category score
-        category_score = calculate_category_score(
-            lost_item.get('category', ''),
-            found_item.get('category', '')
-        )
-        
-        # Weighted final score
-        # Description: 60%, Category: 25%, Location: 15%
-        confidence_score = (
-            description_score * 0.60 +
-            category_score * 0.25 +
-            location_score * 0.15
-        )
-        
-        # Only include matches above threshold
-        if confidence_score >= threshold:
-            matches.append({
-                'found_item_id': found_item['id'],
-                'confidence_score': confidence_score * 100,  # Convert to percentage
-                'description_score': description_score * 100,
-                'category_score': category_score * 100,
-                'location_score': location_score * 100,
-                'found_item': found_item
-            })
-    
-    # Sort by confidence score and return top N
-    matches.sort(key=lambda x: x['confidence_score'], reverse=True)
-    
-    return matches[:top_n]
+    for found_item_id, scores in score_item(lost_item, 'lost', top_n, threshold):
+        found_item = db.get_found_item(found_item_id)
+        if found_item:
+            matches.append(dict(scores, found_item_id=found_item_id, found_item=found_item))
+    
+    return matches
 
 def find_matches_for_found_item(found_item_id, top_n=3, threshold=0.40):
     """
@@ -176,84 +429,237 @@ def find_matches_for_found_item(found_item_id, top_n=3, threshold=0.40):
     if not found_item:
         return []
     
-    # Get all lost items
-    lost_items = db.get_all_lost_items()
-    if not lost_items:
-        return []
-    
-    # Create feature text for found item
-    found_text = create_feature_text(found_item)
-    
-    # Create feature texts for all lost items
-    lost_texts = [create_feature_text(item) for item in lost_items]
-    
-    # Combine all texts for TF-IDF
-    all_texts = [found_text] + lost_texts
-    
-    # Create TF-IDF vectors
-    vectorizer = TfidfVectorizer(
-        max_features=100,
-        ngram_range=(1, 2),
-        min_df=1
-    )
-    
-    try:
-        tfidf_matrix = vectorizer.fit_transform(all_texts)
-    except:
-        return []
-    
-    # Calculate cosine similarity
-    found_vector = tfidf_matrix[0:1]
-    lost_vectors = tfidf_matrix[1:]
+    matches = []
+    for lost_item_id, scores in score_item(found_item, 'found', top_n, threshold):
+        lost_item = db.get_lost_item(lost_item_id)
+        if lost_item:
+            matches.append(dict(scores, lost_item_id=lost_item_id, lost_item=lost_item))
     
-    similarities = cosine_similarity(found_vector, lost_vectors)[0]
+    return matches
+
+# All-pairs batch matching (nightly re-scoring)
+BATCH_BLOCK_CELLS = 2_000_000   # lost x found scores held in memory per block
+
+_batch = None   # arrays shared by every block of the current batch run
+
+def _batch_arrays(index, top_n, threshold, existing_pairs, lost_start=0, found_start=0):
+    """
+    Matrices and code arrays of a freshly fitted index, as used by
+    _score_batch_block, for the found rows from found_start on (lost rows
+    before lost_start are not scored). existing_pairs are the
+    (lost_item_id, found_item_id) pairs that already have a match row, to
+    be re-scored as well.
+    """
+    lost, found = index.sides['lost'], index.sides['found']
+    if index.vectorizer is not None:
+        lost_matrix, found_matrix = lost.main, found.main[found_start:]
+    else:
+        # No usable tokens: every description score is 0
+        lost_matrix = sparse.csr_matrix((len(lost.ids), 1))
+        found_matrix = sparse.csr_matrix((len(found.ids) - found_start, 1))
+    
+    # Distinct found locations, so blocks score each one once per lost location
+    found_locations, found_location_rows = np.unique(found.location_codes[found_start:],
+                                                     return_inverse=True)
+    
+    # Rows of the existing pairs whose items are both still active, by lost row
+    lost_ids = np.array(lost.ids, dtype=np.int64)
+    found_ids = np.array(found.ids[found_start:], dtype=np.int64)
+    pairs = np.array(sorted(existing_pairs), dtype=np.int64).reshape(-1, 2)
+    pair_lost_rows = np.searchsorted(lost_ids, pairs[:, 0])
+    pair_found_rows = np.searchsorted(found_ids, pairs[:, 1])
+    indexed = ((pair_lost_rows < len(lost_ids)) & (pair_found_rows < len(found_ids)))
+    indexed[indexed] = ((lost_ids[pair_lost_rows[indexed]] == pairs[indexed, 0]) &
+                        (found_ids[pair_found_rows[indexed]] == pairs[indexed, 1]))
+    indexed[indexed] = (lost.alive[pair_lost_rows[indexed]] &
+                        found.alive[found_start + pair_found_rows[indexed]])
+    
+    # Image scores of the lost x found pairs whose photos are near-identical
+    pairs_lost, pairs_found, pair_distances = [], [], []
+    for row in lost_start + np.flatnonzero(lost.has_photo[lost_start:]):
+        found_rows, distances = found.photo_hits(int(lost.photo_hashes[row]), IMAGE_MAX_DISTANCE)
+        keep = found_rows >= found_start
+        pairs_lost.extend([row] * int(keep.sum()))
+        pairs_found.extend(found_rows[keep] - found_start)
+        pair_distances.extend(distances[keep])
+    image_matrix = sparse.csr_matrix(
+        (image_similarity(np.array(pair_distances, dtype=np.int64)), (pairs_lost, pairs_found)),
+        shape=(len(lost_ids), len(found_ids)))
     
-    # Calculate comprehensive scores
-    matches = []
-    for idx, lost_item in enumerate(lost_items):
-        description_score = float(similarities[idx])
-        
-        # Calculate location score
-        location_score = calculate_location_score(
-            found_item.get('found_location', ''),
-            lost_item.get('location', '')
-        )
-        
-        # Calculate category score
-        category_score = calculate_category_score(
-            found_item.get('category', ''),
-            lost_item.get('category', '')
-        )
+    return {
+        'top_n': top_n,
+        'threshold': threshold,
+        'lost_ids': lost_ids,
+        'lost_matrix': lost_matrix,
+        'lost_categories': lost.category_codes,
+        'lost_locations': lost.location_codes,
+        'found_ids': found_ids,
+        'found_matrix_t': found_matrix.T.tocsr(),
+        'found_categories': found.category_codes[found_start:],
+        'found_locations': found_locations,
+        'found_location_rows': found_location_rows,
+        'locations': index.locations,
+        'image_matrix': image_matrix,
+        'pair_lost_rows': pair_lost_rows[indexed],
+        'pair_found_rows': pair_found_rows[indexed]
+    }
+
+def _init_batch_worker(batch):
+    global _batch
+    _batch = batch
+
+def _score_batch_block(bounds):
+    """
+    Score lost rows [start, stop) against every found item at once and
+    return the top N match tuples per lost item, as score_item would, plus
+    the fresh scores of the block's existing pairs
+    """
+    start, stop = bounds
+    batch = _batch
+    found_ids = batch['found_ids']
+    
+    description = (batch['lost_matrix'][start:stop] @ batch['found_matrix_t']).toarray()
+    categories = batch['lost_categories'][start:stop, None]
+    category = (categories == batch['found_categories'][None, :]) & (categories >= 0)
+    
+    # Location scores of the distinct lost locations in this block against
+    # the distinct found locations, looked up per pair
+    found_locations = batch['found_locations']
+    lost_locations, lost_location_rows = np.unique(batch['lost_locations'][start:stop],
+                                                   return_inverse=True)
+    location_table = np.zeros((len(lost_locations), len(found_locations)))
+    for row, code in enumerate(lost_locations):
+        if code >= 0:
+            location_table[row] = location_key_scores(batch['locations'],
+                                                      batch['locations'].strings[code],
+                                                      found_locations)
+    location = location_table[lost_location_rows][:, batch['found_location_rows']]
+    image = batch['image_matrix'][start:stop].toarray()
+    confidence = with_image_score(weighted_score(description, category, location), image)
+    
+    cells = set()
+    for row in np.flatnonzero((confidence >= batch['threshold']).any(axis=1)):
+        passed = np.flatnonzero(confidence[row] >= batch['threshold'])
+        for idx in passed[_top_n(found_ids[passed], confidence[row, passed], batch['top_n'])]:
+            cells.add((row, idx))
+    
+    # Existing pairs are re-scored even when they fall out of the top N
+    first, last = np.searchsorted(batch['pair_lost_rows'], [start, stop])
+    cells.update(zip(batch['pair_lost_rows'][first:last] - start,
+                     batch['pair_found_rows'][first:last]))
+    
+    return [(int(batch['lost_ids'][start + row]), int(found_ids[idx]),
+             float(confidence[row, idx]) * 100,
+             float(category[row, idx]) * 100,
+             float(location[row, idx]) * 100,
+             float(description[row, idx]) * 100,
+             float(image[row, idx]) * 100)
+            for row, idx in sorted(cells)]
+
+def best_new_matches(matches, top_n):
+    """
+    The match tuples for pairs not matched yet that make a lost item's
+    top_n when ranked together with the matches it already has (so an item
+    that already has its best top_n matches gets no weaker ones)
+    """
+    existing = db.get_matched_pairs({match[0] for match in matches})
+    
+    per_lost_item = {}
+    for (lost_item_id, found_item_id), confidence_score in existing.items():
+        per_lost_item.setdefault(lost_item_id, []).append((confidence_score, None))
+    for match in matches:
+        if (match[0], match[1]) not in existing:
+            per_lost_item.setdefault(match[0], []).append((match[2], match))
+    
+    best = []
+    for candidates in per_lost_item.values():
+        candidates.sort(key=lambda candidate: candidate[0], reverse=True)
+        best.extend(match for _, match in candidates[:top_n] if match is not None)
+    return best
+
+def run_batch_matching(top_n=3, threshold=0.40, processes=1, block_cells=BATCH_BLOCK_CELLS,
+                       progress=None, after=None):
+    """
+    Re-score every active lost item against every active found item.
+    
+    Both sides are vectorized once with a fresh fit, and lost rows are
+    scored a block at a time (about block_cells pairs) with one sparse
+    product per block, optionally spread over `processes` processes. The
+    top N matches per lost item are written to the matches table: every
+    existing pair of active items gets its scores refreshed (in the top N
+    or not), new pairs are inserted. progress, if given, is called with the
+    number of lost items scored so far.
+    
+    With after ({'lost': id, 'found': id}, e.g. the highest ids before an
+    import) only lost items with a higher id are scored, against found
+    items with a higher id. Existing pairs are then left alone and new
+    pairs are only added where they make a lost item's top N together with
+    the matches it already has (see best_new_matches).
+    """
+    started = time.perf_counter()
+    index = MatchIndex(_load_documents)
+    index.refit()
+    lost_ids, found_ids = index.sides['lost'].ids, index.sides['found'].ids
+    if after is None:
+        lost_start = found_start = 0
+        existing_pairs = db.get_matched_pairs(lost_ids.tolist())
+    else:
+        lost_start = int(np.searchsorted(lost_ids, after['lost'], side='right'))
+        found_start = int(np.searchsorted(found_ids, after['found'], side='right'))
+        existing_pairs = {}
+    batch = _batch_arrays(index, top_n, threshold, existing_pairs, lost_start, found_start)
+    lost_count, found_count = len(batch['lost_ids']), len(batch['found_ids'])
+    
+    summary = {
+        'lost_items': lost_count - lost_start,
+        'found_items': found_count,
+        'matches_written': 0,
+        'matches_added': 0
+    }
+    if lost_count > lost_start and found_count and top_n > 0:
+        block_rows = max(1, block_cells // found_count)
+        bounds = [(start, min(start + block_rows, lost_count))
+                  for start in range(lost_start, lost_count, block_rows)]
         
-        # Weighted final score
-        confidence_score = (
-            description_score * 0.60 +
-            category_score * 0.25 +
-            location_score * 0.15
-        )
+        pool = None
+        if processes > 1 and len(bounds) > 1:
+            pool = multiprocessing.Pool(processes, initializer=_init_batch_worker,
+                                        initargs=(batch,))
+            blocks = pool.imap(_score_batch_block, bounds)
+        else:
+            _init_batch_worker(batch)
+            blocks = map(_score_batch_block, bounds)
         
-        # Only include matches above threshold
-        if confidence_score >= threshold:
-            matches.append({
-                'lost_item_id': lost_item['id'],
-                'confidence_score': confidence_score * 100,
-                'description_score': description_score * 100,
-                'category_score': category_score * 100,
-                'location_score': location_score * 100,
-                'lost_item': lost_item
-            })
-    
-    # Sort by confidence score and return top N
-    matches.sort(key=lambda x: x['confidence_score'], reverse=True)
-    
-    return matches[:top_n]
-
-def explain_match(confidence_score, category_score, location_score, description_score):
+        try:
+            for (_, stop), matches in zip(bounds, blocks):
+                if matches and after is not None:
+                    matches = best_new_matches(matches, top_n)
+                if matches:
+                    summary['matches_added'] += db.upsert_match_scores(matches)
+                    summary['matches_written'] += len(matches)
+                if progress:
+                    progress(stop - lost_start)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+            _init_batch_worker(None)
+    
+    summary['seconds'] = time.perf_counter() - started
+    return summary
+
+def explain_match(confidence_score, category_score, location_score, description_score,
+                  image_score=None):
     """
     Generate human-readable explanation for a match
     """
     explanations = []
     
+    if image_score is not None and image_score >= 80:
+        explanations.append("✓ Same photo or a near-identical one")
+    elif image_score is not None and image_score > 0:
+        explanations.append("~ Very similar photo")
+    
     if category_score >= 100:
         explanations.append("✓ Exact category match")
     elif category_score > 0:
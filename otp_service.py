@@ -46,4 +46,18 @@ def send_match_notification(phone_number, item_name, match_count):
     """
     message = f"Good news! We found {match_count} potential matches for your {item_name}. Check Lost&Found AI now!"
     print(f"[NOTIFICATION] To {phone_number}: {message}")
-    return True
\ No newline at end of file
+    return True
+
+def send_match_notifications(notifications):
+    """
+    Send a batch of match notifications
+    Each notification is a dict with contact_phone, item_name and match_count
+    For production: Hand the whole batch to the SMS/Email provider's bulk API
+    """
+    for notification in notifications:
+        send_match_notification(
+            notification['contact_phone'],
+            notification['item_name'],
+            notification['match_count']
+        )
+    return len(notifications)
@@ -0,0 +1,97 @@
+"""
+Incremental re-match engine.
+
+Each run scores only pairs involving items reported since the previous run
+(new lost items against all found items, new found items against the lost
+items that already existed), adds the pairs that are not matched yet, and
+notifies lost item owners about every match created since the last run in
+one batch. Progress is tracked as id high-water marks in `rematch_state`;
+concurrent runs are safe because only the run that advances the marks
+commits its matches.
+"""
+import database as db
+import matcher
+import otp_service
+
+REMATCH_TOP_N = 3            # matches a lost item ends up with, counting existing ones
+REMATCH_MAX_PER_ITEM = 50    # candidates scored per new item
+
+def _collect_pairs(state, limits, threshold, progress=None):
+    """
+    Score new-vs-existing pairs; returns {(lost_item_id, found_item_id): scores}.
+    progress, if given, is called with the number of items scored so far.
+    """
+    pairs = {}
+    scored = 0
+
+    # New lost items against every found item up to this run's limit
+    for lost_item in db.iter_match_candidates('lost', state['lost'], limits['lost']):
+        for found_item_id, scores in matcher.score_item(
+                lost_item, 'lost', REMATCH_MAX_PER_ITEM, threshold,
+                max_candidate_id=limits['found']):
+            pairs[(lost_item['id'], found_item_id)] = scores
+        scored += 1
+        if progress:
+            progress(scored)
+
+    # New found items against lost items from before this run
+    for found_item in db.iter_match_candidates('found', state['found'], limits['found']):
+        for lost_item_id, scores in matcher.score_item(
+                found_item, 'found', REMATCH_MAX_PER_ITEM, threshold,
+                max_candidate_id=state['lost']):
+            pairs.setdefault((lost_item_id, found_item['id']), scores)
+        scored += 1
+        if progress:
+            progress(scored)
+
+    return pairs
+
+def _best_new_pairs(pairs, top_n):
+    """
+    Match rows for the new pairs that make a lost item's top_n when ranked
+    together with the matches it already has (see matcher.best_new_matches)
+    """
+    rows = [(lost_item_id, found_item_id, scores['confidence_score'],
+             scores['category_score'], scores['location_score'],
+             scores['description_score'], scores['image_score'])
+            for (lost_item_id, found_item_id), scores in pairs.items()]
+    return matcher.best_new_matches(rows, top_n)
+
+class RematchConflict(Exception):
+    """Another re-match run advanced the high-water marks first"""
+
+def run_rematch(top_n=REMATCH_TOP_N, threshold=0.40, notify=True, progress=None):
+    """
+    Run one incremental re-match pass.
+    Returns a summary dict, or None if a concurrent run got there first.
+    """
+    state = db.get_rematch_state()
+    limits = db.get_max_item_ids()
+
+    rows = _best_new_pairs(_collect_pairs(state, limits, threshold, progress), top_n)
+
+    try:
+        with db.transaction():
+            # Claim the item range first; this also takes the write lock
+            if not db.advance_rematch_state(state, {'lost': limits['lost'],
+                                                    'found': limits['found']}):
+                raise RematchConflict()
+
+            added = db.insert_matches_bulk(rows, skip_existing=True)
+
+            up_to_match_id = db.get_max_item_ids()['matches']
+            if not db.advance_rematch_state(state, {'matches': up_to_match_id}):
+                raise RematchConflict()
+            notifications = db.get_match_notifications(state['matches'], up_to_match_id)
+    except RematchConflict:
+        return None
+
+    if notify and notifications:
+        otp_service.send_match_notifications(notifications)
+
+    return {
+        'new_lost_items': limits['lost'] - state['lost'],
+        'new_found_items': limits['found'] - state['found'],
+        'matches_added': added,
+        'notifications_sent': len(notifications) if notify else 0
+    }
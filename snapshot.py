@@ -0,0 +1,123 @@
+"""
+Versioned snapshot files of named numpy arrays, memory-mapped read-only.
+
+Layout: 8-byte magic, 8-byte little-endian header length, a JSON header
+(format version, caller metadata, and dtype/shape/offset of every array),
+then each array's raw bytes aligned to 64 bytes. Readers map the whole file
+once and get zero-copy views, so every process reading the same snapshot
+shares its pages through the page cache and opening it costs about the same
+whatever its size.
+
+Snapshots are replaced atomically (written to a temporary file in the same
+directory, then renamed over the old one): processes that already mapped
+the old file keep a valid mapping, new readers see the new one.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+MAGIC = b'LFSNAP\x00\x01'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+
+class SnapshotError(Exception):
+    """The file is not a snapshot this code can read"""
+
+def write_snapshot(path, arrays, metadata=None):
+    """Atomically write {name: array} and JSON-serializable metadata to path"""
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    entries = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset = -(-offset // ALIGNMENT) * ALIGNMENT
+        entries[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += array.nbytes
+    header = json.dumps({'format': FORMAT_VERSION, 'metadata': metadata or {},
+                         'arrays': entries}).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(header)) // ALIGNMENT) * ALIGNMENT
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for name, array in arrays.items():
+                f.seek(data_start + entries[name]['offset'])
+                f.write(array.data)
+            f.truncate(data_start + offset)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)   # mkstemp creates it private to this user
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_snapshot(path):
+    """Map a snapshot read-only; returns (metadata, {name: read-only array view})"""
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise SnapshotError(f'{path} is not a snapshot')
+        header_length = int.from_bytes(f.read(8), 'little')
+        try:
+            header = json.loads(f.read(header_length))
+        except ValueError as exc:
+            raise SnapshotError(f'{path} has a corrupt header') from exc
+    if header.get('format') != FORMAT_VERSION:
+        raise SnapshotError(f"{path} has snapshot format {header.get('format')}, "
+                            f"expected {FORMAT_VERSION}")
+
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    buffer = np.memmap(path, dtype=np.uint8, mode='r')
+    arrays = {}
+    for name, entry in header['arrays'].items():
+        dtype = np.dtype(entry['dtype'])
+        count = int(np.prod(entry['shape'], dtype=np.int64))
+        start = data_start + entry['offset']
+        if start + count * dtype.itemsize > len(buffer):
+            raise SnapshotError(f'{path} is truncated')
+        arrays[name] = buffer[start:start + count * dtype.itemsize].view(dtype).reshape(entry['shape'])
+    return header['metadata'], arrays
+
+def file_id(path):
+    """Identity of the file currently at path (changes when a snapshot is swapped), or None"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+# Strings are stored as one UTF-8 blob plus offsets
+def pack_strings(strings):
+    """(blob, offsets) arrays holding a sequence of strings"""
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(item) for item in encoded], out=offsets[1:])
+    return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+class PackedStrings:
+    """Read-only sequence view of strings packed by pack_strings"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, position):
+        if not 0 <= position < len(self):
+            raise IndexError(position)
+        return self.blob[self.offsets[position]:self.offsets[position + 1]].tobytes().decode()
+
+    def __iter__(self):
+        blob = self.blob.tobytes()
+        offsets = self.offsets.tolist()
+        for start, stop in zip(offsets, offsets[1:]):
+            yield blob[start:stop].decode()
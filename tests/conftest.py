@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database as db
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """A fresh, fully migrated database in a temporary directory"""
+    monkeypatch.setattr(db, 'DATABASE', str(tmp_path / 'lostandfound.db'))
+    db.init_db()
+    yield db
+    db.get_pool().close_all()
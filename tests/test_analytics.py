@@ -0,0 +1,30 @@
+import analytics
+
+
+def test_bucket_quantile_of_one_sample_is_that_sample():
+    buckets = [(1, 12, 12)]
+
+    assert analytics._bucket_quantile(buckets, 1, 0.5) == 12
+    assert analytics._bucket_quantile(buckets, 1, 0.9) == 12
+
+
+def test_short_recovery_reports_short_quantiles(database):
+    lost_item_id = database.insert_lost_item(
+        'Wallet', 'wallet', 'black leather wallet', 'black', 'Library', '2025-05-01',
+        'n', '555', None, None)
+    database.insert_found_item(
+        'Wallet', 'wallet', 'black leather wallet', 'black', 'Library', '2025-05-01',
+        'desk', 'm', '777', None)
+    database.insert_matches_bulk([(lost_item_id, 1, 90.0, 100.0, 100.0, 80.0)])
+    conn = database.get_db_connection()
+    conn.execute("UPDATE lost_items SET created_at = DATETIME('now', '-12 seconds')")
+    conn.commit()
+    conn.close()
+
+    database.update_match_status(1, 'recovered')
+    recovery = analytics.get_average_recovery_time.uncached()
+
+    assert recovery['count'] == 1
+    assert recovery['hours'] == 0.0
+    assert recovery['median_hours'] == 0.0
+    assert recovery['p90_hours'] == 0.0
@@ -0,0 +1,25 @@
+import json
+
+import importer
+
+
+def found_record(name):
+    return {'category': 'Wallet', 'item_name': name, 'description': 'black leather wallet',
+            'found_location': 'Library', 'found_date': '2025-05-02',
+            'current_location': 'desk', 'contact_name': 'm', 'contact_phone': '777'}
+
+
+def test_malformed_jsonl_line_is_skipped(database, tmp_path, capsys):
+    path = tmp_path / 'found.jsonl'
+    path.write_text('\n'.join([
+        json.dumps(found_record('first')),
+        '{"category": "Wallet", item_name: "broken"}',
+        json.dumps(found_record('second')),
+    ]) + '\n', encoding='utf-8')
+
+    result = importer.import_items('found', importer.read_records(str(path)))
+
+    assert result['imported'] == 2
+    assert result['skipped'] == 1
+    assert f'{path}:2:' in capsys.readouterr().out
+    assert database.get_max_item_ids()['found'] == 2
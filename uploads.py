@@ -0,0 +1,191 @@
+"""
+Photo uploads: content-addressed storage and resized variants.
+
+Uploaded files are streamed to disk while the request body is parsed and
+hashed on the way, then stored once under their SHA-256:
+
+    static/uploads/ab/ab12...ef.jpg          original (photo_path 'uploads/ab/ab12...ef.jpg')
+    static/uploads/ab/ab12...ef_320.webp     variants, made by a background job
+    static/uploads/ab/ab12...ef_320.jpg
+
+The same photo reported twice is stored once. Pages link to /media/<photo_path>,
+which serves the best variant the browser accepts with long-lived cache
+headers and falls back to the original while variants are still pending.
+Each photo also gets a perceptual hash (photo_hash) the matcher compares.
+Variants and hashes need Pillow; without it only originals are served.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import Request
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+UPLOAD_DIR = 'uploads'                      # under STATIC_FOLDER, as in photo_path
+INCOMING_DIR = os.path.join(STATIC_FOLDER, UPLOAD_DIR, '.incoming')
+CHUNK_SIZE = 64 * 1024
+
+# Variant widths in pixels, and the formats each width is stored in
+VARIANT_SIZES = {'thumb': 320, 'medium': 800}
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+VARIANT_QUALITY = 80
+
+PHOTO_HASH_BITS = 64        # dHash over an 8x8 grid of horizontal gradients
+
+class HashingFile:
+    """
+    Upload spool file in INCOMING_DIR that hashes everything written to it,
+    so storing the upload is a rename instead of a second copy
+    """
+
+    def __init__(self):
+        os.makedirs(INCOMING_DIR, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=INCOMING_DIR, suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._hash = hashlib.sha256()
+        self.stored = False
+
+    def write(self, data):
+        self._hash.update(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._hash.hexdigest()
+
+    def close(self):
+        self._file.close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+class UploadRequest(Request):
+    """Request whose file uploads are streamed to HashingFile spools instead of memory"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None,
+                         content_length=None):
+        return HashingFile()
+
+def _content_path(digest, suffix):
+    """photo_path of a stored file, e.g. uploads/ab/ab12...ef.jpg"""
+    return f'{UPLOAD_DIR}/{digest[:2]}/{digest}{suffix}'
+
+def _extension(filename):
+    extension = filename.rsplit('.', 1)[1].lower()
+    return 'jpg' if extension == 'jpeg' else extension
+
+def store_upload(file):
+    """
+    Store an uploaded FileStorage under its content hash; returns its photo_path.
+    Uploads that were not spooled by UploadRequest are copied in chunks.
+    """
+    stream = file.stream
+    if not isinstance(stream, HashingFile):
+        spool = HashingFile()
+        stream.seek(0)
+        while True:
+            chunk = stream.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            spool.write(chunk)
+        stream = spool
+    stream.flush()
+
+    photo_path = _content_path(stream.hexdigest(), '.' + _extension(file.filename))
+    destination = os.path.join(STATIC_FOLDER, photo_path)
+    if not os.path.exists(destination):
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(stream.path, destination)
+        stream.stored = True
+    stream.close()
+    return photo_path
+
+def photo_hash(photo_path):
+    """
+    64-bit difference hash (dHash) of a stored photo, as the signed integer
+    SQLite stores; None without Pillow or for unreadable files. JPEGs are
+    decoded at a reduced size (draft mode), so hashing takes a few
+    milliseconds even for large photos.
+    """
+    if Image is None or not photo_path:
+        return None
+    try:
+        with Image.open(os.path.join(STATIC_FOLDER, photo_path)) as image:
+            image.draft('L', (64, 64))
+            small = ImageOps.exif_transpose(image).convert('L').resize((9, 8), Image.LANCZOS)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+    pixels = small.tobytes()
+    value = 0
+    for y in range(8):
+        for x in range(8):
+            value = (value << 1) | (pixels[y * 9 + x] > pixels[y * 9 + x + 1])
+    return value - (1 << PHOTO_HASH_BITS) if value >= 1 << (PHOTO_HASH_BITS - 1) else value
+
+def variant_path(photo_path, size, extension):
+    """photo_path of a resized variant of a content-addressed photo"""
+    stem = os.path.splitext(photo_path)[0]
+    return f'{stem}_{VARIANT_SIZES[size]}.{extension}'
+
+def is_content_addressed(photo_path):
+    """Whether photo_path was stored by store_upload (older uploads keep their own names)"""
+    parts = photo_path.split('/')
+    return (len(parts) == 3 and parts[0] == UPLOAD_DIR
+            and len(os.path.splitext(parts[2])[0]) == 64)
+
+def make_variants(photo_path):
+    """
+    Write every missing resized variant of a stored photo; returns the
+    photo_paths written. Variants are derived from the content hash, so
+    a photo shared by several reports is resized once.
+    """
+    if Image is None or not photo_path or not is_content_addressed(photo_path):
+        return []
+    source = os.path.join(STATIC_FOLDER, photo_path)
+    if not os.path.exists(source):
+        return []
+
+    written = []
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        for size, width in VARIANT_SIZES.items():
+            resized = None
+            for extension, pil_format in VARIANT_FORMATS.items():
+                path = variant_path(photo_path, size, extension)
+                destination = os.path.join(STATIC_FOLDER, path)
+                if os.path.exists(destination):
+                    continue
+                if resized is None:
+                    resized = image.copy()
+                    resized.thumbnail((width, width * 4))
+                # Write then rename, so the media route never serves a partial file
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.part')
+                with os.fdopen(fd, 'wb') as f:
+                    resized.save(f, pil_format, quality=VARIANT_QUALITY)
+                os.replace(tmp_path, destination)
+                written.append(path)
+    return written
+
+def best_variant(photo_path, size, accept_webp):
+    """
+    photo_path to serve for a requested size: the WebP or JPEG variant when
+    it exists, otherwise the original. Returns (photo_path, is_variant).
+    """
+    if size in VARIANT_SIZES and is_content_addressed(photo_path):
+        for extension in (('webp', 'jpg') if accept_webp else ('jpg',)):
+            path = variant_path(photo_path, size, extension)
+            if os.path.exists(os.path.join(STATIC_FOLDER, path)):
+                return path, True
+    return photo_path, False
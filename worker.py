@@ -0,0 +1,169 @@
+"""
+Background matching worker.
+
+Report handlers only store the item and queue a job for it; workers take
+jobs from the SQLite-backed `jobs` table, run the matcher and store the
+matches, or resize uploaded photos. Workers run as threads inside the web
+process (MATCH_WORKERS) or as separate processes so scoring scales across
+cores:
+
+    python worker.py --processes 4
+
+The matcher (numpy, scipy) is imported by the first matching job, so the
+web app can import this module without loading it.
+"""
+import argparse
+import multiprocessing
+import threading
+import time
+import traceback
+
+import database as db
+import uploads
+
+POLL_INTERVAL = 0.5     # seconds to wait when the queue is empty
+JOB_TIMEOUT = 600       # running jobs older than this are assumed lost and requeued
+REMATCH_INTERVAL = 300  # seconds between incremental re-match runs
+
+def run_match_lost(lost_item_id):
+    """Match a newly reported lost item against found items"""
+    import matcher
+    matches = matcher.find_matches_for_lost_item(lost_item_id)
+    # Both sides of a pair can be matched by separate jobs (a found item's job may
+    # run after the lost item it matches was reported), so existing pairs are skipped
+    db.insert_matches_bulk([
+        (lost_item_id, match['found_item_id'], match['confidence_score'],
+         match['category_score'], match['location_score'], match['description_score'],
+         match.get('image_score'))
+        for match in matches
+    ], skip_existing=True)
+
+def run_match_found(found_item_id):
+    """Match a newly reported found item against lost items"""
+    import matcher
+    matches = matcher.find_matches_for_found_item(found_item_id)
+    # Skips pairs the lost item's own job already stored
+    db.insert_matches_bulk([
+        (match['lost_item_id'], found_item_id, match['confidence_score'],
+         match['category_score'], match['location_score'], match['description_score'],
+         match.get('image_score'))
+        for match in matches
+    ], skip_existing=True)
+
+def run_photo_variants_lost(lost_item_id):
+    """Make the thumbnails of a lost item's photo"""
+    item = db.get_lost_item(lost_item_id)
+    if item:
+        uploads.make_variants(item['photo_path'])
+
+def run_photo_variants_found(found_item_id):
+    """Make the thumbnails of a found item's photo"""
+    item = db.get_found_item(found_item_id)
+    if item:
+        uploads.make_variants(item['photo_path'])
+
+JOB_HANDLERS = {
+    'match_lost': run_match_lost,
+    'match_found': run_match_found,
+    'photo_variants_lost': run_photo_variants_lost,
+    'photo_variants_found': run_photo_variants_found,
+}
+
+def run_job(job):
+    """Run one claimed job; its results and completion commit together"""
+    try:
+        with db.transaction():
+            JOB_HANDLERS[job['kind']](job['item_id'])
+            db.complete_job(job['id'])
+    except Exception:
+        db.fail_job(job['id'], traceback.format_exc())
+        print(f"[Worker] Job {job['id']} ({job['kind']} {job['item_id']}) failed")
+
+def work(stop_event, poll_interval=POLL_INTERVAL):
+    """Process jobs until stop_event is set"""
+    while not stop_event.is_set():
+        job = db.claim_job()
+        if job is None:
+            db.requeue_stale_jobs(JOB_TIMEOUT)
+            stop_event.wait(poll_interval)
+            continue
+        run_job(job)
+
+def start_in_process_workers(count):
+    """Start `count` daemon worker threads; returns the event that stops them"""
+    stop_event = threading.Event()
+    for number in range(count):
+        thread = threading.Thread(target=work, args=(stop_event,),
+                                  name=f'match-worker-{number}', daemon=True)
+        thread.start()
+    return stop_event
+
+def run_rematch_periodically(stop_event, interval=REMATCH_INTERVAL):
+    """Run an incremental re-match every `interval` seconds until stop_event is set"""
+    import rematch
+    while not stop_event.wait(interval):
+        try:
+            summary = rematch.run_rematch()
+        except Exception:
+            traceback.print_exc()
+            continue
+        if summary and summary['matches_added']:
+            print(f"[Rematch] Added {summary['matches_added']} matches, "
+                  f"sent {summary['notifications_sent']} notifications")
+
+def start_rematch_scheduler(interval):
+    """Start the re-match daemon thread; returns the event that stops it"""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_rematch_periodically, args=(stop_event, interval),
+                              name='rematch-scheduler', daemon=True)
+    thread.start()
+    return stop_event
+
+def _worker_process(database, poll_interval):
+    db.DATABASE = database
+    stop_event = threading.Event()
+    try:
+        work(stop_event, poll_interval)
+    except KeyboardInterrupt:
+        pass
+
+def main():
+    parser = argparse.ArgumentParser(description='Run background matching workers')
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help='number of worker processes (default: one per CPU)')
+    parser.add_argument('--poll-interval', type=float, default=POLL_INTERVAL,
+                        help='seconds to wait when the queue is empty')
+    parser.add_argument('--rematch-interval', type=float, default=REMATCH_INTERVAL,
+                        help='seconds between re-match runs (0 disables them)')
+    parser.add_argument('--database', default=db.DATABASE, help='SQLite database file')
+    args = parser.parse_args()
+
+    db.DATABASE = args.database
+    db.init_db()
+
+    processes = [
+        multiprocessing.Process(target=_worker_process, args=(args.database, args.poll_interval),
+                                name=f'match-worker-{number}')
+        for number in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    print(f"[Worker] Started {len(processes)} worker processes")
+
+    rematch_stop = None
+    if args.rematch_interval > 0:
+        rematch_stop = start_rematch_scheduler(args.rematch_interval)
+
+    try:
+        while any(process.is_alive() for process in processes):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+    if rematch_stop is not None:
+        rematch_stop.set()
+    for process in processes:
+        process.join()
+
+if __name__ == '__main__':
+    main()